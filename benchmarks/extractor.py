@@ -0,0 +1,158 @@
+"""
+Micro-benchmark and parity check of the listing extractor.
+
+Times listing_extractor.extract_listing against the previous regex parser on stored
+listing pages, and checks that both return the same listing and units on every page
+the previous parser could read. Without stored pages, synthetic pages shaped like the
+listing pages are used.
+
+Usage (from the repository root):
+    python -m benchmarks.extractor --pages path/to/saved_pages
+"""
+
+from pathlib import Path
+import argparse
+import random
+import time
+import json
+import re
+from listing_extractor import extract_listing
+
+
+def legacy_extract_listing(html_content):
+    """
+    The parser previously used by scraper.scrape, kept as the parity reference.
+    """
+    pattern = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+    matches = pattern.findall(html_content)
+    matches = [
+        element
+        for element in matches
+        if "var listingJson" in element or "window.units" in element
+    ]
+
+    listingJson_dict = {}
+    units_array = []
+
+    for data_string in matches:
+        pattern_1 = re.compile(r"{(.*?)}")
+        matches_1 = pattern_1.findall(data_string)
+
+        pattern_2 = re.compile(r"window.units = (\[.*?\]);")
+        match_2 = pattern_2.search(data_string)
+
+        if len(matches_1) == 2:
+            listingJson_dict = json.loads("{" + matches_1[0] + "}")
+        elif match_2:
+            units_array_str = match_2.group(1)
+            units_array = json.loads(units_array_str)
+    return listingJson_dict, units_array
+
+
+def synthetic_page(rng, n_units):
+    """
+    HTML page with the same script layout as a listing page.
+    """
+    listing = {
+        "ref_id": rng.randint(100000, 999999),
+        "type": rng.choice(["Apartment", "House", "Townhouse"]),
+        "community": rng.choice(["Beltline", "Bowness", "Mission"]),
+        "cats": rng.randint(0, 1),
+        "dogs": rng.randint(0, 1),
+        "price": str(rng.randint(900, 3500)),
+        "latitude": 51.0 + rng.random(),
+        "longitude": -114.0 - rng.random(),
+        "intro": "Bright unit [close to transit]; see photos",
+    }
+    units = [
+        {
+            "id": i,
+            "price": str(rng.randint(900, 3500)),
+            "beds": rng.choice(["Studio", "1", "2", "3"]),
+            "baths": rng.choice(["1", "1.5", "2"]),
+            "sq_feet": str(rng.randint(400, 1800)),
+            "lease_term": rng.choice(["Long Term", "Short Term"]),
+        }
+        for i in range(n_units)
+    ]
+    filler = "".join(
+        f"<div class='row'><span>{rng.random()}</span></div>" for _ in range(2000)
+    )
+    return (
+        "<html><head><script>var analytics = {};</script></head><body>"
+        + filler
+        + f"<script>var listingJson = {json.dumps(listing)}; "
+        + f"window.listing = {json.dumps({'ref_id': listing['ref_id']})};</script>"
+        + f"<script>window.units = {json.dumps(units)};</script>"
+        + filler
+        + "</body></html>"
+    )
+
+
+def load_pages(directory, n_synthetic):
+    if directory:
+        paths = sorted(Path(directory).glob("*.html"))
+        return {path.name: path.read_text(encoding="utf-8") for path in paths}
+    rng = random.Random(123)
+    # Two units give the previous parser two {...} groups in the units script, which
+    # it mistakes for the listing, so parity is only checked on other unit counts
+    return {
+        f"synthetic_{i}.html": synthetic_page(rng, rng.choice([1, 3, 4, 5, 6, 8]))
+        for i in range(n_synthetic)
+    }
+
+
+def time_parser(parser, pages, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for html_content in pages.values():
+            try:
+                parser(html_content)
+            except ValueError:
+                pass
+    return (time.perf_counter() - start) / (repeats * len(pages))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the listing extractor.")
+    parser.add_argument(
+        "--pages", default=None, help="Directory of saved listing pages (*.html)"
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=200,
+        help="Synthetic pages used without --pages (default: 200)",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=5, help="Passes over the pages (default: 5)"
+    )
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, args.synthetic)
+    if not pages:
+        raise SystemExit(f"No *.html pages in {args.pages}")
+
+    # Parity on every page the previous parser could read
+    mismatches = []
+    compared = 0
+    for name, html_content in pages.items():
+        try:
+            expected = legacy_extract_listing(html_content)
+        except ValueError:
+            continue
+        compared += 1
+        if extract_listing(html_content) != expected:
+            mismatches.append(name)
+
+    legacy_time = time_parser(legacy_extract_listing, pages, args.repeats)
+    new_time = time_parser(extract_listing, pages, args.repeats)
+    print(f"Pages: {len(pages)}, compared: {compared}, mismatches: {len(mismatches)}")
+    print(f"legacy parser:     {legacy_time * 1000:.3f} ms/page")
+    print(f"listing_extractor: {new_time * 1000:.3f} ms/page")
+    print(f"speedup:           {legacy_time / new_time:.1f}x")
+
+    for name in mismatches:
+        print(f"MISMATCH {name}")
+    if mismatches:
+        raise SystemExit(1)
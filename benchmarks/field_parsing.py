@@ -0,0 +1,138 @@
+"""
+Benchmark and parity check of the beds, baths and square feet parser.
+
+Times field_parsing.parse_listing_fields against the previous chain of str.replace
+passes and str.match filter of data_cleaning on millions of synthetic rows, and
+checks that both give the same numbers on every value the previous chain accepted.
+
+Usage (from the repository root):
+    python -m benchmarks.field_parsing --rows 5000000
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from field_parsing import parse_listing_fields
+
+SQ_FEET_FORMATS = [
+    "{:d}",
+    "{:,d}",
+    "{:,d} sq ft",
+    "{:d}sqft",
+    "{:,d} Sq. Ft.",
+    "{:d} ft2",
+]
+BEDS_FORMATS = ["{:d}", "{:d} beds", "{:d} Bed", "{:d} bedrooms"]
+BATHS_FORMATS = ["{}", "{} baths", "{} Bath", "{} ba"]
+INVALID_VALUES = ["", "N/A", "Call", "12", "- sq ft"]
+
+
+def synthetic_frame(n_rows, invalid_rate, seed=0):
+    """
+    Text columns shaped like the raw collection, with about invalid_rate invalid values.
+    """
+    rng = np.random.default_rng(seed)
+
+    def column(values):
+        values = np.array(values, dtype=object)
+        invalid = rng.random(n_rows) < invalid_rate
+        values[invalid] = rng.choice(INVALID_VALUES, invalid.sum())
+        return values
+
+    sq_feet = rng.integers(300, 3000, n_rows)
+    sq_formats = rng.integers(0, len(SQ_FEET_FORMATS), n_rows)
+    beds = rng.integers(1, 5, n_rows)
+    bed_formats = rng.integers(0, len(BEDS_FORMATS), n_rows)
+    baths = rng.choice(["1", "1.5", "2", "2.5", "3"], n_rows)
+    bath_formats = rng.integers(0, len(BATHS_FORMATS), n_rows)
+    studio = rng.random(n_rows) < 0.1
+    return pd.DataFrame(
+        {
+            "sq_feet_y": column(
+                [SQ_FEET_FORMATS[f].format(v) for f, v in zip(sq_formats, sq_feet)]
+            ),
+            "beds": column(
+                [
+                    "Studio" if s else BEDS_FORMATS[f].format(v)
+                    for f, v, s in zip(bed_formats, beds, studio)
+                ]
+            ),
+            "baths_y": column(
+                [BATHS_FORMATS[f].format(v) for f, v in zip(bath_formats, baths)]
+            ),
+        }
+    )
+
+
+def legacy_parse(df):
+    """
+    The chain previously used by collection_transform.data_cleaning, kept as the
+    parity reference.
+    """
+    df["baths_y"] = df["baths_y"].str.replace(r"\s*baths?\s*", "", case=False)
+    df["beds"] = df["beds"].str.replace(r"\s*beds?\s*", "", case=False)
+    df["sq_feet_y"] = df["sq_feet_y"].str.replace("[a-zA-Z]", "", regex=True)
+    df["sq_feet_y"] = df["sq_feet_y"].str.replace(",", "")
+    df["sq_feet_y"] = df["sq_feet_y"].str.replace(" ", "")
+    pattern = r"^\d{3,}(\.\d+)?$"
+    df = df[df["sq_feet_y"].str.match(pattern)]
+    return df
+
+
+def legacy_numbers(legacy):
+    """
+    Numbers the training pipeline read from the previous clean values.
+    """
+    numbers = legacy.copy()
+    numbers["beds"] = numbers["beds"].replace("Studio", "1")
+    for column in numbers.columns:
+        numbers[column] = pd.to_numeric(numbers[column], errors="coerce")
+    return numbers
+
+
+def mismatches(legacy, parsed):
+    """
+    Rows where the previous chain gave a number that differs from the new parser.
+    """
+    expected = legacy_numbers(legacy)
+    actual = parsed.loc[expected.index, expected.columns]
+    compared = expected.notna()
+    differs = compared & ~np.isclose(expected, actual, equal_nan=False)
+    return int(compared.to_numpy().sum()), differs.any(axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the listing field parser.")
+    parser.add_argument(
+        "--rows", type=int, default=2000000, help="Synthetic rows (default: 2000000)"
+    )
+    parser.add_argument(
+        "--invalid-rate",
+        type=float,
+        default=0.02,
+        help="Share of invalid values per column (default: 0.02)",
+    )
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows, args.invalid_rate)
+    print(f"Rows: {len(df)}")
+
+    start = time.perf_counter()
+    legacy = legacy_parse(df.copy())
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed, invalid_counts = parse_listing_fields(df.copy())
+    new_time = time.perf_counter() - start
+
+    compared, differs = mismatches(legacy, parsed)
+    dropped = len(df) - len(legacy)
+    print(f"legacy chain:  {legacy_time:.2f}s, dropped {dropped} rows without a report")
+    print(f"field_parsing: {new_time:.2f}s, invalid values flagged: {invalid_counts}")
+    print(f"speedup:       {legacy_time / new_time:.1f}x")
+    print(f"Values compared: {compared}, mismatched rows: {int(differs.sum())}")
+
+    if differs.any():
+        print(df.loc[differs[differs].index].head(10))
+        raise SystemExit(1)
@@ -0,0 +1,484 @@
+"""
+Load test of the FastAPI app with a mix of prediction, metrics and aggregation calls.
+
+Prediction bodies are built from listing rows sampled from the clean collection
+($sample), from a JSON export of it (--seed-file) or, without either, from
+synthetic rows over the HouseFeatures vocabulary. Requests are sent by
+--concurrency workers, either as fast as the server answers or at a fixed total
+--rate; with a rate, latency is measured from the scheduled send time, so a
+server falling behind shows up in the percentiles instead of lowering the rate.
+
+Without --url, main:app is started in-process on a shared mongomock client
+seeded with the rows (pip install mongomock), so runs are repeatable without a
+database; the load generator then shares the server's process, so size workers
+and replicas from runs with --url. With --url, a running server is driven and
+rows are sampled from --mongo-uri, or from the clean collection of credentials.py.
+
+Usage (from the repository root):
+    python -m benchmarks.load_generator --duration 30 --concurrency 32
+    python -m benchmarks.load_generator --url http://localhost:8000 --rate 200 \\
+        --mongo-uri mongodb://localhost:27017 --db rentals --collection clean
+    python -m benchmarks.load_generator --mix predict=1,aggregations=1 --output results.json
+"""
+
+from pathlib import Path
+import threading
+import argparse
+import asyncio
+import random
+import socket
+import types
+import time
+import json
+import math
+import sys
+import re
+import aiohttp
+from pymongo import MongoClient
+from feature_schema import ALLOWED_MODEL_TYPES, ENCODED_PREFIXES, feature_names
+
+# Default share of each route in the request mix
+DEFAULT_MIX = {"predict": 0.7, "predict_auto": 0.1, "metrics": 0.1, "aggregations": 0.1}
+
+# Aggregation parameters drawn for the aggregation route
+AGGREGATION_TYPES = ["mean", "median", "count", "min", "max", "std"]
+AGGREGATION_CATEGORIES = ["type", "community", "cats", "dogs"]
+AGGREGATION_NUMERICS = ["price_y", "baths_y", "sq_feet_y"]
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+# Database and collection of the in-process stand-in
+MEMORY_DB = "loadtest"
+MEMORY_COLLECTION = "loadtest_clean"
+
+
+def field_name(prefix, value):
+    """
+    HouseFeatures field of a one-hot encoded value, e.g. ('type', 'Condo Unit').
+    """
+    if prefix in ("cats", "dogs"):
+        value = str(value).strip().lower() in ("true", "1", "yes")
+    return re.sub(r"[^0-9A-Za-z]+", "_", f"{prefix}_{value}").strip("_")
+
+
+def feature_payload(row, names):
+    """
+    Prediction request body for a clean listing row, or None if its numbers are unusable.
+    """
+    payload = dict.fromkeys(names, 0.0)
+    try:
+        payload["baths_y"] = float(row["baths_y"])
+        payload["sq_feet_y"] = float(row["sq_feet_y"])
+        beds = row["beds"]
+        payload["beds"] = 1.0 if str(beds).strip().lower() == "studio" else float(beds)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if any(math.isnan(payload[column]) for column in ("baths_y", "sq_feet_y", "beds")):
+        return None
+    for prefix in ENCODED_PREFIXES:
+        name = field_name(prefix, row.get(prefix))
+        if name in payload:
+            payload[name] = 1.0
+    return payload
+
+
+def synthetic_documents(n_rows, seed=123):
+    """
+    Clean collection documents drawn over the categories known to HouseFeatures.
+    """
+    rng = random.Random(seed)
+    names = feature_names()
+    vocabulary = {
+        prefix: [
+            name[len(prefix) + 1 :].replace("_", " ")
+            for name in names
+            if name.startswith(prefix + "_")
+        ]
+        for prefix in ENCODED_PREFIXES
+    }
+    sysdate = time.strftime("%Y-%m-%d %H:%M")
+    documents = []
+    for i in range(n_rows):
+        beds = rng.choice(["Studio", 1.0, 2.0, 3.0, 4.0])
+        sq_feet = rng.randint(400, 2200)
+        document = {prefix: rng.choice(values) for prefix, values in vocabulary.items()}
+        document["cats"] = document["cats"] == "True"
+        document["dogs"] = document["dogs"] == "True"
+        document.update(
+            {
+                "beds": beds,
+                "baths_y": rng.choice([1.0, 1.5, 2.0, 2.5, 3.0]),
+                "sq_feet_y": float(sq_feet),
+                "price_y": float(round(800 + 1.4 * sq_feet + rng.gauss(0, 250))),
+                "sysdate": sysdate,
+                "unit_key": f"loadtest-{i}",
+            }
+        )
+        documents.append(document)
+    return documents
+
+
+def load_documents(path):
+    """
+    Documents of a JSON array or JSON lines export of the clean collection.
+    """
+    text = Path(path).read_text(encoding="utf-8")
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def sample_documents(collection, n_rows):
+    """
+    Random documents of the clean collection, sampled server side.
+    """
+    return list(collection.aggregate([{"$sample": {"size": n_rows}}]))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_in_process(documents, port):
+    """
+    Serve main:app on port against a mongomock client seeded with documents.
+
+    pymongo.MongoClient is replaced before the app is imported, so every module of the
+    app shares the seeded in-memory database; credentials point at it.
+
+    Returns:
+    - tuple: The uvicorn server, to stop with server.should_exit = True, and its thread.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("The in-process mode needs mongomock: pip install mongomock")
+    import pymongo
+    import uvicorn
+
+    client = mongomock.MongoClient()
+    client[MEMORY_DB][MEMORY_COLLECTION].insert_many(documents)
+    pymongo.MongoClient = lambda *args, **kwargs: client
+
+    credentials = types.ModuleType("credentials")
+    credentials.mongo_db_cred = {
+        "username": "",
+        "password": "",
+        "cluster_uri": "mongodb://localhost:27017",
+        "db_name": MEMORY_DB,
+        "collection_name_clean": MEMORY_COLLECTION,
+    }
+    sys.modules["credentials"] = credentials
+
+    from main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("The in-process server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def parse_mix(text):
+    """
+    Route weights from 'route=weight,...', e.g. 'predict=0.8,aggregations=0.2'.
+    """
+    mix = {}
+    for item in text.split(","):
+        route, _, weight = item.partition("=")
+        if route not in DEFAULT_MIX:
+            raise SystemExit(
+                f"Unknown route {route!r}, choose from {sorted(DEFAULT_MIX)}"
+            )
+        mix[route] = float(weight or 1)
+    return mix
+
+
+class RequestMix:
+    """
+    Draw requests of the configured routes in proportion to their weights.
+    """
+
+    def __init__(self, mix, payloads, model_types, seed=123):
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.payloads = payloads
+        self.model_types = model_types
+        self.rng = random.Random(seed)
+
+    def next(self):
+        """
+        Returns:
+        - tuple: Report label, HTTP method, path and JSON body (or None).
+        """
+        route = self.rng.choices(self.routes, self.weights)[0]
+        model_type = self.rng.choice(self.model_types)
+        if route == "predict":
+            body = self.rng.choice(self.payloads)
+            return f"predict[{model_type}]", "POST", f"/{model_type}/predict/", body
+        if route == "predict_auto":
+            return (
+                "predict_auto",
+                "POST",
+                "/predict/auto",
+                self.rng.choice(self.payloads),
+            )
+        if route == "metrics":
+            return f"metrics[{model_type}]", "GET", f"/{model_type}/metrics/", None
+        path = "/aggregations/{}/{}/{}".format(
+            self.rng.choice(AGGREGATION_TYPES),
+            self.rng.choice(AGGREGATION_CATEGORIES),
+            self.rng.choice(AGGREGATION_NUMERICS),
+        )
+        return "aggregations", "GET", path, None
+
+
+async def run_load(url, request_mix, concurrency, duration, rate, warmup, timeout):
+    """
+    Send requests for warmup + duration seconds and collect their outcomes.
+
+    Parameters:
+    - url (str): Base URL of the server.
+    - request_mix (RequestMix): Source of the requests.
+    - concurrency (int): Requests in flight at most.
+    - duration (float): Measured seconds.
+    - rate (float): Total requests per second, 0 to send as fast as answers come back.
+    - warmup (float): Seconds of requests sent first and left out of the results.
+    - timeout (float): Seconds before a request counts as failed.
+
+    Returns:
+    - list: (label, latency in seconds, error or None) of the measured requests.
+    """
+    results = []
+    counter = iter(range(sys.maxsize))
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    async def worker(session):
+        while True:
+            scheduled = time.perf_counter()
+            if rate:
+                scheduled = start + next(counter) / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if scheduled >= stop_at:
+                return
+            label, method, path, body = request_mix.next()
+            error = None
+            try:
+                async with session.request(method, url + path, json=body) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = type(e).__name__
+            if scheduled >= measure_from:
+                results.append((label, time.perf_counter() - scheduled, error))
+
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        connector=aiohttp.TCPConnector(limit=concurrency),
+    ) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return results
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile q (0-100) of an ascending list.
+    """
+    if not sorted_values:
+        return float("nan")
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(results, duration):
+    """
+    Throughput, error rate and latency percentiles (ms) per label and overall.
+    """
+    groups = {}
+    for label, latency, error in sorted(results):
+        groups.setdefault(label, []).append((latency, error))
+    groups["all"] = [(latency, error) for _, latency, error in results]
+
+    summary = {}
+    for label, outcomes in groups.items():
+        latencies = sorted(latency * 1000 for latency, _ in outcomes)
+        errors = [error for _, error in outcomes if error]
+        summary[label] = {
+            "requests": len(outcomes),
+            "throughput_rps": len(outcomes) / duration,
+            "error_rate": len(errors) / len(outcomes),
+            "errors": sorted(set(errors)),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+        }
+    return summary
+
+
+def print_summary(summary):
+    print(
+        f"{'route':<28}{'requests':>10}{'req/s':>10}{'errors':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for label, row in summary.items():
+        print(
+            f"{label:<28}{row['requests']:>10}{row['throughput_rps']:>10.1f}"
+            f"{row['error_rate']:>9.1%}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+            f"{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+        )
+    for label, row in summary.items():
+        if row["errors"] and label != "all":
+            print(f"{label} errors: {', '.join(row['errors'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the FastAPI app.")
+    parser.add_argument(
+        "--url", default=None, help="Running server to drive; in-process when omitted"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Requests in flight (default: 16)"
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Total requests per second, 0 for as fast as possible (default: 0)",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Measured seconds (default: 30)"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=5, help="Unmeasured seconds first (default: 5)"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="Request timeout in s (default: 30)"
+    )
+    parser.add_argument(
+        "--mix",
+        default=",".join(f"{route}={weight}" for route, weight in DEFAULT_MIX.items()),
+        help="Route weights, e.g. predict=0.8,metrics=0.1,aggregations=0.1",
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=None,
+        help="Model types to call (default: those with a file in models/)",
+    )
+    parser.add_argument(
+        "--rows", type=int, default=1000, help="Feature rows sampled (default: 1000)"
+    )
+    parser.add_argument(
+        "--seed-file", default=None, help="JSON export of clean documents to use"
+    )
+    parser.add_argument(
+        "--mongo-uri", default=None, help="MongoDB to sample rows from with --url"
+    )
+    parser.add_argument("--db", default=None, help="Database of --mongo-uri")
+    parser.add_argument("--collection", default=None, help="Collection of --mongo-uri")
+    parser.add_argument("--output", default=None, help="Write the summary as JSON")
+    args = parser.parse_args()
+
+    # Rows the requests are built from
+    if args.seed_file:
+        documents = load_documents(args.seed_file)
+    elif args.url is None:
+        documents = synthetic_documents(max(args.rows, 1000))
+    else:
+        if args.mongo_uri:
+            uri, db_name, collection_name = args.mongo_uri, args.db, args.collection
+        else:
+            from credentials import mongo_db_cred
+            from mongo_writer import connection_uri
+
+            db_name = mongo_db_cred["db_name"]
+            collection_name = mongo_db_cred["collection_name_clean"]
+            uri = connection_uri(
+                mongo_db_cred["username"],
+                mongo_db_cred["password"],
+                mongo_db_cred["cluster_uri"],
+                db_name,
+            )
+        client = MongoClient(uri)
+        documents = sample_documents(client[db_name][collection_name], args.rows)
+        client.close()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server, thread = start_in_process(documents, port)
+        url = f"http://127.0.0.1:{port}"
+        print(f"Serving main:app in-process at {url} on {len(documents)} seeded rows")
+
+    names = feature_names()
+    rng = random.Random(123)
+    rows = rng.sample(documents, min(args.rows, len(documents)))
+    payloads = [p for p in (feature_payload(row, names) for row in rows) if p]
+    if not payloads:
+        raise SystemExit("No usable feature rows to build prediction requests from")
+
+    model_types = args.models or sorted(
+        m for m in ALLOWED_MODEL_TYPES if (MODELS_DIR / f"{m}.pkl").exists()
+    )
+    if not model_types:
+        raise SystemExit("No trained models in models/, pass --models explicitly")
+
+    request_mix = RequestMix(parse_mix(args.mix), payloads, model_types)
+    print(
+        f"Driving {url} for {args.warmup:g}s warmup + {args.duration:g}s with "
+        f"concurrency {args.concurrency}"
+        + (f" at {args.rate:g} req/s" if args.rate else "")
+        + f", {len(payloads)} feature rows, models {', '.join(model_types)}"
+    )
+    try:
+        results = asyncio.run(
+            run_load(
+                url.rstrip("/"),
+                request_mix,
+                args.concurrency,
+                args.duration,
+                args.rate,
+                args.warmup,
+                args.timeout,
+            )
+        )
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join()
+
+    if not results:
+        raise SystemExit("No requests completed in the measured window")
+    summary = summarize(results, args.duration)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "url": url,
+                    "concurrency": args.concurrency,
+                    "rate": args.rate,
+                    "duration": args.duration,
+                    "mix": parse_mix(args.mix),
+                    "models": model_types,
+                    "routes": summary,
+                },
+                file,
+                indent=4,
+            )
+        print(f"Summary written to {args.output}")
@@ -0,0 +1,312 @@
+"""
+Training and inference benchmark over the model zoo.
+
+Every entry of ALLOWED_MODEL_TYPES is fitted on synthetic data shaped like the
+HouseFeatures matrix and measured for fit time, single-row predict latency,
+batch throughput, artifact size, load time and resident memory. Each case runs
+in a fresh process so memory numbers do not leak between models.
+
+Usage (from the repository root):
+    python -m benchmarks.model_zoo --rows 1000 100000 1000000
+    python -m benchmarks.model_zoo --save-baseline
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import argparse
+import tempfile
+import platform
+import resource
+import pickle
+import json
+import time
+import os
+import sklearn
+import xgboost as xgb
+from feature_schema import ALLOWED_MODEL_TYPES, ENCODED_PREFIXES, feature_names
+from models_and_metrics import Model, share_arrays
+
+# Models that are too slow to fit beyond this many rows are skipped above it
+MAX_FIT_ROWS = {"svr": 20000}
+
+# Metrics where a larger value is better, all others regress upwards
+HIGHER_IS_BETTER = {"throughput_rows_per_s"}
+
+BENCHMARK_DIR = Path(__file__).parent
+
+
+def synthetic_features(n_rows, random_state=123):
+    """
+    Generate a feature matrix and scaled label shaped like the training data.
+
+    Numeric columns get realistic ranges (sq_feet_y already min-max scaled) and
+    every one-hot group has exactly one active column per row.
+
+    Returns:
+    - Tuple of X (n_rows x n_features float64) and y (n_rows float64 in [0, 1]).
+    """
+    rng = np.random.RandomState(random_state)
+    names = feature_names()
+    X = np.zeros((n_rows, len(names)))
+
+    X[:, names.index("baths_y")] = rng.choice([1.0, 1.5, 2.0, 2.5, 3.0], n_rows)
+    X[:, names.index("sq_feet_y")] = rng.random_sample(n_rows)
+    X[:, names.index("beds")] = rng.choice([1.0, 2.0, 3.0, 4.0], n_rows)
+
+    for prefix in ENCODED_PREFIXES:
+        group = [i for i, name in enumerate(names) if name.startswith(prefix + "_")]
+        X[np.arange(n_rows), rng.choice(group, n_rows)] = 1.0
+
+    # Label with both linear and interaction structure, scaled to [0, 1]
+    weights = rng.normal(scale=0.3, size=len(names))
+    y = X @ weights + 0.5 * X[:, names.index("sq_feet_y")] * X[:, names.index("beds")]
+    y += rng.normal(scale=0.1, size=n_rows)
+    y = (y - y.min()) / (y.max() - y.min())
+
+    return X, y
+
+
+def resident_memory_mb():
+    """
+    Current resident set size of this process in MB.
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS; peak instead of current
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def run_case(model_type, array_paths, batch_sizes, latency_samples):
+    """
+    Benchmark one model on one dataset size. Runs inside a fresh worker process.
+    """
+    X = np.load(array_paths["X"], mmap_mode="r")
+    y = np.load(array_paths["y"], mmap_mode="r")
+    rss_start = resident_memory_mb()
+
+    # Fit
+    current_model = Model(model_type=model_type)
+    start = time.perf_counter()
+    current_model.train(X, y)
+    fit_time = time.perf_counter() - start
+
+    # Artifact size and load time, as the prediction endpoint unpickles it
+    with tempfile.TemporaryDirectory() as artifact_dir:
+        artifact_path = Path(artifact_dir) / f"{model_type}.pkl"
+        current_model.save_model(artifact_path, feature_names())
+        artifact_size = artifact_path.stat().st_size
+        load_times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            with open(artifact_path, "rb") as model_file:
+                loaded_model = pickle.load(model_file)["model"]
+            load_times.append(time.perf_counter() - start)
+
+    # Single-row latency
+    rows = np.asarray(X[: min(len(X), latency_samples)])
+    latencies = []
+    for i in range(latency_samples):
+        row = rows[i % len(rows)].reshape(1, -1)
+        start = time.perf_counter()
+        loaded_model.predict(row)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # Batch throughput
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = np.asarray(X[: min(len(X), batch_size)])
+        repeats = max(1, 10000 // len(batch))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            loaded_model.predict(batch)
+        throughput[str(batch_size)] = (
+            len(batch) * repeats / (time.perf_counter() - start)
+        )
+
+    return {
+        "fit_time_s": fit_time,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "throughput_rows_per_s": throughput,
+        "artifact_size_bytes": artifact_size,
+        "load_time_s": float(np.median(load_times)),
+        "rss_mb": resident_memory_mb(),
+        "rss_growth_mb": resident_memory_mb() - rss_start,
+    }
+
+
+def run_benchmark(models_list, row_counts, batch_sizes, latency_samples):
+    """
+    Run every model on every dataset size.
+
+    Returns:
+    - Dictionary with environment metadata and one result entry per case.
+    """
+    results = []
+    for n_rows in row_counts:
+        X, y = synthetic_features(n_rows)
+        with tempfile.TemporaryDirectory() as shared_dir:
+            array_paths = share_arrays(shared_dir, X=X, y=y)
+            del X, y
+            for model_type in models_list:
+                case = {"model_type": model_type, "rows": n_rows}
+                if n_rows > MAX_FIT_ROWS.get(model_type, n_rows):
+                    print(f"{model_type:<20}{n_rows:>9} rows: skipped")
+                    results.append({**case, "skipped": True})
+                    continue
+
+                # A fresh process per case keeps memory measurements independent
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    measurements = executor.submit(
+                        run_case, model_type, array_paths, batch_sizes, latency_samples
+                    ).result()
+                results.append({**case, **measurements})
+                print(
+                    f"{model_type:<20}{n_rows:>9} rows: "
+                    f"fit {measurements['fit_time_s']:.2f}s, "
+                    f"p50 {measurements['latency_p50_ms']:.3f}ms, "
+                    f"p99 {measurements['latency_p99_ms']:.3f}ms, "
+                    f"{measurements['artifact_size_bytes'] / 1e6:.2f} MB"
+                )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "xgboost": xgb.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def flatten_measurements(result):
+    """
+    Flatten one result entry into metric name -> value, throughput per batch size.
+    """
+    flat = {}
+    for name, value in result.items():
+        if name in ("model_type", "rows", "skipped"):
+            continue
+        if isinstance(value, dict):
+            for key, sub_value in value.items():
+                flat[f"{name}[{key}]"] = sub_value
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare_to_baseline(current, baseline, tolerance=0.2):
+    """
+    List the measurements that regressed by more than tolerance against the baseline.
+
+    Returns:
+    - List of (model_type, rows, metric, baseline value, current value) tuples.
+    """
+    baseline_cases = {
+        (result["model_type"], result["rows"]): flatten_measurements(result)
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_cases.get((result["model_type"], result["rows"]))
+        if not reference:
+            continue
+        for metric, value in flatten_measurements(result).items():
+            if metric not in reference or metric == "rss_growth_mb":
+                continue
+            base_value = reference[metric]
+            if metric.split("[")[0] in HIGHER_IS_BETTER:
+                regressed = value < base_value * (1 - tolerance)
+            else:
+                regressed = value > base_value * (1 + tolerance)
+            if regressed:
+                regressions.append(
+                    (result["model_type"], result["rows"], metric, base_value, value)
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the model zoo.")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=sorted(ALLOWED_MODEL_TYPES),
+        help="Model types to benchmark (default: all of ALLOWED_MODEL_TYPES)",
+    )
+    parser.add_argument(
+        "--rows",
+        nargs="+",
+        type=int,
+        default=[1000, 100000, 1000000],
+        help="Synthetic dataset sizes (default: 1000 100000 1000000)",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        nargs="+",
+        type=int,
+        default=[1, 32, 1024, 8192],
+        help="Batch sizes for throughput (default: 1 32 1024 8192)",
+    )
+    parser.add_argument(
+        "--latency-samples",
+        type=int,
+        default=500,
+        help="Single-row predictions timed per case (default: 500)",
+    )
+    parser.add_argument(
+        "--output",
+        default=str(BENCHMARK_DIR / "model_zoo_results.json"),
+        help="Where to write the results JSON",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=str(BENCHMARK_DIR / "model_zoo_baseline.json"),
+        help="Baseline results to compare against",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store this run as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Relative change counted as a regression (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.models, args.rows, args.batch_sizes, args.latency_samples
+    )
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline written to {args.baseline}")
+    elif Path(args.baseline).exists():
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for model_type, n_rows, metric, base_value, value in regressions:
+            print(
+                f"REGRESSION {model_type} {n_rows} rows {metric}: "
+                f"{base_value:.4g} -> {value:.4g}"
+            )
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against the baseline")
+    else:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
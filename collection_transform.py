@@ -1,12 +1,247 @@
 from credentials import mongo_db_cred
 from pymongo import MongoClient
+from mongo_writer import connection_uri, write_batch
+import mongo_writer
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+from feature_engineering import iter_mongodb_batches
+from dataset_cache import CACHE_DIR
+from field_parsing import (
+    FIELD_PARSERS,
+    parse_listing_fields,
+    invalid_examples,
+)
 import pandas as pd
 import numpy as np
+from pathlib import Path
+import argparse
+import time
+import os
+from scipy.spatial import cKDTree
+
+# Collection holding the last processed raw sysdate per clean collection
+TRANSFORM_STATE_COLLECTION = "transform_state"
+
+# Labeled locations of the quadrant fallback index, extended between transform runs
+QUADRANT_POINTS_DIR = CACHE_DIR / "quadrant_points"
+
+# Communities of each quadrant
+NW_COMMUNITIES = [
+    "Varsity",
+    "Dalhousie",
+    "Edgemont",
+    "Brentwood",
+    "Hamptons",
+    "Arbour Lake",
+    "Silver Springs",
+    "University District",
+    "University Heights",
+    "Charleswood",
+    "Collingwood",
+    "Tuxedo Park",
+    "Hidden Valley",
+    "St Andrews Heights",
+    "Nolan Hill",
+    "Cambrian Heights",
+    "North Haven",
+    "Capitol Hill",
+    "Ranchlands",
+    "Hawkwood",
+    "Bowness",
+    "Rosedale",
+    "Country Hills",
+    "Royal Oak",
+    "Citadel",
+    "Sandstone",
+    "Mount Pleasant",
+    "Highland Park",
+    "Montgomery",
+    "Briar Hill",
+    "Scenic Acres",
+    "Collingwood",
+    "Charleswood",
+    "Silver Springs",
+    "Dalhousie",
+    "Hawkwood",
+    "North Glenmore Park",
+    "Rocky Ridge",
+]
+
+NE_COMMUNITIES = [
+    "Greenview",
+    "Taradale",
+    "Coventry Hills",
+    "Marlborough",
+    "Rundle",
+    "Saddle Ridge",
+    "Saddlebrook",
+    "Redstone",
+    "Cityscape",
+    "Whitehorn",
+    "Castleridge",
+    "Pineridge",
+    "Temple",
+    "Falconridge",
+    "Coral Springs",
+    "Monterey Park",
+    "Abbeydale",
+    "Skyview",
+    "Martindale",
+    "Mayland Heights",
+    "Vista Heights",
+]
+
+SW_COMMUNITIES = [
+    "Springbank Hill",
+    "Bayview",
+    "Richmond/Knob Hill",
+    "Windsor Park",
+    "Garrison Green",
+    "Cougar Ridge",
+    "Aspen Woods",
+    "Erlton",
+    "Bankview",
+    "Westgate",
+    "Lower Mount Royal",
+    "Killarney",
+    "Strathcona Park",
+    "Altadore",
+    "Cliff Bungalow",
+    "Shaganappi",
+    "Glamorgan",
+    "Scarboro",
+    "Mount Royal",
+    "Rosscarrock",
+    "Glendale",
+    "Sunalta",
+    "Wildwood",
+    "Lincoln Park",
+    "Evergreen",
+    "Signal Hill",
+    "Coach Hill",
+    "Discovery Ridge",
+    "Kingsland",
+    "Haysboro",
+    "Cedarbrae",
+    "Glenbrook",
+    "Rutland Park",
+    "Lakeview",
+    "Chinook Park",
+    "Canyon Meadows",
+    "Braeside",
+    "Woodlands",
+    "Belaire",
+    "Palliser",
+    "Pumphill",
+    "Kelvin Grove",
+]
+
+SE_COMMUNITIES = [
+    "Downtown",
+    "Victoria Park",
+    "Beltline",
+    "Acadia",
+    "Bridgeland",
+    "Mission",
+    "Eau Claire",
+    "Inglewood",
+    "Forest Heights",
+    "Albert Park",
+    "Ogden",
+    "Southview",
+    "Dover",
+    "Penbrooke Meadows",
+    "Erin Woods",
+    "New Brighton",
+    "Forest Lawn",
+    "Manchester",
+    "Spruce Cliff",
+    "Braeside",
+    "Dover Glen",
+    "Applewood",
+    "Red Carpet",
+    "Fonda",
+    "Ramsay",
+    "Radisson Heights",
+    "Riverbend",
+    "McKenzie Towne",
+    "Copperfield",
+    "Mckenzie Towne",
+    "Douglas Glen",
+    "Lake Bonavista",
+    "Maple Ridge",
+    "Queensland",
+    "Lynnwood",
+    "Elboya",
+    "Deer Ridge",
+    "McKenzie Lake",
+    "Mahogany",
+]
+
+INNER_CITY_COMMUNITIES = [
+    "Connaught",
+    "East Village",
+    "Renfrew",
+    "Crescent Heights",
+    "South Calgary",
+    "Evanston",
+    "Huntington Hills",
+    "Highwood",
+    "Winston Heights",
+    "Parkhill-Stanley Park",
+    "Savanna",
+    "Bridgeland",
+    "Sunnyside",
+    "Hillhurst",
+    "West Springs",
+    "Oakridge",
+    "Shawnee Slopes",
+    "Kincora",
+    "Harvest Hills",
+    "Sunnyside",
+    "Tuxedo",
+    "West Hillhurst",
+    "Tuxedo Park",
+    "Willow Park",
+    "University Heights",
+    "Sherwood",
+    "Patterson",
+    "Garrison Woods",
+    "Greenwich",
+    "Elbow Park",
+    "Mayfair",
+    "Country Hills Village",
+    "Point McKay",
+    "Nolan Hill",
+    "Hotchkiss",
+    "Montreux",
+    "North Haven",
+    "Beddington",
+]
+
+# Community -> quadrant; a community listed twice keeps its first quadrant in the
+# order NW, NE, SW, SE, Downtown
+QUADRANT_COMMUNITIES = [
+    ("NW", NW_COMMUNITIES),
+    ("NE", NE_COMMUNITIES),
+    ("SW", SW_COMMUNITIES),
+    ("SE", SE_COMMUNITIES),
+    ("Downtown", INNER_CITY_COMMUNITIES),
+]
+COMMUNITY_QUADRANT = {
+    community: quadrant
+    for quadrant, communities in reversed(QUADRANT_COMMUNITIES)
+    for community in communities
+}
 
 
 def mongodb_to_dataframe(username, password, cluster_uri, db_name, collection_name):
-    # Construct the MongoDB Atlas connection URI using the provided username and password
-    mongo_uri = f"mongodb+srv://{username}:{password}@{cluster_uri}/{db_name}?retryWrites=true&w=majority"
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
 
     # Connect to MongoDB
     client = MongoClient(mongo_uri)
@@ -30,266 +265,230 @@ def mongodb_to_dataframe(username, password, cluster_uri, db_name, collection_na
     return df
 
 
-def assign_quadrant(df):
-    # Define the quadrant for each community
-    NW_communities = [
-        "Varsity",
-        "Dalhousie",
-        "Edgemont",
-        "Brentwood",
-        "Hamptons",
-        "Arbour Lake",
-        "Silver Springs",
-        "University District",
-        "University Heights",
-        "Charleswood",
-        "Collingwood",
-        "Tuxedo Park",
-        "Hidden Valley",
-        "St Andrews Heights",
-        "Nolan Hill",
-        "Cambrian Heights",
-        "North Haven",
-        "Capitol Hill",
-        "Ranchlands",
-        "Hawkwood",
-        "Bowness",
-        "Rosedale",
-        "Country Hills",
-        "Royal Oak",
-        "Citadel",
-        "Sandstone",
-        "Mount Pleasant",
-        "Highland Park",
-        "Montgomery",
-        "Briar Hill",
-        "Scenic Acres",
-        "Collingwood",
-        "Charleswood",
-        "Silver Springs",
-        "Dalhousie",
-        "Hawkwood",
-        "North Glenmore Park",
-        "Rocky Ridge",
-    ]
+def build_quadrant_index(latitude, longitude, quadrant):
+    """
+    Build a KD-tree over listing coordinates with a known quadrant.
 
-    NE_communities = [
-        "Greenview",
-        "Taradale",
-        "Coventry Hills",
-        "Marlborough",
-        "Rundle",
-        "Saddle Ridge",
-        "Saddlebrook",
-        "Redstone",
-        "Cityscape",
-        "Whitehorn",
-        "Castleridge",
-        "Pineridge",
-        "Temple",
-        "Falconridge",
-        "Coral Springs",
-        "Monterey Park",
-        "Abbeydale",
-        "Skyview",
-        "Martindale",
-        "Mayland Heights",
-        "Vista Heights",
-    ]
+    Longitudes are scaled by the cosine of the mean latitude so distances are roughly
+    isotropic around Calgary.
 
-    SW_communities = [
-        "Springbank Hill",
-        "Bayview",
-        "Richmond/Knob Hill",
-        "Windsor Park",
-        "Garrison Green",
-        "Cougar Ridge",
-        "Aspen Woods",
-        "Erlton",
-        "Bankview",
-        "Westgate",
-        "Lower Mount Royal",
-        "Killarney",
-        "Strathcona Park",
-        "Altadore",
-        "Cliff Bungalow",
-        "Shaganappi",
-        "Glamorgan",
-        "Scarboro",
-        "Mount Royal",
-        "Rosscarrock",
-        "Glendale",
-        "Sunalta",
-        "Wildwood",
-        "Lincoln Park",
-        "Evergreen",
-        "Signal Hill",
-        "Coach Hill",
-        "Discovery Ridge",
-        "Kingsland",
-        "Haysboro",
-        "Cedarbrae",
-        "Glenbrook",
-        "Rutland Park",
-        "Lakeview",
-        "Chinook Park",
-        "Canyon Meadows",
-        "Braeside",
-        "Woodlands",
-        "Belaire",
-        "Palliser",
-        "Pumphill",
-        "Kelvin Grove",
-    ]
+    Parameters:
+    - latitude, longitude: Coordinates of the labeled listings.
+    - quadrant: Their quadrants.
 
-    SE_communities = [
-        "Downtown",
-        "Victoria Park",
-        "Beltline",
-        "Acadia",
-        "Bridgeland",
-        "Mission",
-        "Eau Claire",
-        "Inglewood",
-        "Forest Heights",
-        "Albert Park",
-        "Ogden",
-        "Southview",
-        "Dover",
-        "Penbrooke Meadows",
-        "Erin Woods",
-        "New Brighton",
-        "Forest Lawn",
-        "Manchester",
-        "Spruce Cliff",
-        "Braeside",
-        "Dover Glen",
-        "Applewood",
-        "Red Carpet",
-        "Fonda",
-        "Ramsay",
-        "Radisson Heights",
-        "Riverbend",
-        "McKenzie Towne",
-        "Copperfield",
-        "Mckenzie Towne",
-        "Douglas Glen",
-        "Lake Bonavista",
-        "Maple Ridge",
-        "Queensland",
-        "Lynnwood",
-        "Elboya",
-        "Deer Ridge",
-        "McKenzie Lake",
-        "Mahogany",
-    ]
+    Returns:
+    - dict: The tree, the coordinate scale and the quadrant labels, for assign_quadrant.
+    """
+    latitude = pd.to_numeric(pd.Series(latitude), errors="coerce").to_numpy()
+    longitude = pd.to_numeric(pd.Series(longitude), errors="coerce").to_numpy()
+    labels = np.asarray(quadrant)
+    valid = ~(np.isnan(latitude) | np.isnan(longitude))
+    if not valid.any():
+        return None
+    scale = np.cos(np.radians(np.nanmean(latitude[valid])))
+    points = np.column_stack([latitude[valid], longitude[valid] * scale])
+    return {"tree": cKDTree(points), "scale": scale, "labels": labels[valid]}
 
-    Inner_city_communities = [
-        "Connaught",
-        "East Village",
-        "Renfrew",
-        "Crescent Heights",
-        "South Calgary",
-        "Evanston",
-        "Huntington Hills",
-        "Highwood",
-        "Winston Heights",
-        "Parkhill-Stanley Park",
-        "Savanna",
-        "Bridgeland",
-        "Sunnyside",
-        "Hillhurst",
-        "West Springs",
-        "Oakridge",
-        "Shawnee Slopes",
-        "Kincora",
-        "Harvest Hills",
-        "Sunnyside",
-        "Tuxedo",
-        "West Hillhurst",
-        "Tuxedo Park",
-        "Willow Park",
-        "University Heights",
-        "Sherwood",
-        "Patterson",
-        "Garrison Woods",
-        "Greenwich",
-        "Elbow Park",
-        "Mayfair",
-        "Country Hills Village",
-        "Point McKay",
-        "Nolan Hill",
-        "Hotchkiss",
-        "Montreux",
-        "North Haven",
-        "Beddington",
-    ]
 
-    Inner_city_communities = [
-        "Connaught",
-        "East Village",
-        "Renfrew",
-        "Crescent Heights",
-        "South Calgary",
-        "Evanston",
-        "Huntington Hills",
-        "Highwood",
-        "Winston Heights",
-        "Parkhill-Stanley Park",
-        "Savanna",
-        "Bridgeland",
-        "Sunnyside",
-        "Hillhurst",
-        "West Springs",
-        "Oakridge",
-        "Shawnee Slopes",
-        "Kincora",
-        "Harvest Hills",
-        "Sunnyside",
-        "Tuxedo",
-        "West Hillhurst",
-        "Tuxedo Park",
-        "Willow Park",
-        "University Heights",
-        "Sherwood",
-        "Patterson",
-        "Garrison Woods",
-        "Greenwich",
-        "Elbow Park",
-        "Mayfair",
-        "Country Hills Village",
-        "Point McKay",
-        "Nolan Hill",
-        "Hotchkiss",
-        "Montreux",
-        "North Haven",
-        "Beddington",
-    ]
+def nearest_quadrant(index, latitude, longitude, k=5):
+    """
+    Majority quadrant of the k nearest labeled listings, or "Unknown" without coordinates.
+    """
+    latitude = pd.to_numeric(pd.Series(latitude), errors="coerce").to_numpy()
+    longitude = pd.to_numeric(pd.Series(longitude), errors="coerce").to_numpy()
+    result = np.full(len(latitude), "Unknown", dtype=object)
+    valid = ~(np.isnan(latitude) | np.isnan(longitude))
+    if index is None or not valid.any():
+        return result
+
+    k = min(k, len(index["labels"]))
+    points = np.column_stack([latitude[valid], longitude[valid] * index["scale"]])
+    _, neighbors = index["tree"].query(points, k=k)
+    neighbors = np.asarray(neighbors).reshape(len(points), k)
+
+    # Vote: count the neighbor labels per row and keep the most frequent
+    classes, codes = np.unique(index["labels"], return_inverse=True)
+    votes = np.zeros((len(points), len(classes)), dtype=np.int32)
+    np.add.at(votes, (np.arange(len(points))[:, None], codes[neighbors]), 1)
+    result[valid] = classes[votes.argmax(axis=1)]
+    return result
+
+
+def load_quadrant_points(path):
+    """
+    Labeled locations and raw watermark saved by save_quadrant_points.
 
-    # Create a new column named 'Quadrant'
-    def assign_quadrant(community):
-        if community in NW_communities:
-            return "NW"
-        elif community in NE_communities:
-            return "NE"
-        elif community in SW_communities:
-            return "SW"
-        elif community in SE_communities:
-            return "SE"
-        elif community in Inner_city_communities:
-            return "Downtown"
-        else:
-            return "Unknown"  # for communities not listed
-
-    df["Quadrant"] = df["community"].apply(assign_quadrant)
+    Returns:
+    - tuple: DataFrame of community, latitude and longitude and the last raw sysdate
+      read, or (None, None) without a saved file.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None, None
+    with np.load(path, allow_pickle=False) as data:
+        points = pd.DataFrame(
+            {
+                "community": data["community"].astype(object),
+                "latitude": data["latitude"],
+                "longitude": data["longitude"],
+            }
+        )
+        watermark = str(data["watermark"]) or None
+    return points, watermark
+
+
+def save_quadrant_points(path, points, watermark):
+    """
+    Save the labeled locations of the quadrant index with the last raw sysdate read.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        np.savez(
+            file,
+            community=points["community"].astype(str).to_numpy(),
+            latitude=points["latitude"].to_numpy(dtype=float),
+            longitude=points["longitude"].to_numpy(dtype=float),
+            watermark=np.array(watermark or ""),
+        )
+    os.replace(tmp_path, path)
+
+
+def load_quadrant_index(
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    raw_collection_name,
+    batch_size=50000,
+    incremental=True,
+    points_dir=QUADRANT_POINTS_DIR,
+):
+    """
+    Build the quadrant fallback index over the raw listings of every listed community.
+
+    The index covers the whole raw collection and is built once per transform run, so
+    the fallback quadrant of a listing does not depend on the batch it is cleaned in.
+    Units of one listing share its coordinates and are counted once.
+
+    The distinct labeled locations are saved under points_dir with the last raw sysdate
+    read, so incremental runs only read the raw documents from that sysdate on and
+    rebuild the tree from the saved and new locations. Locations of raw documents that
+    were since changed stay in the index until a full run rebuilds it.
+
+    Parameters:
+    - username, password, cluster_uri, db_name: MongoDB Atlas connection details.
+    - raw_collection_name (str): Raw collection to read.
+    - batch_size (int, optional): Documents per batch. Defaults to 50000.
+    - incremental (bool, optional): Extend the saved locations instead of reading the
+      whole raw collection. Defaults to True.
+    - points_dir (Path, optional): Directory of the saved locations.
+
+    Returns:
+    - dict: Spatial index from build_quadrant_index, or None without labeled listings.
+    """
+    path = Path(points_dir) / f"{db_name}.{raw_collection_name}.npz"
+    points, watermark = load_quadrant_points(path) if incremental else (None, None)
+    query = {"community": {"$in": list(COMMUNITY_QUADRANT)}}
+    if watermark:
+        # $gte as a scrape run stamps one sysdate on all its documents
+        query["sysdate"] = {"$gte": watermark}
+
+    frames = [] if points is None else [points]
+    rows_read = 0
+    max_sysdate = watermark
+    for batch in iter_mongodb_batches(
+        username,
+        password,
+        cluster_uri,
+        db_name,
+        raw_collection_name,
+        batch_size=batch_size,
+        query=query,
+        projection={
+            "community": 1,
+            "latitude": 1,
+            "longitude": 1,
+            "sysdate": 1,
+            "_id": 0,
+        },
+    ):
+        rows_read += len(batch)
+        if "sysdate" in batch.columns and batch["sysdate"].notna().any():
+            batch_max = batch["sysdate"].dropna().max()
+            max_sysdate = max(max_sysdate or batch_max, batch_max)
+        batch = batch.reindex(columns=["community", "latitude", "longitude"])
+        batch["latitude"] = pd.to_numeric(batch["latitude"], errors="coerce")
+        batch["longitude"] = pd.to_numeric(batch["longitude"], errors="coerce")
+        frames.append(batch.dropna().drop_duplicates())
+    print(
+        f"Read {rows_read} labeled raw documents from sysdate {watermark or 'start'} "
+        "for the quadrant index"
+    )
+    if not frames:
+        return None
+    labeled = pd.concat(frames, ignore_index=True).drop_duplicates()
+    labeled = labeled.sort_values(["latitude", "longitude", "community"])
+    save_quadrant_points(path, labeled, max_sysdate)
+    return build_quadrant_index(
+        labeled["latitude"],
+        labeled["longitude"],
+        labeled["community"].map(COMMUNITY_QUADRANT),
+    )
+
+
+# Quadrant fallback index of the running transform, set once in every cleaning process
+_quadrant_index = None
+
+
+def set_quadrant_index(index):
+    """
+    Process pool initializer sharing the run's quadrant index with clean_batch.
+    """
+    global _quadrant_index
+    _quadrant_index = index
+
+
+def assign_quadrant(df, index=None, k=5):
+    """
+    Assign the city quadrant of every listing.
+
+    Listed communities are mapped through COMMUNITY_QUADRANT. Other communities get the
+    majority quadrant of the k nearest labeled listings by latitude/longitude, so they
+    are kept instead of dropped; rows without coordinates stay "Unknown".
+
+    Parameters:
+    - df: DataFrame with 'community', 'latitude' and 'longitude' columns.
+    - index (optional): Spatial index from build_quadrant_index. Defaults to an index
+      over the labeled rows of df.
+    - k (int, optional): Number of neighbors voting. Defaults to 5.
+
+    Returns:
+    - DataFrame: df with a 'Quadrant' column.
+    """
+    df["Quadrant"] = df["community"].map(COMMUNITY_QUADRANT)
+    unknown = df["Quadrant"].isna().to_numpy()
+    if unknown.any() and {"latitude", "longitude"} <= set(df.columns):
+        if index is None:
+            labeled = df.loc[~unknown]
+            index = build_quadrant_index(
+                labeled["latitude"], labeled["longitude"], labeled["Quadrant"]
+            )
+        df.loc[unknown, "Quadrant"] = nearest_quadrant(
+            index, df.loc[unknown, "latitude"], df.loc[unknown, "longitude"], k
+        )
+    df["Quadrant"] = df["Quadrant"].fillna("Unknown")
     return df
 
 
-def data_cleaning(df, columns_to_keep, columns_to_drop_na):
+def data_cleaning(
+    df, columns_to_keep, columns_to_drop_na, keep_invalid=False, quadrant_index=None
+):
     df = df[columns_to_keep]
     df.fillna("", inplace=True)
     df = df.dropna(subset=columns_to_drop_na)
-    df = assign_quadrant(df)
+    df = assign_quadrant(df, index=quadrant_index)
     df = df[df["Quadrant"] != "Unknown"]
     # df['features'] = df['features'].str.replace(r"\['", "", regex=True)
     # df['features'] = df['features'].str.replace(r"\']", "", regex=True)
@@ -301,51 +500,272 @@ def data_cleaning(df, columns_to_keep, columns_to_drop_na):
     # df['utilities_included'] = df['utilities_included'].str.replace(r"'", "", regex=True)
     # df['utilities_included'] = df['utilities_included'].str.replace(r", See Full Description", "")
     # df['utilities_included'].replace(["", " ", "False", np.nan], ["", "", "", ""], inplace=True)
-    df["baths_y"] = df["baths_y"].str.replace(r"\s*baths?\s*", "", case=False)
-    df["beds"] = df["beds"].str.replace(r"\s*beds?\s*", "", case=False)
-    df["sq_feet_y"] = df["sq_feet_y"].str.replace("[a-zA-Z]", "", regex=True)
-    df["sq_feet_y"] = df["sq_feet_y"].str.replace(",", "")
-    df["sq_feet_y"] = df["sq_feet_y"].str.replace(" ", "")
-    pattern = r"^\d{3,}(\.\d+)?$"
-    df = df[df["sq_feet_y"].str.match(pattern)]
+    return parse_fields(df, keep_invalid)
+
+
+def parse_fields(df, keep_invalid=False):
+    """
+    Parse beds, baths and square feet to numbers with field_parsing, in one pass per
+    column.
+
+    Rows whose square feet cannot be parsed are dropped, as the clean collection always
+    required a square feet value, unless keep_invalid is set. Invalid beds or baths
+    become NaN. Either way the failed fields of a row are listed in 'parse_errors' and
+    the invalid values are reported.
+    """
+    raw = df[[field for field in FIELD_PARSERS if field in df.columns]].copy()
+    df, invalid_counts = parse_listing_fields(df)
+    for field, count in invalid_counts.items():
+        if count:
+            invalid = raw[field][df[field].isna()]
+            examples = invalid_examples(invalid, FIELD_PARSERS[field], limit=3)
+            print(f"Invalid {field} in {count} of {len(df)} rows, e.g. {examples}")
+    if not keep_invalid and "sq_feet_y" in df.columns:
+        df = df[df["sq_feet_y"].notna()]
     return df
 
 
-def dataframe_to_mongodb(
-    dataframe, username, password, cluster_uri, db_name, collection_name, partitions=4
+def clean_batch(df, columns_to_keep, columns_to_drop_na):
+    """
+    Clean one batch of raw documents, tolerating fields missing from the whole batch.
+
+    Documents scraped before listings had a unit_key are keyed by their raw _id.
+    Unlisted communities get their quadrant from the index set by set_quadrant_index.
+    """
+    if "unit_key" in columns_to_keep and "_id" in df.columns:
+        unit_key = df.get("unit_key", pd.Series(np.nan, index=df.index))
+        missing = unit_key.isna() | (unit_key == "")
+        df["unit_key"] = unit_key.where(~missing, df["_id"].astype(str))
+    df = df.reindex(columns=columns_to_keep)
+    return data_cleaning(
+        df, columns_to_keep, columns_to_drop_na, quadrant_index=_quadrant_index
+    )
+
+
+def load_watermark(client, db_name, clean_collection_name):
+    """
+    Last raw sysdate transformed into the clean collection, or None.
+    """
+    state = client[db_name][TRANSFORM_STATE_COLLECTION].find_one(
+        {"_id": clean_collection_name}
+    )
+    return state["watermark"] if state else None
+
+
+def save_watermark(client, db_name, clean_collection_name, watermark):
+    client[db_name][TRANSFORM_STATE_COLLECTION].update_one(
+        {"_id": clean_collection_name},
+        {"$set": {"watermark": watermark}},
+        upsert=True,
+    )
+
+
+def transform_collection(
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    raw_collection_name,
+    clean_collection_name,
+    columns_to_keep,
+    columns_to_drop_na,
+    batch_size=10000,
+    n_workers=None,
+    n_writers=4,
+    incremental=True,
+    upsert_key="unit_key",
 ):
+    """
+    Stream the raw collection through data_cleaning into the clean collection.
 
-    # Construct the MongoDB Atlas connection URI using the provided username and password
-    mongo_uri = f"mongodb+srv://{username}:{password}@{cluster_uri}/{db_name}?retryWrites=true&w=majority"
+    Incremental runs only read raw documents from the stored watermark (the last
+    processed sysdate) on, with $gte since a scrape run stamps one sysdate on all its
+    documents. Clean documents are upserted by upsert_key, so documents read again
+    replace their previous version instead of duplicating it. The watermark advances
+    once every batch has been written.
 
-    # Split the DataFrame into 'n' partitions
-    df_partitions = np.array_split(dataframe, partitions)
+    Raw documents are read in cursor batches, cleaned in a process pool and the cleaned
+    batches are inserted by a thread pool sharing one client. At most two batches per
+    worker are being cleaned and two per writer are waiting to be written, which bounds
+    memory regardless of the collection size.
 
-    # Connect to MongoDB
-    client = MongoClient(mongo_uri)
-    db = client[db_name]
-    collection = db[collection_name]
+    Parameters:
+    - username, password, cluster_uri, db_name: MongoDB Atlas connection details.
+    - raw_collection_name, clean_collection_name: Source and target collections.
+    - columns_to_keep, columns_to_drop_na: See data_cleaning.
+    - batch_size (int, optional): Raw documents per batch. Defaults to 10000.
+    - n_workers (int, optional): Cleaning processes. Defaults to the number of cores.
+    - n_writers (int, optional): Concurrent write threads. Defaults to 4.
+    - incremental (bool, optional): Only transform raw documents from the watermark on.
+      Defaults to True.
+    - upsert_key (str, optional): Field identifying a clean document, None to insert
+      instead of upserting. Defaults to 'unit_key'.
 
-    for partition in df_partitions:
-        # Convert partition to dictionary format for MongoDB
-        records = partition.to_dict(orient="records")
+    Returns:
+    - dict: Raw documents read, clean documents written, the elapsed seconds and the
+      new watermark.
+    """
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
 
-        # Insert records into the collection
-        collection.insert_many(records)
-        print(f"Inserted {len(records)} records into {db_name}.{collection_name}")
+    n_workers = n_workers or os.cpu_count() or 1
+    client = MongoClient(mongo_uri, maxPoolSize=n_writers + 1)
+    collection = client[db_name][clean_collection_name]
 
-    # Close the connection
-    client.close()
+    # Indexes for the watermark query and the upserts
+    client[db_name][raw_collection_name].create_index("sysdate")
+    collection.create_index("sysdate")
+    if upsert_key:
+        collection.create_index(
+            upsert_key,
+            unique=True,
+            partialFilterExpression={upsert_key: {"$exists": True}},
+        )
+
+    watermark = (
+        load_watermark(client, db_name, clean_collection_name) if incremental else None
+    )
+    query = {"sysdate": {"$gte": watermark}} if watermark else None
+    if upsert_key and watermark is None:
+        # A run over the whole raw collection recreates the documents inserted before
+        # clean documents were keyed
+        removed = collection.delete_many({upsert_key: {"$exists": False}}).deleted_count
+        if removed:
+            print(f"Removed {removed} clean documents without {upsert_key}")
+    print(f"Transforming raw documents from sysdate {watermark or 'start'}")
+
+    # One quadrant fallback index over the whole raw collection, shared by all workers
+    index_start = time.perf_counter()
+    quadrant_index = load_quadrant_index(
+        username,
+        password,
+        cluster_uri,
+        db_name,
+        raw_collection_name,
+        incremental=incremental,
+    )
+    n_labeled = 0 if quadrant_index is None else len(quadrant_index["labels"])
+    print(
+        f"Built the quadrant index over {n_labeled} labeled locations in "
+        f"{time.perf_counter() - index_start:.1f}s"
+    )
+
+    def write(df):
+        return write_batch(collection, df.to_dict(orient="records"), upsert_key)
+
+    batches = iter_mongodb_batches(
+        username,
+        password,
+        cluster_uri,
+        db_name,
+        raw_collection_name,
+        batch_size=batch_size,
+        query=query,
+        projection={col: 1 for col in columns_to_keep},
+    )
+
+    rows_read = 0
+    rows_written = 0
+    max_sysdate = watermark
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=set_quadrant_index,
+            initargs=(quadrant_index,),
+        ) as cleaners, ThreadPoolExecutor(max_workers=n_writers) as writers:
+            cleaning = set()
+            writing = set()
+
+            def collect(done):
+                nonlocal rows_written
+                for future in done:
+                    if future in cleaning:
+                        cleaning.remove(future)
+                        writing.add(writers.submit(write, future.result()))
+                    else:
+                        writing.remove(future)
+                        rows_written += future.result()
+
+            for batch in batches:
+                rows_read += len(batch)
+                if "sysdate" in batch.columns and batch["sysdate"].notna().any():
+                    batch_max = batch["sysdate"].dropna().max()
+                    max_sysdate = max(max_sysdate or batch_max, batch_max)
+                cleaning.add(
+                    cleaners.submit(
+                        clean_batch, batch, columns_to_keep, columns_to_drop_na
+                    )
+                )
+                # Wait while the pools hold as many batches as the memory bound allows
+                while len(cleaning) >= 2 * n_workers or len(writing) >= 2 * n_writers:
+                    done, _ = wait(cleaning | writing, return_when=FIRST_COMPLETED)
+                    collect(done)
+                print(f"Read {rows_read} raw documents, wrote {rows_written}")
+
+            while cleaning or writing:
+                done, _ = wait(cleaning | writing, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        # Every batch is written, later runs can start from here
+        if max_sysdate is not None:
+            save_watermark(client, db_name, clean_collection_name, max_sysdate)
+    finally:
+        client.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Transformed {rows_read} raw into {rows_written} clean documents in "
+        f"{elapsed:.1f}s ({rows_read / max(elapsed, 1e-9):.0f} docs/s)"
+    )
+    return {
+        "read": rows_read,
+        "written": rows_written,
+        "seconds": elapsed,
+        "watermark": max_sysdate,
+    }
+
+
+def dataframe_to_mongodb(
+    dataframe, username, password, cluster_uri, db_name, collection_name
+):
+    """
+    Write a DataFrame to MongoDB with mongo_writer.dataframe_to_mongodb.
+    """
+    return mongo_writer.dataframe_to_mongodb(
+        dataframe, username, password, cluster_uri, db_name, collection_name
+    )
 
 
 if __name__ == "__main__":
-    df = mongodb_to_dataframe(
-        username=mongo_db_cred["username"],
-        password=mongo_db_cred["password"],
-        cluster_uri=mongo_db_cred["cluster_uri"],
-        db_name=mongo_db_cred["db_name"],
-        collection_name=mongo_db_cred["collection_name_raw"],
+    parser = argparse.ArgumentParser(
+        description="Transform the raw collection into the clean collection."
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Raw documents per batch (default: 10000)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Cleaning processes (default: number of cores)",
+    )
+    parser.add_argument(
+        "--writers",
+        type=int,
+        default=4,
+        help="Concurrent write threads (default: 4)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Transform the whole raw collection instead of documents past the watermark",
+    )
+    args = parser.parse_args()
+
     # List of columns to retain
     columns_to_keep = [
         "type",
@@ -360,6 +780,8 @@ if __name__ == "__main__":
         "furnishing",
         "lease_term_y",
         "beds",
+        "sysdate",
+        "unit_key",
     ]
     columns_to_drop_na = [
         "cats",
@@ -371,13 +793,17 @@ if __name__ == "__main__":
         "lease_term_y",
         "beds",
     ]
-    df = data_cleaning(df, columns_to_keep, columns_to_drop_na)
-    dataframe_to_mongodb(
-        dataframe=df,
+    transform_collection(
         username=mongo_db_cred["username"],
         password=mongo_db_cred["password"],
         cluster_uri=mongo_db_cred["cluster_uri"],
         db_name=mongo_db_cred["db_name"],
-        collection_name=mongo_db_cred["collection_name_clean"],
-        partitions=5,
+        raw_collection_name=mongo_db_cred["collection_name_raw"],
+        clean_collection_name=mongo_db_cred["collection_name_clean"],
+        columns_to_keep=columns_to_keep,
+        columns_to_drop_na=columns_to_drop_na,
+        batch_size=args.batch_size,
+        n_workers=args.workers,
+        n_writers=args.writers,
+        incremental=not args.full,
     )
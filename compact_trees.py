@@ -0,0 +1,304 @@
+from pathlib import Path
+import numpy as np
+import pickle
+import json
+
+# Model types whose artifacts can be exported to the compact tree layout
+COMPACT_MODEL_TYPES = {"decision_tree", "random_forest", "gradient_boosting", "xgboost"}
+
+
+class CompactTreeEnsemble:
+    """
+    Tree ensemble stored as flat, narrow arrays and scored with numpy only.
+
+    Every split threshold is replaced by its index into a per-feature table of sorted
+    float32 thresholds, so a row is binned once per feature and each node comparison
+    becomes an integer comparison. Child indices are local to their tree, which keeps
+    them in int16 for all but very deep trees. Prediction is
+    base_score + scale * sum of the leaf values reached in every tree.
+    """
+
+    def __init__(
+        self,
+        feature,
+        threshold_bin,
+        left,
+        right,
+        value,
+        tree_offsets,
+        bin_edges,
+        feature_offsets,
+        max_depth,
+        scale,
+        base_score,
+        strict,
+    ):
+        self.feature = feature
+        self.threshold_bin = threshold_bin
+        self.left = left
+        self.right = right
+        self.value = value
+        self.tree_offsets = tree_offsets
+        self.bin_edges = bin_edges
+        self.feature_offsets = feature_offsets
+        self.max_depth = int(max_depth)
+        self.scale = float(scale)
+        self.base_score = float(base_score)
+        # True when a row goes left on x < threshold (xgboost), False for x <= threshold
+        self.strict = bool(strict)
+
+    @classmethod
+    def from_trees(cls, trees, n_features, scale=1.0, base_score=0.0, strict=False):
+        """
+        Build the compact layout from a list of trees.
+
+        Parameters:
+        - trees: List of dicts with node arrays "feature" (-1 for leaves), "threshold",
+          "left", "right" (local child indices) and "value" (leaf values).
+        - n_features: Number of input features.
+        - scale: Factor applied to the summed leaf values.
+        - base_score: Constant added to every prediction.
+        - strict: Whether rows go left on x < threshold instead of x <= threshold.
+        """
+        feature = np.concatenate([tree["feature"] for tree in trees]).astype(np.int64)
+        threshold = np.concatenate([tree["threshold"] for tree in trees])
+        is_split = feature >= 0
+
+        # Per-feature sorted tables of the distinct float32 thresholds
+        edges = []
+        threshold_bin = np.zeros(len(feature), dtype=np.int64)
+        for f in range(n_features):
+            nodes = np.flatnonzero(feature == f)
+            table = np.unique(threshold[nodes])
+            threshold_bin[nodes] = np.searchsorted(table, threshold[nodes])
+            edges.append(table)
+        feature_offsets = np.cumsum([0] + [len(table) for table in edges])
+
+        node_counts = [len(tree["feature"]) for tree in trees]
+        child_dtype = np.int16 if max(node_counts) < 2**15 else np.int32
+        bin_dtype = np.uint16 if max(map(len, edges), default=0) < 2**16 else np.uint32
+
+        return cls(
+            feature=np.where(is_split, feature, -1).astype(np.int16),
+            threshold_bin=threshold_bin.astype(bin_dtype),
+            left=np.concatenate([tree["left"] for tree in trees]).astype(child_dtype),
+            right=np.concatenate([tree["right"] for tree in trees]).astype(child_dtype),
+            value=np.concatenate([tree["value"] for tree in trees]).astype(np.float32),
+            tree_offsets=np.cumsum([0] + node_counts[:-1]).astype(np.int32),
+            bin_edges=np.concatenate(edges or [np.empty(0)]).astype(np.float32),
+            feature_offsets=feature_offsets.astype(np.int32),
+            max_depth=max(tree["depth"] for tree in trees),
+            scale=scale,
+            base_score=base_score,
+            strict=strict,
+        )
+
+    def bin_rows(self, X):
+        """
+        Replace every feature value by the number of thresholds it passes.
+        """
+        side = "right" if self.strict else "left"
+        bins = np.zeros(X.shape, dtype=np.int32)
+        for f in range(len(self.feature_offsets) - 1):
+            table = self.bin_edges[
+                self.feature_offsets[f] : self.feature_offsets[f + 1]
+            ]
+            if len(table):
+                bins[:, f] = np.searchsorted(table, X[:, f], side=side)
+        return bins
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        bins = self.bin_rows(X)
+        rows = np.arange(len(X))[:, None]
+
+        # Walk all trees for all rows at once, one level per iteration
+        node = np.broadcast_to(self.tree_offsets, (len(X), len(self.tree_offsets)))
+        node = node.astype(np.int64)
+        for _ in range(self.max_depth):
+            feature = self.feature[node]
+            is_leaf = feature < 0
+            if is_leaf.all():
+                break
+            go_left = bins[rows, np.maximum(feature, 0)] <= self.threshold_bin[node]
+            child = np.where(go_left, self.left[node], self.right[node])
+            node = np.where(is_leaf, node, self.tree_offsets + child.astype(np.int64))
+
+        return self.base_score + self.scale * self.value[node].sum(
+            axis=1, dtype=np.float64
+        )
+
+    def save(self, path):
+        np.savez(
+            path,
+            feature=self.feature,
+            threshold_bin=self.threshold_bin,
+            left=self.left,
+            right=self.right,
+            value=self.value,
+            tree_offsets=self.tree_offsets,
+            bin_edges=self.bin_edges,
+            feature_offsets=self.feature_offsets,
+            params=np.array(
+                [self.max_depth, self.scale, self.base_score, self.strict],
+                dtype=np.float64,
+            ),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        max_depth, scale, base_score, strict = arrays.pop("params")
+        return cls(
+            max_depth=max_depth,
+            scale=scale,
+            base_score=base_score,
+            strict=strict,
+            **arrays,
+        )
+
+
+def _float32_at_most(threshold):
+    """
+    Largest float32 values not above the float64 thresholds.
+
+    With float32 inputs, x <= t holds exactly when x <= this value, so rounding down
+    keeps sklearn's split decisions unchanged.
+    """
+    rounded = threshold.astype(np.float32)
+    too_high = rounded.astype(np.float64) > threshold
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+def _sklearn_tree(tree):
+    """
+    Node arrays of a fitted sklearn Tree object.
+    """
+    is_leaf = tree.children_left < 0
+    return {
+        "feature": np.where(is_leaf, -1, tree.feature),
+        "threshold": np.where(is_leaf, 0, _float32_at_most(tree.threshold)),
+        "left": np.where(is_leaf, 0, tree.children_left),
+        "right": np.where(is_leaf, 0, tree.children_right),
+        "value": np.where(is_leaf, tree.value[:, 0, 0], 0),
+        "depth": tree.max_depth,
+    }
+
+
+def _xgboost_tree(dump, feature_names):
+    """
+    Node arrays of one tree from xgboost's JSON dump.
+    """
+    nodes = {}
+
+    def visit(node, depth):
+        nodes[node["nodeid"]] = (node, depth)
+        for child in node.get("children", []):
+            visit(child, depth + 1)
+
+    visit(json.loads(dump), 0)
+    local = {nodeid: i for i, nodeid in enumerate(sorted(nodes))}
+
+    n_nodes = len(local)
+    tree = {
+        "feature": np.full(n_nodes, -1),
+        "threshold": np.zeros(n_nodes, dtype=np.float32),
+        "left": np.zeros(n_nodes),
+        "right": np.zeros(n_nodes),
+        "value": np.zeros(n_nodes),
+        "depth": max(depth for _, depth in nodes.values()),
+    }
+    for nodeid, (node, _) in nodes.items():
+        i = local[nodeid]
+        if "leaf" in node:
+            tree["value"][i] = node["leaf"]
+        else:
+            split = node["split"]
+            tree["feature"][i] = (
+                feature_names.index(split) if feature_names else int(split[1:])
+            )
+            tree["threshold"][i] = node["split_condition"]
+            tree["left"][i] = local[node["yes"]]
+            tree["right"][i] = local[node["no"]]
+    return tree
+
+
+def compact_model(model):
+    """
+    Convert a fitted tree model to a CompactTreeEnsemble.
+
+    Supports DecisionTreeRegressor, RandomForestRegressor, GradientBoostingRegressor
+    (squared error loss) and XGBRegressor (reg:squarederror). Missing values are not
+    supported, matching the dense inputs of the prediction endpoint.
+    """
+    name = type(model).__name__
+    n_features = model.n_features_in_
+
+    if name == "DecisionTreeRegressor":
+        return CompactTreeEnsemble.from_trees([_sklearn_tree(model.tree_)], n_features)
+
+    if name == "RandomForestRegressor":
+        return CompactTreeEnsemble.from_trees(
+            [_sklearn_tree(estimator.tree_) for estimator in model.estimators_],
+            n_features,
+            scale=1.0 / len(model.estimators_),
+        )
+
+    if name == "GradientBoostingRegressor":
+        init = model.init_
+        base_score = 0.0 if init == "zero" else float(np.ravel(init.constant_)[0])
+        return CompactTreeEnsemble.from_trees(
+            [_sklearn_tree(estimator.tree_) for estimator in model.estimators_[:, 0]],
+            n_features,
+            scale=model.learning_rate,
+            base_score=base_score,
+        )
+
+    if name == "XGBRegressor":
+        booster = model.get_booster()
+        config = json.loads(booster.save_config())
+        base_score = config["learner"]["learner_model_param"]["base_score"]
+        return CompactTreeEnsemble.from_trees(
+            [
+                _xgboost_tree(dump, booster.feature_names)
+                for dump in booster.get_dump(dump_format="json")
+            ],
+            n_features,
+            base_score=float(base_score.strip("[]")),
+            strict=True,
+        )
+
+    raise ValueError(f"No compact layout for {name}")
+
+
+def export_compact(model, X_eval, path):
+    """
+    Write the compact form of a tree model and report size and accuracy against it.
+
+    Parameters:
+    - model: Fitted tree model, see compact_model.
+    - X_eval: Rows used to compare compact and original predictions.
+    - path: Target .npz path.
+
+    Returns:
+    - Dictionary with pickled and compact sizes (bytes) and the absolute prediction
+      differences on X_eval.
+    """
+    compact = compact_model(model)
+    compact.save(path)
+
+    difference = np.abs(compact.predict(X_eval) - model.predict(X_eval))
+    report = {
+        "pickle_bytes": len(pickle.dumps(model)),
+        "compact_bytes": Path(path).stat().st_size,
+        "max_abs_difference": float(difference.max(initial=0.0)),
+        "mean_abs_difference": float(difference.mean()) if len(difference) else 0.0,
+    }
+    print(
+        f"Compact {type(model).__name__}: {report['pickle_bytes'] / 1e6:.2f} MB -> "
+        f"{report['compact_bytes'] / 1e6:.2f} MB, "
+        f"max abs difference {report['max_abs_difference']:.2e}"
+    )
+    return report
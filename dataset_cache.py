@@ -0,0 +1,272 @@
+from pymongo import MongoClient
+from mongo_writer import connection_uri
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import tempfile
+import hashlib
+import shutil
+import json
+import time
+import uuid
+import os
+from instrumentation import span, cache_lookup, MONGO_FETCH_ROWS
+from feature_engineering import (
+    LISTING_COLUMNS,
+    CATEGORICAL_COLUMNS,
+    BOOLEAN_COLUMNS,
+    NUMERIC_COLUMNS,
+    mongodb_to_dataframe,
+    prepare_listing_frame,
+)
+
+# Bump whenever the on-disk layout or prepare_listing_frame changes meaning
+CACHE_VERSION = 2
+
+# Default location of the local dataset cache
+CACHE_DIR = Path(__file__).parent / "cache"
+
+# Unfinished entries of writers that died are removed after this many seconds
+ABANDONED_WRITE_SECONDS = 3600
+
+
+def collection_fingerprint(username, password, cluster_uri, db_name, collection_name):
+    """
+    Compute a cheap fingerprint of a MongoDB collection without downloading it.
+
+    Parameters:
+    - username, password, cluster_uri, db_name: MongoDB Atlas connection details.
+    - collection_name (str): Collection to fingerprint.
+
+    Returns:
+    - dict: Document count, maximum 'sysdate' and a hash of the newest document's schema.
+    """
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
+
+    # Connect to MongoDB
+    client = MongoClient(mongo_uri)
+    collection = client[db_name][collection_name]
+
+    # Collection metadata only, no document scan
+    count = collection.estimated_document_count()
+
+    # Newest scrape date present in the collection
+    newest = collection.find_one(
+        {"sysdate": {"$exists": True}},
+        projection={"sysdate": 1},
+        sort=[("sysdate", -1)],
+    )
+
+    # Field names of the most recently inserted document describe the schema
+    latest = collection.find_one(sort=[("_id", -1)])
+
+    # Close the connection
+    client.close()
+
+    schema = {
+        "version": CACHE_VERSION,
+        "fields": sorted(latest.keys()) if latest else [],
+        "categorical": CATEGORICAL_COLUMNS,
+        "boolean": BOOLEAN_COLUMNS,
+        "numeric": NUMERIC_COLUMNS,
+    }
+    schema_hash = hashlib.sha1(
+        json.dumps(schema, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+    return {
+        "count": count,
+        "max_sysdate": newest["sysdate"] if newest else None,
+        "schema_hash": schema_hash,
+    }
+
+
+def fingerprint_key(fingerprint):
+    """
+    Turn a collection fingerprint into a short, filesystem-safe cache key.
+    """
+    return hashlib.sha1(
+        json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def write_frame(df, path, fingerprint):
+    """
+    Write a prepared listing DataFrame to a columnar cache directory.
+
+    Every column is stored as its own .npy file so it can be memory mapped on read.
+    Categorical columns are stored as their codes, with the vocabulary in meta.json.
+
+    The frame is written to a private temporary directory next to path and renamed into
+    place, so concurrent writers of the same entry never share files. If another writer
+    installed path first, its entry is kept and this one is discarded: both hold the
+    frame of the same fingerprint.
+
+    Parameters:
+    - df (pd.DataFrame): Prepared listing DataFrame.
+    - path (Path): Target cache directory.
+    - fingerprint (dict): Fingerprint of the collection the frame was built from.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+
+    meta = {"fingerprint": fingerprint, "rows": len(df), "columns": {}}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            np.save(tmp_path / f"{col}.npy", df[col].cat.codes.to_numpy())
+            meta["columns"][col] = {
+                "kind": "codes",
+                "vocabulary": list(df[col].cat.categories),
+            }
+        else:
+            np.save(tmp_path / f"{col}.npy", df[col].to_numpy())
+            meta["columns"][col] = {"kind": "values"}
+
+    with open(tmp_path / "meta.json", "w") as file:
+        json.dump(meta, file, default=str)
+
+    # Rename the finished directory in so readers never see a partial cache; the rename
+    # fails if a concurrent writer got there first
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not (path / "meta.json").exists():
+            raise
+        print(f"Cache entry {path} was written concurrently, keeping it")
+
+
+def read_frame(path):
+    """
+    Read a cached listing DataFrame, memory mapping each column file.
+
+    The DataFrame constructor consolidates columns of the same dtype into 2-D blocks,
+    so the mapped numeric columns are copied into memory once here; the cache saves
+    the fetch and the preparation, not that copy.
+
+    Parameters:
+    - path (Path): Cache directory written by write_frame.
+
+    Returns:
+    - pd.DataFrame: The cached listing DataFrame.
+    """
+    path = Path(path)
+    with open(path / "meta.json") as file:
+        meta = json.load(file)
+
+    columns = {}
+    for col, spec in meta["columns"].items():
+        values = np.load(path / f"{col}.npy", mmap_mode="r")
+        if spec["kind"] == "codes":
+            values = pd.Categorical.from_codes(values, categories=spec["vocabulary"])
+        columns[col] = values
+
+    return pd.DataFrame(columns, columns=LISTING_COLUMNS, copy=False)
+
+
+def remove_entry(path):
+    """
+    Delete a cache entry, renaming it away first so it disappears in a single step.
+    """
+    path = Path(path)
+    trash = path.with_name(f".{path.name}.{uuid.uuid4().hex}.deleted")
+    try:
+        os.replace(path, trash)
+    except OSError:
+        return
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def prune_entries(collection_dir, entry):
+    """
+    Remove the entries of collection_dir written before entry, the one just installed.
+
+    Newer entries, installed by concurrent loads that saw a newer fingerprint, are kept,
+    as are the temporary directories of writes still in progress.
+    """
+    installed = (Path(entry) / "meta.json").stat().st_mtime
+    for other in Path(collection_dir).iterdir():
+        if other == Path(entry):
+            continue
+        if other.name.startswith("."):
+            # Temporary directory of a writer, only removed once clearly abandoned
+            try:
+                abandoned = (
+                    time.time() - other.stat().st_mtime > ABANDONED_WRITE_SECONDS
+                )
+            except OSError:
+                continue
+            if abandoned:
+                shutil.rmtree(other, ignore_errors=True)
+            continue
+        try:
+            written = (other / "meta.json").stat().st_mtime
+        except OSError:
+            # Entry without metadata, left by an older version of the cache
+            written = 0
+        if written < installed:
+            remove_entry(other)
+
+
+def load_listing_frame(
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    collection_name,
+    cache_dir=CACHE_DIR,
+    use_cache=True,
+):
+    """
+    Return the prepared listing DataFrame, served from the local cache when it is current.
+
+    The collection is fingerprinted first; if a cache entry exists for that fingerprint
+    it is memory mapped from disk and the collection is never downloaded. Otherwise the
+    collection is fetched, prepared and written to the cache, and the entries written
+    before it are removed.
+
+    Parameters:
+    - username, password, cluster_uri, db_name: MongoDB Atlas connection details.
+    - collection_name (str): Clean collection to read.
+    - cache_dir (Path, optional): Root of the cache. Defaults to ./cache.
+    - use_cache (bool, optional): Set to False to force a fetch and rebuild the cache.
+
+    Returns:
+    - pd.DataFrame: DataFrame restricted to LISTING_COLUMNS and cast per plan_dtypes.
+    """
+    with span("collection_fingerprint"):
+        fingerprint = collection_fingerprint(
+            username, password, cluster_uri, db_name, collection_name
+        )
+    collection_dir = Path(cache_dir) / collection_name
+    entry = collection_dir / fingerprint_key(fingerprint)
+
+    hit = use_cache and (entry / "meta.json").exists()
+    cache_lookup("dataset", hit)
+    if hit:
+        print(f"Loaded {collection_name} from cache {entry}")
+        return read_frame(entry)
+
+    with span("mongo_fetch"):
+        df = mongodb_to_dataframe(
+            username=username,
+            password=password,
+            cluster_uri=cluster_uri,
+            db_name=db_name,
+            collection_name=collection_name,
+        )
+    MONGO_FETCH_ROWS.inc(len(df), collection=collection_name)
+    df = prepare_listing_frame(df)
+
+    # A forced rebuild replaces the entry of the current fingerprint as well
+    if not use_cache:
+        remove_entry(entry)
+    write_frame(df, entry, fingerprint)
+    print(f"Cached {len(df)} rows of {collection_name} at {entry}")
+
+    # Keep a single entry per collection, unless a concurrent load installed a newer one
+    prune_entries(collection_dir, entry)
+
+    return df
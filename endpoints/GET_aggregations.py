@@ -1,8 +1,8 @@
-from feature_engineering import mongodb_to_dataframe, type_cast_columns, remove_outliers
 from fastapi import APIRouter, HTTPException, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from credentials import mongo_db_cred
+from instrumentation import span
 
 # Initialize the APIRouter for route registration
 router = APIRouter()
@@ -25,6 +25,18 @@ ALLOWED_AGGREGATION_TYPES = {
 # Define numeric columns on which aggregation can be performed
 ALLOWED_NUMERICS = {"price_y", "baths_y", "sq_feet_y"}
 
+
+def aggregation_dependencies():
+    """
+    Import the data stack of this route (pandas and pymongo through feature_engineering
+    and dataset_cache) on first use rather than when the server starts.
+    """
+    from feature_engineering import remove_outliers
+    from dataset_cache import load_listing_frame
+
+    return load_listing_frame, remove_outliers
+
+
 # Define pydantic model for structured response
 class Aggregations(BaseModel):
     aggregation: dict
@@ -49,50 +61,17 @@ def aggregate_data(aggregation_type: str, numeric_column: str, category_column:
         raise HTTPException(status_code=400, detail="Invalid category column")
 
     try:
-        # Fetch data from MongoDB
-        df = mongodb_to_dataframe(
-            username=mongo_db_cred["username"],
-            password=mongo_db_cred["password"],
-            cluster_uri=mongo_db_cred["cluster_uri"],
-            db_name=mongo_db_cred["db_name"],
-            collection_name=mongo_db_cred["collection_name_clean"],
-        )
-
-        # Retain specific columns of interest from the dataframe
-        df = df[
-            [
-                "type",
-                "community",
-                "cats",
-                "dogs",
-                "price_y",
-                "baths_y",
-                "sq_feet_y",
-                "lease_term_y",
-                "beds",
-                "Quadrant",
-            ]
-        ]
-
-        # Convert 'Studio' in 'beds' column to '1' for consistency
-        df["beds"] = df["beds"].replace("Studio", "1")
-
-        # Define dictionary for type casting columns
-        type_dict = {
-            "type": str,
-            "community": str,
-            "cats": bool,
-            "dogs": bool,
-            "price_y": float,
-            "baths_y": float,
-            "sq_feet_y": float,
-            "lease_term_y": str,
-            "beds": float,
-            "Quadrant": str,
-        }
-
-        # Cast dataframe columns to appropriate data types
-        df = type_cast_columns(df, type_dict)
+        load_listing_frame, remove_outliers = aggregation_dependencies()
+
+        # Fetch prepared data from the local cache or MongoDB
+        with span("load_listing_frame"):
+            df = load_listing_frame(
+                username=mongo_db_cred["username"],
+                password=mongo_db_cred["password"],
+                cluster_uri=mongo_db_cred["cluster_uri"],
+                db_name=mongo_db_cred["db_name"],
+                collection_name=mongo_db_cred["collection_name_clean"],
+            )
 
         # Remove outliers from specified columns based on quantiles
         df = remove_outliers(
@@ -103,7 +82,10 @@ def aggregate_data(aggregation_type: str, numeric_column: str, category_column:
         )
 
         # Perform the required aggregation
-        grouped = df.groupby(category_column)[numeric_column].agg(aggregation_type)
+        with span("aggregation"):
+            grouped = df.groupby(category_column, observed=True)[numeric_column].agg(
+                aggregation_type
+            )
 
         # Return aggregated results as a dictionary
         return {"aggregation": grouped.to_dict()}
@@ -3,6 +3,7 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from pathlib import Path
 import importlib.util
+from instrumentation import span
 
 # Create an APIRouter instance
 router = APIRouter()
@@ -23,6 +24,7 @@ ALLOWED_MODEL_TYPES = {
 class Metrics(BaseModel):
     model_type: str
     metrics: dict
+    confidence_intervals: dict = {}
 
 
 # Dynamic API endpoint for predictions
@@ -42,12 +44,20 @@ async def get_model_metrics(model_type: str):
         metrics = importlib.util.module_from_spec(metrics_module)
 
         # Load the module
-        metrics_module.loader.exec_module(metrics)
+        with span("metrics_exec_module", model_type):
+            metrics_module.loader.exec_module(metrics)
 
         # Access the metrics dictionary from the imported module
         model_metrics = metrics.metrics
 
-        result = {"model_type": model_type, "metrics": model_metrics}
+        # Bootstrap intervals are only present for models trained with them
+        confidence_intervals = getattr(metrics, "confidence_intervals", {})
+
+        result = {
+            "model_type": model_type,
+            "metrics": model_metrics,
+            "confidence_intervals": confidence_intervals,
+        }
         return result
     except Exception as e:
         return JSONResponse(
@@ -2,25 +2,41 @@
 from fastapi import APIRouter, HTTPException, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
 import pickle
+import time
+import os
 import numpy as np
 from stats import label_stats, feature_stats
+from feature_schema import ALLOWED_MODEL_TYPES, HouseFeatures
 from pathlib import Path
+from endpoints.model_routing import LatencyTracker, choose_model, ALLOWED_PREFERENCES
+from compact_trees import CompactTreeEnsemble
+from instrumentation import (
+    span,
+    cache_lookup,
+    observe_since_request_start,
+    PREDICTIONS_IN_FLIGHT,
+)
 
 # Create an APIRouter instance
 router = APIRouter()
 
-# Defining allowed machine learning models in set for the API
-ALLOWED_MODEL_TYPES = {
-    "linear",
-    "random_forest",
-    "xgboost",
-    "svr",
-    "decision_tree",
-    "gradient_boosting",
-    "ridge",
-    "lasso",
-}
+# Executor running model inference off the event loop
+PREDICTION_WORKERS = int(os.environ.get("PREDICTION_WORKERS", os.cpu_count() or 1))
+prediction_executor = ThreadPoolExecutor(max_workers=PREDICTION_WORKERS)
+
+# Live latency measurements shared by all prediction routes
+latency_tracker = LatencyTracker()
+
+# Loaded models per model type, reloaded when the model files change
+_MODEL_CACHE = {}
+
+# Set to 0 to always serve the pickled models instead of the compact tree artifacts
+USE_COMPACT_MODELS = os.environ.get("USE_COMPACT_MODELS", "1") != "0"
+
 
 # define pydantic data class for output
 class PredictionResponse(BaseModel):
@@ -28,223 +44,145 @@ class PredictionResponse(BaseModel):
     prediction: float
 
 
-# define pydantic data class for inputs
-class HouseFeatures(BaseModel):
-    baths_y: float
-    sq_feet_y: float
-    beds: float
-    type_Apartment: float
-    type_Apartment_Parking_Spot: float
-    type_Apartment_Townhouse: float
-    type_Basement: float
-    type_Condo_Unit: float
-    type_Condo_Unit_Apartment: float
-    type_Duplex: float
-    type_House: float
-    type_Loft: float
-    type_Main_Floor: float
-    type_Room_For_Rent: float
-    type_Townhouse: float
-    type_Townhouse_Apartment: float
-    community_Abbeydale: float
-    community_Acadia: float
-    community_Albert_Park: float
-    community_Altadore: float
-    community_Applewood: float
-    community_Arbour_Lake: float
-    community_Aspen_Woods: float
-    community_Bankview: float
-    community_Bayview: float
-    community_Beddington: float
-    community_Beltline: float
-    community_Bowness: float
-    community_Braeside: float
-    community_Brentwood: float
-    community_Briar_Hill: float
-    community_Bridgeland: float
-    community_Cambrian_Heights: float
-    community_Canyon_Meadows: float
-    community_Capitol_Hill: float
-    community_Castleridge: float
-    community_Cedarbrae: float
-    community_Charleswood: float
-    community_Chinook_Park: float
-    community_Citadel: float
-    community_Cityscape: float
-    community_Cliff_Bungalow: float
-    community_Coach_Hill: float
-    community_Collingwood: float
-    community_Connaught: float
-    community_Copperfield: float
-    community_Coral_Springs: float
-    community_Cougar_Ridge: float
-    community_Country_Hills: float
-    community_Country_Hills_Village: float
-    community_Coventry_Hills: float
-    community_Crescent_Heights: float
-    community_Dalhousie: float
-    community_Deer_Ridge: float
-    community_Discovery_Ridge: float
-    community_Douglas_Glen: float
-    community_Dover: float
-    community_Dover_Glen: float
-    community_Downtown: float
-    community_East_Village: float
-    community_Eau_Claire: float
-    community_Edgemont: float
-    community_Elboya: float
-    community_Erin_Woods: float
-    community_Erlton: float
-    community_Evanston: float
-    community_Evergreen: float
-    community_Falconridge: float
-    community_Fonda: float
-    community_Forest_Heights: float
-    community_Forest_Lawn: float
-    community_Garrison_Green: float
-    community_Garrison_Woods: float
-    community_Glamorgan: float
-    community_Glenbrook: float
-    community_Glendale: float
-    community_Greenview: float
-    community_Greenwich: float
-    community_Hamptons: float
-    community_Harvest_Hills: float
-    community_Hawkwood: float
-    community_Haysboro: float
-    community_Hidden_Valley: float
-    community_Highland_Park: float
-    community_Highwood: float
-    community_Hillhurst: float
-    community_Huntington_Hills: float
-    community_Inglewood: float
-    community_Kelvin_Grove: float
-    community_Killarney: float
-    community_Kincora: float
-    community_Kingsland: float
-    community_Lake_Bonavista: float
-    community_Lakeview: float
-    community_Lincoln_Park: float
-    community_Lower_Mount_Royal: float
-    community_Lynnwood: float
-    community_Manchester: float
-    community_Marlborough: float
-    community_Martindale: float
-    community_Mayland_Heights: float
-    community_McKenzie_Towne: float
-    community_Mckenzie_Towne: float
-    community_Mission: float
-    community_Monterey_Park: float
-    community_Montgomery: float
-    community_Montreux: float
-    community_Mount_Pleasant: float
-    community_Mount_Royal: float
-    community_New_Brighton: float
-    community_North_Glenmore_Park: float
-    community_Oakridge: float
-    community_Ogden: float
-    community_Palliser: float
-    community_Parkhill_Stanley_Park: float
-    community_Patterson: float
-    community_Penbrooke_Meadows: float
-    community_Pineridge: float
-    community_Point_McKay: float
-    community_Queensland: float
-    community_Radisson_Heights: float
-    community_Ramsay: float
-    community_Ranchlands: float
-    community_Red_Carpet: float
-    community_Redstone: float
-    community_Renfrew: float
-    community_Richmond_Knob_Hill: float
-    community_Riverbend: float
-    community_Rosedale: float
-    community_Rosscarrock: float
-    community_Royal_Oak: float
-    community_Rundle: float
-    community_Saddle_Ridge: float
-    community_Saddlebrook: float
-    community_Sandstone: float
-    community_Savanna: float
-    community_Scarboro: float
-    community_Scenic_Acres: float
-    community_Shaganappi: float
-    community_Shawnee_Slopes: float
-    community_Sherwood: float
-    community_Signal_Hill: float
-    community_Silver_Springs: float
-    community_Skyview: float
-    community_South_Calgary: float
-    community_Southview: float
-    community_Springbank_Hill: float
-    community_Spruce_Cliff: float
-    community_St_Andrews_Heights: float
-    community_Strathcona_Park: float
-    community_Sunalta: float
-    community_Sunnyside: float
-    community_Taradale: float
-    community_Tuxedo: float
-    community_Tuxedo_Park: float
-    community_University_District: float
-    community_University_Heights: float
-    community_Varsity: float
-    community_Victoria_Park: float
-    community_Vista_Heights: float
-    community_West_Hillhurst: float
-    community_West_Springs: float
-    community_Westgate: float
-    community_Whitehorn: float
-    community_Wildwood: float
-    community_Willow_Park: float
-    community_Windsor_Park: float
-    community_Winston_Heights: float
-    community_Woodlands: float
-    cats_False: float
-    cats_True: float
-    dogs_False: float
-    dogs_True: float
-    lease_term_y_12_months: float
-    lease_term_y_Long_Term: float
-    lease_term_y_Negotiable: float
-    lease_term_y_Short_Term: float
-    Quadrant_Downtown: float
-    Quadrant_NE: float
-    Quadrant_NW: float
-    Quadrant_SE: float
-    Quadrant_SW: float
+# define pydantic data class for output of automatic model routing
+class AutoPredictionResponse(BaseModel):
+    model_type: str
+    prediction: float
+    estimated_latency_ms: float
+
+
+def load_model(model_type):
+    """
+    Return the trained model for model_type, loading it only when its files changed.
+
+    Tree models are served from their compact artifact when it is at least as recent
+    as the pkl file, which is smaller to load and faster to score.
+    """
+    models_dir = Path(__file__).parent.parent / "models"
+    model_path = models_dir / f"{model_type}.pkl"
+    compact_path = models_dir / f"{model_type}_compact.npz"
+    mtime = model_path.stat().st_mtime
+    compact_mtime = compact_path.stat().st_mtime if compact_path.exists() else None
+    use_compact = (
+        USE_COMPACT_MODELS and compact_mtime is not None and compact_mtime >= mtime
+    )
+
+    key = (mtime, compact_mtime if use_compact else None)
+    cached = _MODEL_CACHE.get(model_type)
+    hit = cached is not None and cached[0] == key
+    cache_lookup("model", hit)
+    if not hit:
+        if use_compact:
+            model = CompactTreeEnsemble.load(compact_path)
+        else:
+            with open(model_path, "rb") as model_file:
+                model = pickle.load(model_file)["model"]
+        cached = (key, model)
+        _MODEL_CACHE[model_type] = cached
+    return cached[1]
+
+
+def run_prediction(model_type, input_data):
+    """
+    Scale the input, predict with the model and unscale the result.
+
+    The inference time is recorded in latency_tracker.
+    """
+    # scaling
+    input_data.sq_feet_y = (
+        input_data.sq_feet_y - feature_stats["sq_feet_y"]["min"]
+    ) / (feature_stats["sq_feet_y"]["max"] - feature_stats["sq_feet_y"]["min"])
+
+    # create input_array based on pydantic dataclass
+    input_array = np.array(list(input_data.dict().values())).reshape(1, -1)
+
+    # Load your pre-trained model
+    with span("model_load", model_type):
+        loaded_model = load_model(model_type)
+
+    # Predict on input data
+    start = time.perf_counter()
+    with span("inference", model_type):
+        prediction = loaded_model.predict(input_array)
+    latency_tracker.record(model_type, time.perf_counter() - start)
+
+    # Unscale
+    return float(
+        (
+            prediction[0]
+            * (label_stats["price_y"]["max"] - label_stats["price_y"]["min"])
+        )
+        + label_stats["price_y"]["min"]
+    )
+
+
+async def predict_in_executor(model_type, input_data):
+    """
+    Run a prediction on the prediction executor, counting it as in flight until done.
+    """
+    latency_tracker.started()
+    PREDICTIONS_IN_FLIGHT.inc()
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            prediction_executor, run_prediction, model_type, input_data
+        )
+    finally:
+        PREDICTIONS_IN_FLIGHT.dec()
+        latency_tracker.finished()
 
 
 # Dynamic API endpoint for predictions
 @router.post("/{model_type}/predict/", response_model=PredictionResponse)
 async def predict_rent_price(model_type: str, input_data: HouseFeatures):
+    # Body parsing and HouseFeatures validation happen before the handler runs
+    observe_since_request_start("request_validation", model_type)
     try:
         if model_type not in ALLOWED_MODEL_TYPES:
             raise HTTPException(status_code=400, detail="Invalid model_type")
-        # scaling
-        input_data.sq_feet_y = (
-            input_data.sq_feet_y - feature_stats["sq_feet_y"]["min"]
-        ) / (feature_stats["sq_feet_y"]["max"] - feature_stats["sq_feet_y"]["min"])
 
-        # create input_array based on pydantic dataclass
-        input_array = np.array(list(input_data.dict().values())).reshape(1, -1)
+        prediction = await predict_in_executor(model_type, input_data)
+
+        # Return the prediction as a JSON response
+        result = {"model_type": model_type, "prediction": prediction}
+        return result
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": f"An error occurred: {e}"},
+        )
+
 
-        # Load your pre-trained model and make predictions
-        model_path = (Path(__file__).parent.parent / "models") / f"{model_type}.pkl"
-        with open(model_path, "rb") as model_file:
-            data = pickle.load(model_file)
-            loaded_model = data["model"]
+# API endpoint choosing the model from a latency budget or accuracy preference
+@router.post("/predict/auto", response_model=AutoPredictionResponse)
+async def predict_rent_price_auto(
+    input_data: HouseFeatures,
+    latency_budget_ms: Optional[float] = None,
+    preference: str = "accuracy",
+):
+    observe_since_request_start("request_validation", "auto")
+    if preference not in ALLOWED_PREFERENCES:
+        raise HTTPException(status_code=400, detail="Invalid preference")
+    if latency_budget_ms is not None and latency_budget_ms <= 0:
+        raise HTTPException(status_code=400, detail="Invalid latency_budget_ms")
 
-        # Predict on input data
-        prediction = loaded_model.predict(input_array)
+    try:
+        model_type, estimated_latency_ms = choose_model(
+            latency_tracker,
+            ALLOWED_MODEL_TYPES,
+            workers=PREDICTION_WORKERS,
+            latency_budget_ms=latency_budget_ms,
+            preference=preference,
+        )
 
-        # Unscale
-        prediction[0] = (
-            prediction[0]
-            * (label_stats["price_y"]["max"] - label_stats["price_y"]["min"])
-        ) + label_stats["price_y"]["min"]
+        prediction = await predict_in_executor(model_type, input_data)
 
-        # Return the prediction as a JSON response
-        result = {"model_type": model_type, "prediction": float(prediction[0])}
+        # Return the prediction and the model that answered
+        result = {
+            "model_type": model_type,
+            "prediction": prediction,
+            "estimated_latency_ms": estimated_latency_ms,
+        }
         return result
     except Exception as e:
         return JSONResponse(
@@ -0,0 +1,137 @@
+from pathlib import Path
+import importlib.util
+import threading
+from instrumentation import cache_lookup
+
+# Directory holding the model artifacts and their metrics files
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+# Rough single-row latency priors (ms), used until a model has been measured
+PRIOR_LATENCY_MS = {
+    "linear": 0.1,
+    "ridge": 0.1,
+    "lasso": 0.1,
+    "decision_tree": 0.2,
+    "xgboost": 1.0,
+    "gradient_boosting": 1.0,
+    "svr": 5.0,
+    "random_forest": 10.0,
+}
+
+# Supported values of the preference query parameter
+ALLOWED_PREFERENCES = {"accuracy", "speed"}
+
+
+class LatencyTracker:
+    """
+    Live per-model inference latency (exponentially weighted moving average) and the
+    number of predictions currently submitted to the prediction executor.
+    """
+
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self.latency_ms = {}
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def record(self, model_type, seconds):
+        with self.lock:
+            latency = seconds * 1000
+            previous = self.latency_ms.get(model_type)
+            if previous is None:
+                self.latency_ms[model_type] = latency
+            else:
+                self.latency_ms[model_type] = (
+                    1 - self.smoothing
+                ) * previous + self.smoothing * latency
+
+    def estimate(self, model_type):
+        return self.latency_ms.get(model_type, PRIOR_LATENCY_MS.get(model_type, 1.0))
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def finished(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+# Stored metrics per model type, reloaded when the metrics file changes
+_METRICS_CACHE = {}
+
+
+def stored_rmse(model_type):
+    """
+    RMSE of the model's stored test metrics, or infinity if it has none.
+    """
+    metrics_path = MODELS_DIR / f"{model_type}_metrics.py"
+    if not metrics_path.exists():
+        return float("inf")
+
+    mtime = metrics_path.stat().st_mtime
+    cached = _METRICS_CACHE.get(model_type)
+    cache_lookup("stored_metrics", cached is not None and cached[0] == mtime)
+    if cached is None or cached[0] != mtime:
+        metrics_module = importlib.util.spec_from_file_location("metrics", metrics_path)
+        metrics = importlib.util.module_from_spec(metrics_module)
+        metrics_module.loader.exec_module(metrics)
+        cached = (mtime, metrics.metrics.get("RMSE", float("inf")))
+        _METRICS_CACHE[model_type] = cached
+
+    return cached[1]
+
+
+def choose_model(
+    tracker, model_types, workers, latency_budget_ms=None, preference="accuracy"
+):
+    """
+    Pick the model to answer a prediction within a latency budget.
+
+    Models whose estimated latency fits the budget are candidates; among them the
+    lowest stored RMSE wins ("accuracy") or the lowest latency ("speed"). When more
+    predictions are in flight than there are executor workers, the budget shrinks in
+    proportion to the backlog so that a queue pushes traffic to cheaper models.
+
+    Parameters:
+    - tracker: LatencyTracker with live measurements.
+    - model_types: Model types that can be served.
+    - workers: Number of prediction executor workers.
+    - latency_budget_ms: Optional latency budget in milliseconds.
+    - preference: "accuracy" or "speed".
+
+    Returns:
+    - Tuple of the chosen model type and its estimated latency in milliseconds.
+    """
+    model_types = [
+        model_type
+        for model_type in sorted(model_types)
+        if (MODELS_DIR / f"{model_type}.pkl").exists()
+    ]
+    latency = {model_type: tracker.estimate(model_type) for model_type in model_types}
+
+    backlog = max(0, tracker.in_flight - workers)
+    if latency_budget_ms is None and backlog:
+        preference = "speed"
+    elif latency_budget_ms is not None:
+        latency_budget_ms = latency_budget_ms / (1 + backlog)
+
+    candidates = [
+        model_type
+        for model_type in model_types
+        if latency_budget_ms is None or latency[model_type] <= latency_budget_ms
+    ]
+    if not candidates:
+        # Nothing fits the budget: answer as fast as possible
+        candidates = model_types
+        preference = "speed"
+
+    if preference == "speed":
+        chosen = min(candidates, key=lambda model_type: latency[model_type])
+    else:
+        chosen = min(
+            candidates,
+            key=lambda model_type: (stored_rmse(model_type), latency[model_type]),
+        )
+
+    return chosen, latency[chosen]
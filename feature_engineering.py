@@ -1,19 +1,41 @@
 from pymongo import MongoClient
+from mongo_writer import connection_uri
 import pandas as pd
-from sklearn.model_selection import train_test_split
-
-
-def mongodb_to_dataframe(username, password, cluster_uri, db_name, collection_name):
-    # Construct the MongoDB Atlas connection URI using the provided username and password
-    mongo_uri = f"mongodb+srv://{username}:{password}@{cluster_uri}/{db_name}?retryWrites=true&w=majority"
+import numpy as np
+
+# Columns of the clean collection used for training and aggregation
+LISTING_COLUMNS = [
+    "type",
+    "community",
+    "cats",
+    "dogs",
+    "price_y",
+    "baths_y",
+    "sq_feet_y",
+    "lease_term_y",
+    "beds",
+    "Quadrant",
+]
+
+# Listing columns grouped by the kind of dtype they are planned to
+CATEGORICAL_COLUMNS = ["type", "community", "lease_term_y", "Quadrant"]
+BOOLEAN_COLUMNS = ["cats", "dogs"]
+NUMERIC_COLUMNS = ["price_y", "baths_y", "sq_feet_y", "beds"]
+
+
+def mongodb_to_dataframe(
+    username, password, cluster_uri, db_name, collection_name, query=None
+):
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
 
     # Connect to MongoDB
     client = MongoClient(mongo_uri)
     db = client[db_name]
     collection = db[collection_name]
 
-    # Retrieve all documents from the collection
-    cursor = collection.find()
+    # Retrieve the documents matching the query, all of them by default
+    cursor = collection.find(query or {})
 
     # Convert the cursor into a dataframe
     df = pd.DataFrame(list(cursor))
@@ -29,6 +51,90 @@ def mongodb_to_dataframe(username, password, cluster_uri, db_name, collection_na
     return df
 
 
+def iter_mongodb_batches(
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    collection_name,
+    batch_size=10000,
+    query=None,
+    projection=None,
+):
+    """
+    Stream a MongoDB collection as DataFrames of at most batch_size documents.
+
+    Parameters:
+        username, password, cluster_uri, db_name: MongoDB Atlas connection details.
+        collection_name (str): Collection to read.
+        batch_size (int, optional): Documents per DataFrame (default is 10000).
+        query (dict, optional): Filter applied to the collection (default is all documents).
+        projection (list or dict, optional): Fields to return (default is all fields).
+
+    Yields:
+        pd.DataFrame: One batch of documents.
+    """
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
+
+    # Connect to MongoDB
+    client = MongoClient(mongo_uri)
+    collection = client[db_name][collection_name]
+
+    try:
+        cursor = collection.find(query or {}, projection).batch_size(batch_size)
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) == batch_size:
+                yield pd.DataFrame(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch)
+    finally:
+        # Close the connection
+        client.close()
+
+
+class ReservoirSample:
+    """
+    Fixed-size uniform sample of rows from a stream of DataFrames.
+
+    Used to estimate quantiles and min/max over data that does not fit in memory:
+    every row seen so far has the same chance of being in the sample.
+    """
+
+    def __init__(self, columns, size=100000, random_state=None):
+        self.columns = list(columns)
+        self.size = size
+        self.rows_seen = 0
+        self.sample = np.empty((0, len(self.columns)))
+        self.rng = np.random.RandomState(random_state)
+
+    def add(self, df):
+        rows = df[self.columns].to_numpy(dtype=np.float64)
+
+        # Fill the reservoir first
+        n_fill = max(0, min(self.size - len(self.sample), len(rows)))
+        if n_fill:
+            self.sample = np.vstack([self.sample, rows[:n_fill]])
+
+        # Each later row replaces a random slot with probability size / rows_seen
+        rest = rows[n_fill:]
+        if len(rest):
+            positions = self.rows_seen + n_fill + np.arange(len(rest))
+            slots = (self.rng.random_sample(len(rest)) * (positions + 1)).astype(
+                np.int64
+            )
+            keep = slots < self.size
+            self.sample[slots[keep]] = rest[keep]
+
+        self.rows_seen += len(rows)
+
+    def to_frame(self):
+        return pd.DataFrame(self.sample, columns=self.columns)
+
+
 def type_cast_columns(df, type_dict):
     """
     Type-cast specified columns in a DataFrame based on a given dictionary.
@@ -45,6 +151,95 @@ def type_cast_columns(df, type_dict):
     return df
 
 
+def plan_dtypes(df, vocabulary=None, float32_tolerance=0.01):
+    """
+    Plan compact dtypes for the listing columns.
+
+    Categorical columns become pandas 'category' with a fixed vocabulary, boolean
+    columns become 'bool' and numeric columns become 'float32' whenever the largest
+    absolute rounding error stays within float32_tolerance, 'float64' otherwise.
+
+    Args:
+    - df (pd.DataFrame): DataFrame holding the listing columns.
+    - vocabulary (dict, optional): Column name -> list of categories. Columns missing
+      from it get the sorted distinct values found in df.
+    - float32_tolerance (float): Largest absolute error accepted for float32. Default is 0.01.
+
+    Returns:
+    - dict: Dictionary where keys are column names and values are target data types.
+    """
+    vocabulary = vocabulary or {}
+    plan = {}
+
+    for col in CATEGORICAL_COLUMNS:
+        categories = vocabulary.get(col)
+        if categories is None:
+            categories = sorted(df[col].astype(str).unique())
+        plan[col] = pd.CategoricalDtype(categories=categories)
+
+    for col in BOOLEAN_COLUMNS:
+        plan[col] = "bool"
+
+    for col in NUMERIC_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64")
+        values = values[~np.isnan(values)]
+        error = np.max(np.abs(values.astype("float32") - values), initial=0.0)
+        plan[col] = "float32" if error <= float32_tolerance else "float64"
+
+    return plan
+
+
+def apply_dtype_plan(df, plan, verbose=True):
+    """
+    Cast DataFrame columns according to a dtype plan and report the memory saved.
+
+    Args:
+    - df (pd.DataFrame): Input DataFrame.
+    - plan (dict): Dtype plan as returned by plan_dtypes.
+    - verbose (bool): Print memory usage before and after. Default is True.
+
+    Returns:
+    - pd.DataFrame: DataFrame with planned columns cast.
+    """
+    if verbose:
+        memory_before = df.memory_usage(deep=True).sum()
+
+    for col, dtype in plan.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Values outside the vocabulary become missing
+            df[col] = df[col].astype(str).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+
+    if verbose:
+        memory_after = df.memory_usage(deep=True).sum()
+        print(
+            f"Memory usage: {memory_before / 1e6:.2f} MB -> {memory_after / 1e6:.2f} MB"
+        )
+
+    return df
+
+
+def prepare_listing_frame(df, vocabulary=None, verbose=True):
+    """
+    Keep the listing columns used downstream and cast them to compact dtypes.
+
+    Args:
+    - df (pd.DataFrame): DataFrame read from the clean collection.
+    - vocabulary (dict, optional): Fixed categories per categorical column, see plan_dtypes.
+    - verbose (bool): Print memory usage before and after casting. Default is True.
+
+    Returns:
+    - pd.DataFrame: DataFrame restricted to LISTING_COLUMNS and cast per plan_dtypes.
+    """
+    df = df[LISTING_COLUMNS].copy()
+
+    # Convert 'Studio' in 'beds' column to '1' for consistency
+    df["beds"] = df["beds"].replace("Studio", "1")
+
+    return apply_dtype_plan(df, plan_dtypes(df, vocabulary=vocabulary), verbose=verbose)
+
+
 def remove_outliers(df, columns, lower_quantile=0.05, upper_quantile=0.95):
     """
     Removes outliers from specified columns in a DataFrame based on given quantiles.
@@ -58,9 +253,48 @@ def remove_outliers(df, columns, lower_quantile=0.05, upper_quantile=0.95):
     Returns:
     - pd.DataFrame: DataFrame with outliers removed.
     """
+    return filter_bounds(
+        df, outlier_bounds(df, columns, lower_quantile, upper_quantile)
+    )
+
+
+def outlier_bounds(df, columns, lower_quantile=0.05, upper_quantile=0.95):
+    """
+    Compute the quantile bounds remove_outliers applies, so they can be stored and reused.
+
+    Bounds are computed column by column on the rows left by the previous columns.
+
+    Args:
+    - df (pd.DataFrame): Input DataFrame.
+    - columns (list): List of column names for which bounds should be computed.
+    - lower_quantile (float): Lower quantile for outlier definition. Default is 0.05.
+    - upper_quantile (float): Upper quantile for outlier definition. Default is 0.95.
+
+    Returns:
+    - dict: Dictionary where keys are column names and values are [lower, upper] bounds.
+    """
+    bounds = {}
     for col in columns:
-        Q_lower = df[col].quantile(lower_quantile)
-        Q_upper = df[col].quantile(upper_quantile)
+        Q_lower = float(df[col].quantile(lower_quantile))
+        Q_upper = float(df[col].quantile(upper_quantile))
+        bounds[col] = [Q_lower, Q_upper]
+        df = df[(df[col] >= Q_lower) & (df[col] <= Q_upper)]
+
+    return bounds
+
+
+def filter_bounds(df, bounds):
+    """
+    Keep the rows whose values fall inside the given bounds.
+
+    Args:
+    - df (pd.DataFrame): Input DataFrame.
+    - bounds (dict): Dictionary of column name -> [lower, upper], see outlier_bounds.
+
+    Returns:
+    - pd.DataFrame: DataFrame with out-of-bounds rows removed.
+    """
+    for col, (Q_lower, Q_upper) in bounds.items():
         df = df[(df[col] >= Q_lower) & (df[col] <= Q_upper)]
 
     return df
@@ -101,6 +335,9 @@ def split_data(df, label, test_size=0.2, random_state=None):
             - y_train (pd.Series): Training data (labels).
             - y_test (pd.Series): Testing data (labels).
     """
+    # sklearn is only needed here, keep it out of the modules importing this one
+    from sklearn.model_selection import train_test_split
+
     X = df.drop(columns=[label])  # Extract features
     y = df[label]  # Extract labels
     X_train, X_test, y_train, y_test = train_test_split(
@@ -143,7 +380,7 @@ def standardize_columns(
             std_dev = standardized_df[column].std()
 
             # Store stats
-            stats[column] = {"mean": mean, "std_dev": std_dev}
+            stats[column] = {"mean": float(mean), "std_dev": float(std_dev)}
 
             # Standardize the column
             standardized_df[column] = (standardized_df[column] - mean) / std_dev
@@ -161,7 +398,7 @@ def standardize_columns(
             max_value = standardized_df[column].max()
 
             # Store stats
-            stats[column] = {"min": min_value, "max": max_value}
+            stats[column] = {"min": float(min_value), "max": float(max_value)}
 
             standardized_df[column] = (standardized_df[column] - min_value) / (
                 max_value - min_value
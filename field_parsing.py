@@ -0,0 +1,116 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Accepted text formats per field, matched against the whole stripped value
+SQ_FEET_PATTERN = re.compile(
+    r"(?:approx\.?|~)?\s*(\d{1,3}(?:[, ]\d{3})+|\d+)(\.\d+)?"
+    r"\s*(?:sq\.?\s*(?:ft|feet)\.?|sqft|square\s+feet|ft2)?",
+    re.IGNORECASE,
+)
+BEDS_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:beds?|bedrooms?|br)?\s*(?:\+\s*den)?", re.IGNORECASE
+)
+BATHS_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)\s*(?:baths?|bathrooms?|ba)?", re.IGNORECASE
+)
+
+# Words standing for a number, e.g. 'Studio' counts as one bedroom like in training
+BEDS_WORDS = {"studio": 1.0}
+
+# Smallest plausible unit size; smaller numbers are typos or a different unit
+MIN_SQ_FEET = 100
+
+
+def _parse_sq_feet(text):
+    match = SQ_FEET_PATTERN.fullmatch(text)
+    if match is None:
+        return np.nan
+    digits = match.group(1).replace(",", "").replace(" ", "")
+    value = float(digits + (match.group(2) or ""))
+    return value if value >= MIN_SQ_FEET else np.nan
+
+
+def _parse_beds(text):
+    word = BEDS_WORDS.get(text.lower())
+    if word is not None:
+        return word
+    match = BEDS_PATTERN.fullmatch(text)
+    return float(match.group(1)) if match else np.nan
+
+
+def _parse_baths(text):
+    match = BATHS_PATTERN.fullmatch(text)
+    return float(match.group(1)) if match else np.nan
+
+
+FIELD_PARSERS = {
+    "sq_feet_y": _parse_sq_feet,
+    "beds": _parse_beds,
+    "baths_y": _parse_baths,
+}
+
+
+def parse_numeric_field(series, parser):
+    """
+    Parse a text column to float64 in one pass.
+
+    The column is factorized once and parser only runs on its distinct values, which
+    are few compared to the rows of a listings collection. Numbers are kept as they are.
+
+    Parameters:
+    - series: Column of text and/or numbers.
+    - parser: Function from a stripped string to a float, NaN when invalid.
+
+    Returns:
+    - np.ndarray: Parsed values, NaN where the value is missing or invalid.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    parsed = np.empty(len(uniques), dtype=np.float64)
+    for i, value in enumerate(uniques):
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            parsed[i] = float(value)
+        else:
+            parsed[i] = parser(str(value).strip())
+    # Missing values (code -1) read the trailing NaN
+    parsed = np.append(parsed, np.nan)
+    return parsed[codes]
+
+
+def parse_listing_fields(df, fields=None):
+    """
+    Parse the beds, baths and square feet text fields of listings to numbers.
+
+    Handles the formats seen in the raw collection, e.g. '1,200 sq ft', '850sqft',
+    'Studio', '2 beds', '1.5 baths'. Values that cannot be parsed become NaN and are
+    flagged in a 'parse_errors' column listing the failed fields of each row.
+
+    Parameters:
+    - df: DataFrame with the text columns.
+    - fields (list, optional): Columns to parse. Defaults to all of FIELD_PARSERS
+      present in df.
+
+    Returns:
+    - tuple: The DataFrame with numeric columns and a 'parse_errors' column, and a
+      dictionary field -> number of invalid rows.
+    """
+    fields = fields or [field for field in FIELD_PARSERS if field in df.columns]
+    errors = pd.Series("", index=df.index, dtype=object)
+    invalid_counts = {}
+    for field in fields:
+        values = parse_numeric_field(df[field], FIELD_PARSERS[field])
+        invalid = np.isnan(values)
+        invalid_counts[field] = int(invalid.sum())
+        errors[invalid] = errors[invalid] + field + ","
+        df[field] = values
+    df["parse_errors"] = errors.str.rstrip(",")
+    return df, invalid_counts
+
+
+def invalid_examples(series, parser, limit=5):
+    """
+    Most frequent raw values of a column that parser rejects, for reporting.
+    """
+    counts = series.astype(str).str.strip().value_counts()
+    rejected = [value for value in counts.index if np.isnan(parser(value))]
+    return counts[rejected[:limit]].to_dict()
@@ -0,0 +1,291 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import threading
+import bisect
+import time
+import os
+
+# Set to 0 to disable metrics collection; spans and counters then do nothing
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Histogram upper bounds in seconds, from sub-millisecond inference to slow fetches
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# perf_counter() at which the middleware received the current request
+request_start = ContextVar("request_start", default=None)
+
+_NO_SPAN = nullcontext()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base of the metric types: a name, a help text and values per label combination.
+    """
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram of observations, exported as _bucket, _sum and _count series.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # Counts per bucket (last one is +Inf), then the sum of observations
+                state = [[0] * (len(self.buckets) + 1), 0.0]
+                self.values[key] = state
+            state[0][index] += 1
+            state[1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            items = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self.values.items()
+            )
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Collection of metrics rendered together in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Latency of HTTP requests by route template.",
+        ("method", "route", "status"),
+    )
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests being served.")
+)
+SPAN_LATENCY = registry.register(
+    Histogram(
+        "span_duration_seconds",
+        "Duration of named phases of a request, e.g. model_load or inference.",
+        ("span", "model_type"),
+    )
+)
+PREDICTIONS_IN_FLIGHT = registry.register(
+    Gauge(
+        "predictions_in_flight",
+        "Predictions submitted to the prediction executor and not finished.",
+    )
+)
+MONGO_FETCH_ROWS = registry.register(
+    Counter(
+        "mongo_fetch_rows_total",
+        "Documents fetched from MongoDB per collection.",
+        ("collection",),
+    )
+)
+CACHE_REQUESTS = registry.register(
+    Counter(
+        "cache_requests_total",
+        "Lookups of the in-process and on-disk caches by result (hit or miss).",
+        ("cache", "result"),
+    )
+)
+
+
+@contextmanager
+def _timed_span(name, model_type):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(
+            time.perf_counter() - start, span=name, model_type=model_type
+        )
+
+
+def span(name, model_type=""):
+    """
+    Context manager timing a named phase into span_duration_seconds.
+
+    Parameters:
+    - name (str): Phase name, e.g. 'model_load', 'inference' or 'mongo_fetch'.
+    - model_type (str, optional): Model the phase ran for, '' when not model specific.
+
+    Returns:
+    - A context manager; a shared no-op one when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return _NO_SPAN
+    return _timed_span(name, model_type)
+
+
+def observe_since_request_start(name, model_type=""):
+    """
+    Record the time from the middleware receiving the request until now as span name,
+    e.g. body parsing and pydantic validation before a route handler runs.
+    """
+    start = request_start.get()
+    if METRICS_ENABLED and start is not None:
+        SPAN_LATENCY.observe(
+            time.perf_counter() - start, span=name, model_type=model_type
+        )
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+async def metrics_middleware(request, call_next):
+    """
+    FastAPI HTTP middleware recording request latency per route and requests in flight.
+
+    Requests are labelled with the route template (e.g. '/{model_type}/predict/') rather
+    than the path, so the number of series stays bounded.
+    """
+    start = time.perf_counter()
+    token = request_start.set(start)
+    REQUESTS_IN_FLIGHT.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        request_start.reset(token)
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code,
+        )
@@ -0,0 +1,84 @@
+import re
+import json
+
+# Markers of the script payloads holding the listing and its units
+LISTING_PATTERN = re.compile(r"var\s+listingJson\s*=\s*")
+UNITS_PATTERN = re.compile(r"window\.units\s*=\s*")
+SCRIPT_MARKERS = ("var listingJson", "window.units")
+
+_decoder = json.JSONDecoder()
+
+
+def extract_listing_scripts(html_content):
+    """
+    Return the contents of the <script> tags holding 'var listingJson' or 'window.units'.
+
+    Equivalent to filtering the matches of <script>(.*?)</script>, but the page is
+    walked once from tag to tag with str.find and only script bodies are searched for
+    the markers.
+
+    Parameters:
+    - html_content (str): HTML of a listing page.
+
+    Returns:
+    - list: Script contents in page order.
+    """
+    scripts = []
+    start = html_content.find("<script>")
+    while start != -1:
+        start += len("<script>")
+        end = html_content.find("</script>", start)
+        if end == -1:
+            break
+        if any(
+            html_content.find(marker, start, end) != -1 for marker in SCRIPT_MARKERS
+        ):
+            scripts.append(html_content[start:end])
+        start = html_content.find("<script>", end + len("</script>"))
+    return scripts
+
+
+def decode_after(text, pattern):
+    """
+    Decode the JSON value following the first match of pattern in text, or None.
+    """
+    match = pattern.search(text)
+    if match is None:
+        return None
+    value, _ = _decoder.raw_decode(text, match.end())
+    return value
+
+
+def parse_listing_scripts(scripts):
+    """
+    Decode the listing and its units from the listing script contents.
+
+    Each payload is decoded with a single raw_decode call from the position after its
+    assignment, so nested objects and brackets inside strings are handled.
+
+    Parameters:
+    - scripts (list): Script contents from extract_listing_scripts.
+
+    Returns:
+    - tuple: The listing dictionary and the list of unit dictionaries.
+    """
+    listing = {}
+    units = []
+    for script in scripts:
+        value = decode_after(script, LISTING_PATTERN)
+        if isinstance(value, dict):
+            listing = value
+        value = decode_after(script, UNITS_PATTERN)
+        if isinstance(value, list):
+            units = value
+    return listing, units
+
+
+def extract_listing(html_content):
+    """
+    Extract the listing and its units from the HTML of a listing page.
+
+    Returns:
+    - tuple: The listing dictionary and the list of unit dictionaries.
+    """
+    return parse_listing_scripts(extract_listing_scripts(html_content))
@@ -1,72 +1,340 @@
 from feature_engineering import (
     mongodb_to_dataframe,
-    type_cast_columns,
-    remove_outliers,
+    iter_mongodb_batches,
+    ReservoirSample,
+    LISTING_COLUMNS,
+    prepare_listing_frame,
+    outlier_bounds,
+    filter_bounds,
     split_data,
     standardize_columns,
     one_hot_encode,
+    CATEGORICAL_COLUMNS,
+    NUMERIC_COLUMNS,
 )
 from credentials import mongo_db_cred
-from models_and_metrics import train_and_predict
+from dataset_cache import load_listing_frame, collection_fingerprint
+from models_and_metrics import (
+    train_and_predict,
+    search_hyperparameters,
+    update_models,
+    train_on_batches,
+    evaluate_and_save,
+    bootstrap_regression_metrics,
+    rescale_predictions,
+    INCREMENTAL_MODEL_TYPES,
+    SEARCH_OBJECTIVES,
+)
+from feature_schema import feature_names
+from pathlib import Path
+import numpy as np
+import argparse
+import json
+import math
+import re
 
+# Training watermark, vocabulary and scaling state shared by full and incremental runs
+TRAINING_STATE_PATH = Path("models") / "training_state.json"
 
-if __name__ == "__main__":
-    # df from mongo db
-    df = mongodb_to_dataframe(
+# Categorical and boolean columns one-hot encoded before training
+COLUMNS_TO_ENCODE = [
+    "type",
+    "community",
+    "cats",
+    "dogs",
+    "lease_term_y",
+    "Quadrant",
+]
+
+
+def load_training_state(path=TRAINING_STATE_PATH):
+    """
+    Read the state written by the last training run, or None if there is none.
+    """
+    if not Path(path).exists():
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_training_state(state, path=TRAINING_STATE_PATH):
+    """
+    Write the training state as JSON.
+    """
+    with open(path, "w") as file:
+        json.dump(state, file, indent=4)
+
+
+def running_min_max(observed_stats, df, columns):
+    """
+    Fold the min/max of df's columns into the running statistics.
+    """
+    for col in columns:
+        current = observed_stats.get(col, {"min": float("inf"), "max": float("-inf")})
+        observed_stats[col] = {
+            "min": min(current["min"], float(df[col].min())),
+            "max": max(current["max"], float(df[col].max())),
+        }
+    return observed_stats
+
+
+def unit_keys_at(sysdate):
+    """
+    unit_key of the clean documents stamped with sysdate, i.e. the units a training run
+    with that watermark has seen. Incremental runs read from the watermark inclusive
+    and skip these.
+    """
+    if sysdate is None:
+        return []
+    keys = set()
+    for batch in iter_mongodb_batches(
+        username=mongo_db_cred["username"],
+        password=mongo_db_cred["password"],
+        cluster_uri=mongo_db_cred["cluster_uri"],
+        db_name=mongo_db_cred["db_name"],
+        collection_name=mongo_db_cred["collection_name_clean"],
+        query={"sysdate": sysdate},
+        projection={"unit_key": 1, "_id": 0},
+    ):
+        if "unit_key" in batch.columns:
+            keys.update(batch["unit_key"].dropna().astype(str))
+    return sorted(keys)
+
+
+def encoded_columns(vocabulary):
+    """
+    Feature columns produced by one_hot_encode for the given vocabulary, in order.
+    """
+    columns = [c for c in LISTING_COLUMNS if c in NUMERIC_COLUMNS and c != "price_y"]
+    for col in COLUMNS_TO_ENCODE:
+        for value in vocabulary.get(col, [False, True]):
+            columns.append(f"{col}_{value}")
+    return columns
+
+
+def feature_name(column):
+    """
+    HouseFeatures field of an encoded column, e.g. 'type_Condo Unit' -> 'type_Condo_Unit'.
+    """
+    return re.sub(r"[^0-9A-Za-z]+", "_", str(column)).strip("_")
+
+
+def unknown_features(columns):
+    """
+    Encoded columns without a HouseFeatures field, which the models cannot be served with.
+    """
+    known = set(feature_names())
+    return sorted({feature_name(column) for column in columns} - known)
+
+
+def align_to_serving(X, verbose=True):
+    """
+    Rename the encoded columns of X to HouseFeatures fields and order them like the
+    prediction endpoint, which builds its input positionally from HouseFeatures.
+
+    Categories without a HouseFeatures field (e.g. a community newly kept by the quadrant
+    fallback) are dropped, so training sees rows encoded as they are at serving time;
+    add the field to HouseFeatures to let the models use them. Missing fields are 0.
+    """
+    if verbose:
+        unknown = unknown_features(X.columns)
+        if unknown:
+            print(
+                f"Dropping {len(unknown)} columns unknown to HouseFeatures: {unknown}"
+            )
+    X = X.rename(columns=feature_name)
+    for name in X.columns[X.columns.duplicated()].unique():
+        combined = X[name].max(axis=1)
+        X = X.drop(columns=name)
+        X[name] = combined
+    return X.reindex(columns=feature_names(), fill_value=0)
+
+
+def run_chunked_training(args, models_list):
+    """
+    Out-of-core training: two streaming passes over the clean collection.
+
+    The first pass sketches the data: category vocabulary, a reservoir sample for the
+    outlier bounds and the exact min/max of the numeric columns. The second pass encodes
+    each batch with that vocabulary and feeds the models, which must all be able to
+    learn incrementally, holding out a bounded test sample for metrics.
+
+    The min/max scaling range of a bounded column is its exact range clipped to the
+    outlier bounds, so it covers every row kept for training.
+    """
+    unsupported = [m for m in models_list if m not in INCREMENTAL_MODEL_TYPES]
+    if unsupported:
+        raise ValueError(
+            f"Chunked training cannot fit {unsupported}, supported model types are "
+            f"{sorted(INCREMENTAL_MODEL_TYPES)}"
+        )
+    mongo_args = dict(
         username=mongo_db_cred["username"],
         password=mongo_db_cred["password"],
         cluster_uri=mongo_db_cred["cluster_uri"],
         db_name=mongo_db_cred["db_name"],
         collection_name=mongo_db_cred["collection_name_clean"],
     )
-    # keep certain columns
-    df = df[
-        [
-            "type",
-            "community",
-            "cats",
-            "dogs",
-            "price_y",
-            "baths_y",
-            "sq_feet_y",
-            "lease_term_y",
-            "beds",
-            "Quadrant",
-        ]
-    ]
-    # fix data
-    df["beds"] = df["beds"].replace("Studio", "1")
-    # type cast based on dictionary
-    type_dict = {
-        "type": str,
-        "community": str,
-        "cats": bool,
-        "dogs": bool,
-        "price_y": float,
-        "baths_y": float,
-        "sq_feet_y": float,
-        "lease_term_y": str,
-        "beds": float,
-        "Quadrant": str,
+    fingerprint = collection_fingerprint(**mongo_args)
+    watermark_keys = unit_keys_at(fingerprint["max_sysdate"])
+
+    # first pass: vocabulary, row count, exact ranges and a sample of the bounded columns
+    vocabulary = {col: set() for col in CATEGORICAL_COLUMNS}
+    sample = ReservoirSample(["price_y", "sq_feet_y"], random_state=123)
+    observed_stats = {}
+    for batch in iter_mongodb_batches(
+        batch_size=args.batch_size, projection=LISTING_COLUMNS, **mongo_args
+    ):
+        batch = prepare_listing_frame(batch, verbose=False)
+        for col in CATEGORICAL_COLUMNS:
+            vocabulary[col].update(batch[col].cat.categories)
+        sample.add(batch)
+        if len(batch):
+            observed_stats = running_min_max(observed_stats, batch, NUMERIC_COLUMNS)
+    vocabulary = {col: sorted(values) for col, values in vocabulary.items()}
+    n_rows = sample.rows_seen
+    if n_rows == 0:
+        print("The clean collection is empty, nothing to train.")
+        return
+
+    bounds = outlier_bounds(
+        sample.to_frame(),
+        columns=["price_y", "sq_feet_y"],
+        lower_quantile=0.05,
+        upper_quantile=0.95,
+    )
+    scaling = {
+        col: {
+            "min": max(bounds[col][0], observed_stats[col]["min"]),
+            "max": min(bounds[col][1], observed_stats[col]["max"]),
+        }
+        for col in ["sq_feet_y", "price_y"]
+    }
+    feature_stats = {"sq_feet_y": scaling["sq_feet_y"]}
+    label_stats = {"price_y": scaling["price_y"]}
+    print(f"feature_stats: {feature_stats}")
+    print(f"label_stats: {label_stats}")
+    write_stats(feature_stats, label_stats)
+
+    # second pass: encode, scale and train batch by batch
+    unknown = unknown_features(encoded_columns(vocabulary))
+    if unknown:
+        print(f"Dropping {len(unknown)} columns unknown to HouseFeatures: {unknown}")
+    columns = feature_names()
+    test_rate = min(0.2, args.max_test_rows / n_rows)
+    rng = np.random.RandomState(123)
+    X_test, y_test = [], []
+
+    def batches():
+        for batch in iter_mongodb_batches(
+            batch_size=args.batch_size, projection=LISTING_COLUMNS, **mongo_args
+        ):
+            batch = prepare_listing_frame(batch, vocabulary=vocabulary, verbose=False)
+            batch = filter_bounds(batch, bounds)
+            batch = one_hot_encode(batch, columns_to_encode=COLUMNS_TO_ENCODE)
+            X = align_to_serving(
+                batch.drop(columns=["price_y"]), verbose=False
+            ).to_numpy(dtype=float)
+            y = batch["price_y"].to_numpy(dtype=float)
+            X[:, columns.index("sq_feet_y")] = (
+                X[:, columns.index("sq_feet_y")] - feature_stats["sq_feet_y"]["min"]
+            ) / (feature_stats["sq_feet_y"]["max"] - feature_stats["sq_feet_y"]["min"])
+
+            # hold out a bounded, uniformly spread test sample
+            is_test = rng.random_sample(len(y)) < test_rate
+            X_test.append(X[is_test])
+            y_test.append(y[is_test])
+
+            yield X[~is_test], (y[~is_test] - label_stats["price_y"]["min"]) / (
+                label_stats["price_y"]["max"] - label_stats["price_y"]["min"]
+            )
+
+    models = train_on_batches(
+        models_list,
+        batches(),
+        n_batches=int(math.ceil(n_rows / args.batch_size)),
+    )
+
+    X_test = np.vstack(X_test)
+    y_test = np.concatenate(y_test)
+    predictions = {
+        model_type: current_model.predict(X_test)
+        for model_type, current_model in models.items()
     }
-    # cast data types
-    df = type_cast_columns(df, type_dict)
+    intervals = {}
+    if args.bootstrap:
+        intervals = bootstrap_regression_metrics(
+            y_true=y_test,
+            y_preds={
+                model_type: rescale_predictions(model_predictions, label_stats)
+                for model_type, model_predictions in predictions.items()
+            },
+            n_bootstrap=args.bootstrap,
+            random_state=123,
+        )
+    for model_type, current_model in models.items():
+        evaluate_and_save(
+            current_model,
+            predictions[model_type],
+            y_test,
+            columns,
+            label_stats,
+            confidence_intervals=intervals.get(model_type),
+            X_test=X_test,
+        )
+
+    save_training_state(
+        {
+            "watermark": fingerprint["max_sysdate"],
+            "watermark_keys": watermark_keys,
+            "rows_seen": n_rows - len(y_test),
+            "columns": columns,
+            "vocabulary": vocabulary,
+            "outlier_bounds": bounds,
+            "feature_stats": feature_stats,
+            "label_stats": label_stats,
+            "observed_stats": observed_stats,
+        }
+    )
+
+
+def write_stats(feature_stats, label_stats):
+    """
+    Write the scaling statistics to stats.py, read by the prediction endpoint.
+    """
+    with open("stats.py", "w") as f:
+        f.write("feature_stats = " + str(feature_stats) + "\n")
+        f.write("label_stats = " + str(label_stats) + "\n")
+
+
+def run_full_training(args, models_list):
+    # fingerprint first so the watermark never runs ahead of the data read
+    fingerprint = collection_fingerprint(
+        username=mongo_db_cred["username"],
+        password=mongo_db_cred["password"],
+        cluster_uri=mongo_db_cred["cluster_uri"],
+        db_name=mongo_db_cred["db_name"],
+        collection_name=mongo_db_cred["collection_name_clean"],
+    )
+    watermark_keys = unit_keys_at(fingerprint["max_sysdate"])
+    # prepared df from the local cache or mongo db
+    df = load_listing_frame(
+        username=mongo_db_cred["username"],
+        password=mongo_db_cred["password"],
+        cluster_uri=mongo_db_cred["cluster_uri"],
+        db_name=mongo_db_cred["db_name"],
+        collection_name=mongo_db_cred["collection_name_clean"],
+    )
+    vocabulary = {col: list(df[col].cat.categories) for col in CATEGORICAL_COLUMNS}
     # Remove outliers based on quartile
-    df = remove_outliers(
+    bounds = outlier_bounds(
         df, columns=["price_y", "sq_feet_y"], lower_quantile=0.05, upper_quantile=0.95
     )
+    df = filter_bounds(df, bounds)
     # one hot encode categories
-    df = one_hot_encode(
-        df,
-        columns_to_encode=[
-            "type",
-            "community",
-            "cats",
-            "dogs",
-            "lease_term_y",
-            "Quadrant",
-        ],
-    )
+    df = one_hot_encode(df, columns_to_encode=COLUMNS_TO_ENCODE)
+    # features in the order the prediction endpoint builds its input
+    df = align_to_serving(df.drop(columns=["price_y"])).assign(price_y=df["price_y"])
     # train test split
     X_train, X_test, y_train, y_test = split_data(
         df=df, label="price_y", test_size=0.2, random_state=123
@@ -84,25 +352,253 @@ if __name__ == "__main__":
     )
     print(f"label_stats: {label_stats}")
     # Write dictionaries to a .py file
-    with open("stats.py", "w") as f:
-        f.write("feature_stats = " + str(feature_stats) + "\n")
-        f.write("label_stats = " + str(label_stats) + "\n")
+    write_stats(feature_stats, label_stats)
+
+    # search hyperparameters on the scaled training split
+    search_results = {}
+    if args.search:
+        search_results = search_hyperparameters(
+            models_list=models_list,
+            X_train=X_train,
+            y_train=y_train,
+            n_candidates=args.search_candidates,
+            objectives=args.objectives,
+            n_jobs=args.jobs,
+        )
 
     train_and_predict(
-        models_list=[
-            "linear",
-            "random_forest",
-            "xgboost",
-            "svr",
-            "decision_tree",
-            "gradient_boosting",
-            "ridge",
-            "lasso",
-        ],
+        models_list=models_list,
         X_train=X_train,
         X_test=X_test,
         y_train=y_train,
         y_test=y_test,
         feature_stats=feature_stats,
         label_stats=label_stats,
+        n_jobs=args.jobs,
+        model_params={
+            model_type: result["params"]
+            for model_type, result in search_results.items()
+        },
+        search_results=search_results,
+        n_bootstrap=args.bootstrap,
+    )
+
+    # record what the models were trained on for later incremental runs
+    save_training_state(
+        {
+            "watermark": fingerprint["max_sysdate"],
+            "watermark_keys": watermark_keys,
+            "rows_seen": len(X_train),
+            "columns": list(X_train.columns),
+            "vocabulary": vocabulary,
+            "outlier_bounds": bounds,
+            "feature_stats": feature_stats,
+            "label_stats": label_stats,
+            "observed_stats": running_min_max({}, df, NUMERIC_COLUMNS),
+        }
+    )
+
+
+def run_incremental_training(args, models_list):
+    """
+    Update the saved models with the clean documents written since the last training.
+
+    The clean collection keeps the latest version of each unit, so a unit that changed
+    since the last run is read once more in its new version. The models cannot forget
+    the old version: its rows stay in the sufficient statistics of the linear models
+    and in the trees already fitted. A changed unit therefore weighs twice until the
+    next full training, which replaces the models and resets the state.
+    """
+    state = load_training_state()
+    if state is None or state["watermark"] is None:
+        print("No training state with a watermark found, run a full training first.")
+        return
+    if [feature_name(column) for column in state["columns"]] != feature_names():
+        print("The saved models do not match HouseFeatures, run a full training first.")
+        return
+
+    # documents from the last training run on: a scrape stamps all its documents with
+    # one sysdate and may still have been writing when the watermark was taken
+    df = mongodb_to_dataframe(
+        username=mongo_db_cred["username"],
+        password=mongo_db_cred["password"],
+        cluster_uri=mongo_db_cred["cluster_uri"],
+        db_name=mongo_db_cred["db_name"],
+        collection_name=mongo_db_cred["collection_name_clean"],
+        query={"sysdate": {"$gte": state["watermark"]}},
+    )
+    if df.empty:
+        print(f"No listings newer than {state['watermark']}, nothing to update.")
+        return
+    # latest version of each unit, minus the units already trained on at the watermark
+    seen = set(state.get("watermark_keys", []))
+    df = df.sort_values("sysdate").drop_duplicates("unit_key", keep="last")
+    df = df[~((df["sysdate"] == state["watermark"]) & df["unit_key"].isin(seen))]
+    if df.empty:
+        print(f"No listings newer than {state['watermark']}, nothing to update.")
+        return
+    watermark = df["sysdate"].max()
+    at_watermark = set(df.loc[df["sysdate"] == watermark, "unit_key"].astype(str))
+    watermark_keys = (
+        at_watermark | seen if watermark == state["watermark"] else at_watermark
+    )
+
+    # encode with the vocabulary and bounds of the full run so columns line up
+    df = prepare_listing_frame(df, vocabulary=state["vocabulary"])
+    df = filter_bounds(df, state["outlier_bounds"])
+    if df.empty:
+        print("All new listings fall outside the outlier bounds, nothing to update.")
+        return
+    state["observed_stats"] = running_min_max(
+        state["observed_stats"], df, list(state["observed_stats"])
+    )
+    df = one_hot_encode(df, columns_to_encode=COLUMNS_TO_ENCODE)
+    X_new = align_to_serving(df.drop(columns=["price_y"]))
+    y_new = df["price_y"]
+
+    # scale with the frozen statistics the saved models were trained with
+    feature_stats = state["feature_stats"]
+    label_stats = state["label_stats"]
+    X_new["sq_feet_y"] = (X_new["sq_feet_y"] - feature_stats["sq_feet_y"]["min"]) / (
+        feature_stats["sq_feet_y"]["max"] - feature_stats["sq_feet_y"]["min"]
+    )
+    y_new = (y_new - label_stats["price_y"]["min"]) / (
+        label_stats["price_y"]["max"] - label_stats["price_y"]["min"]
+    )
+    for col, observed in state["observed_stats"].items():
+        scaling = feature_stats.get(col) or label_stats.get(col)
+        if scaling and (
+            observed["min"] < scaling["min"] or observed["max"] > scaling["max"]
+        ):
+            print(
+                f"{col} observed range {observed} exceeds the scaling range {scaling}, "
+                "consider a full refit."
+            )
+
+    update_models(
+        models_list=models_list,
+        X_new=X_new.to_numpy(dtype=float),
+        y_new=y_new.to_numpy(dtype=float),
+        rows_seen=state["rows_seen"],
+        label_stats=label_stats,
+    )
+
+    state["watermark"] = watermark
+    state["watermark_keys"] = sorted(watermark_keys)
+    state["rows_seen"] += len(X_new)
+    save_training_state(state)
+    print(f"Updated models with {len(X_new)} rows, watermark now {watermark}")
+
+
+if __name__ == "__main__":
+    models_list = [
+        "linear",
+        "random_forest",
+        "xgboost",
+        "svr",
+        "decision_tree",
+        "gradient_boosting",
+        "ridge",
+        "lasso",
+    ]
+
+    parser = argparse.ArgumentParser(description="Train the rent price models.")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes used to train models in parallel, -1 for all cores (default: 1)",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="Run a successive-halving hyperparameter search before training",
+    )
+    parser.add_argument(
+        "--search-candidates",
+        type=int,
+        default=16,
+        help="Candidates sampled per model type by the search (default: 16)",
+    )
+    parser.add_argument(
+        "--objective",
+        action="append",
+        default=[],
+        metavar="NAME=WEIGHT",
+        help="Extra search objective next to RMSE: fit_time_s, latency_ms or size_mb",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Update the saved models with listings newer than the last training run; "
+        "changed listings count twice until the next full training",
+    )
+    parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="Stream the collection in batches instead of loading it in memory",
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        choices=models_list,
+        default=None,
+        help="Model types to train (default: all, with --chunked the incremental ones)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=50000,
+        help="Documents per batch in chunked mode (default: 50000)",
+    )
+    parser.add_argument(
+        "--max-test-rows",
+        type=int,
+        default=100000,
+        help="Upper bound on held-out test rows in chunked mode (default: 100000)",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=1000,
+        help="Bootstrap resamples for metric confidence intervals, 0 to skip (default: 1000)",
+    )
+    args = parser.parse_args()
+
+    # check the objectives now rather than after the first search round
+    args.objectives = {}
+    for objective in args.objective:
+        name, _, weight = objective.partition("=")
+        if name not in SEARCH_OBJECTIVES:
+            parser.error(
+                f"--objective {objective}: unknown objective, expected one of "
+                f"{', '.join(SEARCH_OBJECTIVES)}"
+            )
+        try:
+            args.objectives[name] = float(weight)
+        except ValueError:
+            parser.error(
+                f"--objective {objective}: expected NAME=WEIGHT with a numeric weight"
+            )
+
+    # chunked training streams batches, only models that learn incrementally can follow
+    if args.models is None:
+        args.models = [
+            model_type
+            for model_type in models_list
+            if model_type in INCREMENTAL_MODEL_TYPES or not args.chunked
+        ]
+    elif args.chunked:
+        unsupported = [m for m in args.models if m not in INCREMENTAL_MODEL_TYPES]
+        if unsupported:
+            parser.error(
+                f"--chunked cannot train {', '.join(unsupported)}; supported models: "
+                f"{', '.join(m for m in models_list if m in INCREMENTAL_MODEL_TYPES)}"
+            )
+
+    if args.incremental:
+        run_incremental_training(args, args.models)
+    elif args.chunked:
+        run_chunked_training(args, args.models)
+    else:
+        run_full_training(args, args.models)
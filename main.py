@@ -1,8 +1,20 @@
 # Importing necessary libraries & modules
-from fastapi import FastAPI
-from endpoints.POST_ml_prediction import router as predictions_app
+import time
+
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from endpoints.POST_ml_prediction import router as predictions_app, load_model
 from endpoints.GET_ml_metrics import router as metrics_app
 from endpoints.GET_aggregations import router as aggregations_app
+from endpoints.GET_aggregations import aggregation_dependencies
+from feature_schema import ALLOWED_MODEL_TYPES, feature_names
+import instrumentation
+import profiling
+import warmup
+
+warmup.readiness.record("imports", time.perf_counter() - _import_start)
 
 # Initializing FastAPI application
 app = FastAPI()
@@ -12,6 +24,52 @@ app.include_router(predictions_app)
 app.include_router(metrics_app)
 app.include_router(aggregations_app)
 
+# Request latency, phase spans and cache counters; disabled with METRICS_ENABLED=0
+if instrumentation.METRICS_ENABLED:
+    app.middleware("http")(instrumentation.metrics_middleware)
+
+    @app.get("/metrics-prom", response_class=PlainTextResponse)
+    def prometheus_metrics():
+        return PlainTextResponse(
+            instrumentation.registry.render(),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
+# Profiles single requests sent with X-Profile or ?profile=1; needs PROFILING_ENABLED=1
+if profiling.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profiling_middleware)
+
+    @app.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+    def get_profile(profile_id: str):
+        path = profiling.profile_path(profile_id)
+        if path is None or not path.exists():
+            raise HTTPException(status_code=404, detail="Unknown profile")
+        return PlainTextResponse(path.read_text())
+
+
+# Load the configured models in the background once the server starts, see warmup.py
+@app.on_event("startup")
+def start_warmup():
+    warmup.start_warmup(
+        warmup.configured_models(ALLOWED_MODEL_TYPES),
+        load_model,
+        n_features=len(feature_names()),
+        import_aggregations=(
+            aggregation_dependencies if warmup.WARMUP_AGGREGATIONS else None
+        ),
+    )
+
+
+# Readiness probe: 503 until the warmup finished, for good if no model warmed up
+@app.get("/ready")
+def ready():
+    status = warmup.readiness.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
 # Simple health check endpoint
 @app.get("/")
 def read_root():
@@ -1,96 +1,780 @@
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.svm import SVR
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.linear_model import Ridge, Lasso
-import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from compact_trees import COMPACT_MODEL_TYPES, export_compact
 import numpy as np
+import importlib
+import tempfile
+import resource
 import pickle
 import json
+import math
+import time
+import sys
+import os
+
+# Estimator class of each model type as 'module:Class', imported on first use so that
+# only the libraries of the models actually trained or served are loaded
+MODEL_CLASSES = {
+    "linear": "sklearn.linear_model:LinearRegression",
+    "random_forest": "sklearn.ensemble:RandomForestRegressor",
+    "xgboost": "xgboost:XGBRegressor",
+    "svr": "sklearn.svm:SVR",
+    "decision_tree": "sklearn.tree:DecisionTreeRegressor",
+    "gradient_boosting": "sklearn.ensemble:GradientBoostingRegressor",
+    "ridge": "sklearn.linear_model:Ridge",
+    "lasso": "sklearn.linear_model:Lasso",
+}
+
+# Model types that can learn from new rows without a full refit
+INCREMENTAL_MODEL_TYPES = {
+    "linear",
+    "ridge",
+    "random_forest",
+    "gradient_boosting",
+    "xgboost",
+}
+
+# Measurements search_hyperparameters can weigh against RMSE
+SEARCH_OBJECTIVES = ("fit_time_s", "latency_ms", "size_mb")
+
+# Hyperparameter values explored by search_hyperparameters for each model type
+PARAM_SPACES = {
+    "linear": {"fit_intercept": [True, False]},
+    "random_forest": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [8, 16, None],
+        "min_samples_leaf": [1, 3, 5],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "xgboost": {
+        "n_estimators": [100, 300, 600],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [3, 6, 9],
+        "subsample": [0.7, 1.0],
+        "colsample_bytree": [0.5, 1.0],
+    },
+    "svr": {
+        "C": [0.1, 1.0, 10.0, 100.0],
+        "epsilon": [0.01, 0.05, 0.1],
+        "gamma": ["scale", 0.01, 0.1],
+    },
+    "decision_tree": {
+        "max_depth": [4, 8, 12, 16, None],
+        "min_samples_leaf": [1, 5, 10, 20],
+    },
+    "gradient_boosting": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [2, 3, 5],
+        "subsample": [0.7, 1.0],
+    },
+    "ridge": {"alpha": [0.01, 0.1, 1.0, 10.0, 100.0]},
+    "lasso": {"alpha": [1e-5, 1e-4, 1e-3, 1e-2, 1e-1]},
+}
+
+
+def estimator_class(model_type):
+    """
+    Import and return the estimator class of model_type from MODEL_CLASSES.
+    """
+    module_name, _, class_name = MODEL_CLASSES[model_type].partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
 
 
 class Model:
-    def __init__(self, model_type="linear"):
-        # Setting the model_type attribute
+    def __init__(self, model_type="linear", params=None):
+        # Setting the model_type and hyperparameter attributes
         self.model_type = model_type
-        if model_type == "linear":
-            self.model = LinearRegression()
-        elif model_type == "random_forest":
-            self.model = RandomForestRegressor()
-        elif model_type == "xgboost":
-            self.model = xgb.XGBRegressor()
-        elif model_type == "svr":
-            self.model = SVR()
-        elif model_type == "decision_tree":
-            self.model = DecisionTreeRegressor()
-        elif model_type == "gradient_boosting":
-            self.model = GradientBoostingRegressor()
-        elif model_type == "ridge":
-            self.model = Ridge()
-        elif model_type == "lasso":
-            self.model = Lasso()
-        else:
+        self.params = dict(params or {})
+        # Running X'X / X'y sums of linear and ridge models, used by update()
+        self.sufficient_stats = None
+        if model_type not in MODEL_CLASSES:
             raise ValueError(
                 "Invalid model_type. Supported types: linear, random_forest, xgboost, svr, decision_tree, gradient_boosting, ridge, lasso"
             )
+        self.model = estimator_class(model_type)(**self.params)
 
     def train(self, X, y):
         self.model.fit(X, y)
+        if self.model_type in ("linear", "ridge"):
+            self.sufficient_stats = None
+            self._accumulate(X, y)
 
     def predict(self, X):
         return self.model.predict(X)
 
+    def update(self, X, y, rows_seen, n_new_estimators=None):
+        """
+        Update the trained model with new rows instead of refitting it from scratch.
+
+        - linear, ridge: exact refit from the accumulated sufficient statistics.
+        - random_forest, gradient_boosting: add trees fitted on the new rows (warm_start).
+        - xgboost: continue boosting from the current booster.
+
+        Ensembles grow in proportion to the share of new rows among rows_seen,
+        unless n_new_estimators fixes the number of trees to add.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        share = len(y) / max(rows_seen, 1)
+
+        if self.model_type in ("linear", "ridge"):
+            if self.sufficient_stats is None:
+                raise ValueError(
+                    f"{self.model_type} has no sufficient statistics, run a full refit first"
+                )
+            self._accumulate(X, y)
+            self._solve_from_stats()
+        elif self.model_type in ("random_forest", "gradient_boosting"):
+            current = len(self.model.estimators_)
+            n_new = n_new_estimators or max(1, int(math.ceil(current * share)))
+            self.model.set_params(warm_start=True, n_estimators=current + n_new)
+            self.model.fit(X, y)
+        elif self.model_type == "xgboost":
+            booster = self.model.get_booster()
+            current = booster.num_boosted_rounds()
+            n_new = n_new_estimators or max(1, int(math.ceil(current * share)))
+            self.model.set_params(n_estimators=n_new)
+            self.model.fit(X, y, xgb_model=booster)
+            self.model.set_params(n_estimators=current + n_new)
+        else:
+            raise ValueError(f"{self.model_type} does not support incremental updates")
+
+    def _accumulate(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        batch_stats = {
+            "n": len(y),
+            "sum_x": X.sum(axis=0),
+            "sum_y": y.sum(),
+            "xtx": X.T @ X,
+            "xty": X.T @ y,
+        }
+        if self.sufficient_stats is None:
+            self.sufficient_stats = batch_stats
+        else:
+            for key, value in batch_stats.items():
+                self.sufficient_stats[key] = self.sufficient_stats[key] + value
+
+    def _solve_from_stats(self):
+        stats = self.sufficient_stats
+        model_params = self.model.get_params()
+        alpha = model_params.get("alpha", 0.0)
+
+        if model_params.get("fit_intercept", True):
+            # Center through the sums so the intercept is not penalized
+            mean_x = stats["sum_x"] / stats["n"]
+            mean_y = stats["sum_y"] / stats["n"]
+            xtx = stats["xtx"] - stats["n"] * np.outer(mean_x, mean_x)
+            xty = stats["xty"] - stats["n"] * mean_x * mean_y
+        else:
+            xtx, xty = stats["xtx"], stats["xty"]
+
+        coef = np.linalg.lstsq(xtx + alpha * np.eye(len(xty)), xty, rcond=None)[0]
+        self.model.coef_ = coef
+        if model_params.get("fit_intercept", True):
+            self.model.intercept_ = mean_y - mean_x @ coef
+        else:
+            self.model.intercept_ = 0.0
+
     def save_model(self, filename, columns):
         with open(filename, "wb") as file:
-            pickle.dump({"model": self.model, "columns": columns}, file)
+            pickle.dump(
+                {
+                    "model": self.model,
+                    "columns": columns,
+                    "params": self.params,
+                    "model_type": self.model_type,
+                    "sufficient_stats": self.sufficient_stats,
+                },
+                file,
+            )
 
-    def save_structure(self, filename):
-        model_structure = {"model_type": self.model_type}
+    @classmethod
+    def load_model(cls, filename, model_type):
+        with open(filename, "rb") as file:
+            data = pickle.load(file)
+        current_model = cls(model_type=model_type, params=data.get("params"))
+        current_model.model = data["model"]
+        current_model.sufficient_stats = data.get("sufficient_stats")
+        return current_model, data["columns"]
+
+    def save_structure(self, filename, search_results=None):
+        model_structure = {"model_type": self.model_type, "params": self.params}
+        if search_results is not None:
+            model_structure["search"] = search_results
         with open(filename, "w") as file:
             json.dump(model_structure, file)
 
 
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, native allocations included.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def fit_and_predict(model_type, X_train, y_train, X_test, params=None):
+    """
+    Train a single model and predict the test set, measuring cost along the way.
+
+    Parameters:
+    - model_type: String, one of the supported Model types.
+    - X_train, y_train: Training features and labels.
+    - X_test: Test features.
+    - params: Optional dictionary of hyperparameters for the model.
+
+    Returns:
+    - Tuple of the trained Model, the test predictions and a dictionary with fit time,
+      predict time (seconds) and the peak resident memory (MB) of the process after the
+      run. Pool workers are reused, so it is the peak over the fits the worker ran.
+    """
+    start = time.perf_counter()
+    current_model = Model(model_type=model_type, params=params)
+    current_model.train(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predictions = current_model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    run_stats = {
+        "fit_time_s": fit_time,
+        "predict_time_s": predict_time,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return current_model, predictions, run_stats
+
+
+def _fit_and_predict_shared(model_type, array_paths, params=None):
+    """
+    Process pool entry point: memory map the shared arrays and train one model.
+    """
+    X_train = np.load(array_paths["X_train"], mmap_mode="r")
+    y_train = np.load(array_paths["y_train"], mmap_mode="r")
+    X_test = np.load(array_paths["X_test"], mmap_mode="r")
+    return fit_and_predict(model_type, X_train, y_train, X_test, params=params)
+
+
+def share_arrays(directory, **arrays):
+    """
+    Save arrays as .npy files so worker processes can memory map them instead of
+    receiving pickled copies.
+
+    Parameters:
+    - directory: Directory to write the files to.
+    - arrays: Name -> numpy array.
+
+    Returns:
+    - Dictionary mapping each name to its file path.
+    """
+    array_paths = {}
+    for name, values in arrays.items():
+        array_paths[name] = str(Path(directory) / f"{name}.npy")
+        np.save(array_paths[name], values)
+    return array_paths
+
+
+def resolve_n_jobs(n_jobs, n_tasks):
+    """
+    Resolve an n_jobs setting (-1 or None for all cores) to a worker count.
+    """
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    return max(1, min(n_jobs, n_tasks))
+
+
+def rescale_predictions(predictions, label_stats):
+    """
+    Rescale predictions using the inverse of min-max scaling.
+    """
+    return (
+        predictions * (label_stats["price_y"]["max"] - label_stats["price_y"]["min"])
+    ) + label_stats["price_y"]["min"]
+
+
+def evaluate_and_save(
+    current_model,
+    predictions,
+    y_test,
+    columns,
+    label_stats,
+    search_result=None,
+    confidence_intervals=None,
+    X_test=None,
+):
+    """
+    Compute test metrics of a trained model and save its pkl, json and metrics files.
+
+    Tree models additionally get a compact artifact when X_test is given.
+
+    Parameters:
+    - current_model: Trained Model.
+    - predictions: Scaled predictions of the model on the test set.
+    - y_test: Test labels in original units.
+    - columns: Feature column names, saved with the model.
+    - label_stats: Min-max scaling statistics of the label.
+    - search_result: Optional hyperparameter search summary saved next to the structure.
+    - confidence_intervals: Optional bootstrap intervals saved next to the metrics.
+    - X_test: Optional scaled test features, used to check the compact artifact.
+
+    Returns:
+    - Dictionary containing the metrics.
+    """
+    model_type = current_model.model_type
+
+    # Rescale the predictions using inverse of min-max scaling
+    predictions_rescaled = rescale_predictions(predictions, label_stats)
+
+    # Compute metrics
+    metrics = compute_regression_metrics(
+        y_true=list(y_test), y_pred=predictions_rescaled.tolist()
+    )
+
+    # print metrics
+    print(f"Model: {model_type} - Metrics: {metrics}")
+    print(f"Model: {model_type} pkl, json, metrics file saved to models/{model_type}")
+
+    # save model pkl file
+    current_model.save_model(f"models/{model_type}.pkl", columns)
+    # save model weights in json
+    current_model.save_structure(f"models/{model_type}.json", search_result)
+    # save metrics to .py file
+    with open(f"models/{model_type}_metrics.py", "w") as f:
+        f.write("metrics = " + str(metrics) + "\n")
+        if confidence_intervals is not None:
+            f.write("confidence_intervals = " + str(confidence_intervals) + "\n")
+
+    if X_test is not None:
+        save_compact(current_model, X_test)
+
+    return metrics
+
+
+def save_compact(current_model, X_eval):
+    """
+    Save the compact tree artifact of a model next to its pkl file.
+
+    Parameters:
+    - current_model: Trained Model.
+    - X_eval: Scaled features used to compare compact and original predictions.
+
+    Returns:
+    - Size and accuracy report from export_compact, or None for non-tree models.
+    """
+    if current_model.model_type not in COMPACT_MODEL_TYPES:
+        return None
+    return export_compact(
+        current_model.model,
+        X_eval,
+        f"models/{current_model.model_type}_compact.npz",
+    )
+
+
 def train_and_predict(
-    models_list, X_train, X_test, y_train, y_test, feature_stats, label_stats
+    models_list,
+    X_train,
+    X_test,
+    y_train,
+    y_test,
+    feature_stats,
+    label_stats,
+    n_jobs=1,
+    model_params=None,
+    search_results=None,
+    n_bootstrap=1000,
 ):
+    """
+    Train every model in models_list, report test metrics and save the artifacts.
+
+    Parameters:
+    - models_list: List of model types to train.
+    - X_train, X_test, y_train, y_test: Train/test split, X_train and y_train already scaled.
+    - feature_stats, label_stats: Min-max scaling statistics.
+    - n_jobs: Number of worker processes. 1 trains sequentially in this process,
+      -1 uses one process per core. Defaults to 1.
+    - model_params: Optional model type -> hyperparameters, e.g. from search_hyperparameters.
+    - search_results: Optional model type -> search summary saved next to the structure.
+    - n_bootstrap: Bootstrap resamples for the metric confidence intervals, 0 to skip.
+
+    Returns:
+    - Dictionary mapping each model type to its metrics and run statistics.
+    """
     # Scale x_test once before looping through models
     X_test["sq_feet_y"] = (X_test["sq_feet_y"] - feature_stats["sq_feet_y"]["min"]) / (
         feature_stats["sq_feet_y"]["max"] - feature_stats["sq_feet_y"]["min"]
     )
 
+    # Convert to contiguous float arrays once instead of once per model
+    columns = list(X_train.columns)
+    X_train = np.ascontiguousarray(X_train.to_numpy(dtype=np.float64))
+    y_train = np.ascontiguousarray(np.asarray(y_train, dtype=np.float64).ravel())
+    X_test = np.ascontiguousarray(X_test.to_numpy(dtype=np.float64))
+
+    model_params = model_params or {}
+    search_results = search_results or {}
+
+    n_jobs = resolve_n_jobs(n_jobs, len(models_list))
+    wall_start = time.perf_counter()
+    results = {}
+
+    if n_jobs == 1:
+        for model_type in models_list:
+            results[model_type] = fit_and_predict(
+                model_type,
+                X_train,
+                y_train,
+                X_test,
+                params=model_params.get(model_type),
+            )
+    else:
+        with tempfile.TemporaryDirectory() as shared_dir:
+            array_paths = share_arrays(
+                shared_dir, X_train=X_train, y_train=y_train, X_test=X_test
+            )
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = {
+                    executor.submit(
+                        _fit_and_predict_shared,
+                        model_type,
+                        array_paths,
+                        model_params.get(model_type),
+                    ): model_type
+                    for model_type in models_list
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+
+    wall_time = time.perf_counter() - wall_start
+
+    # Bootstrap the test metrics of all models at once
+    intervals = {}
+    if n_bootstrap:
+        intervals = bootstrap_regression_metrics(
+            y_true=y_test,
+            y_preds={
+                model_type: rescale_predictions(results[model_type][1], label_stats)
+                for model_type in models_list
+            },
+            n_bootstrap=n_bootstrap,
+            random_state=123,
+        )
+
+    summary = {}
     for model_type in models_list:
-        # Train model
-        current_model = Model(model_type=model_type)
-        current_model.train(X_train, y_train)
+        current_model, predictions, run_stats = results[model_type]
+        metrics = evaluate_and_save(
+            current_model,
+            predictions,
+            y_test,
+            columns,
+            label_stats,
+            search_result=search_results.get(model_type),
+            confidence_intervals=intervals.get(model_type),
+            X_test=X_test,
+        )
+        summary[model_type] = {"metrics": metrics, **run_stats}
+
+    # print run summary
+    print(
+        f"Trained {len(models_list)} models with {n_jobs} worker(s) in {wall_time:.2f}s"
+    )
+    print(f"{'Model':<20}{'fit (s)':>10}{'predict (s)':>14}{'peak RSS (MB)':>16}")
+    for model_type, model_summary in summary.items():
+        print(
+            f"{model_type:<20}{model_summary['fit_time_s']:>10.2f}"
+            f"{model_summary['predict_time_s']:>14.3f}"
+            f"{model_summary['peak_rss_mb']:>16.1f}"
+        )
 
-        # Predict
-        predictions = current_model.predict(X_test)
+    return summary
+
+
+def update_models(models_list, X_new, y_new, rows_seen, label_stats):
+    """
+    Incrementally update saved models with new rows.
+
+    Every model is first scored on the new rows it has not seen yet (test-then-train),
+    then updated in place and saved. Models outside INCREMENTAL_MODEL_TYPES keep their
+    current artifact until the next full refit.
+
+    Parameters:
+    - models_list: List of model types to update.
+    - X_new, y_new: New rows, encoded and scaled like the training data.
+    - rows_seen: Number of training rows the saved models have seen so far.
+    - label_stats: Min-max scaling statistics of the label.
 
-        # Rescale the predictions using inverse of min-max scaling
+    Returns:
+    - Dictionary mapping each model type to its test-then-train metrics and update status.
+    """
+    y_true = (
+        np.asarray(y_new, dtype=np.float64).ravel()
+        * (label_stats["price_y"]["max"] - label_stats["price_y"]["min"])
+    ) + label_stats["price_y"]["min"]
+
+    summary = {}
+    for model_type in models_list:
+        path = f"models/{model_type}.pkl"
+        current_model, columns = Model.load_model(path, model_type)
+
+        # Score on the new rows before learning from them
         predictions_rescaled = (
-            predictions
+            current_model.predict(X_new)
             * (label_stats["price_y"]["max"] - label_stats["price_y"]["min"])
         ) + label_stats["price_y"]["min"]
-
-        # Compute metrics
         metrics = compute_regression_metrics(
-            y_true=y_test.tolist(), y_pred=predictions_rescaled.tolist()
+            y_true=y_true.tolist(), y_pred=predictions_rescaled.tolist()
         )
 
-        # print metrics
-        print(f"Model: {model_type} - Metrics: {metrics}")
+        if model_type not in INCREMENTAL_MODEL_TYPES:
+            print(f"Model: {model_type} skipped, only refit by a full training run")
+            summary[model_type] = {"metrics": metrics, "updated": False}
+            continue
+
+        try:
+            start = time.perf_counter()
+            current_model.update(X_new, y_new, rows_seen=rows_seen)
+            update_time = time.perf_counter() - start
+        except ValueError as e:
+            print(f"Model: {model_type} skipped: {e}")
+            summary[model_type] = {"metrics": metrics, "updated": False}
+            continue
+
+        current_model.save_model(path, columns)
+        save_compact(current_model, X_new)
         print(
-            f"Model: {model_type} pkl, json, metrics file saved to models/{model_type}"
+            f"Model: {model_type} updated with {len(y_true)} rows in {update_time:.2f}s"
+            f" - Metrics before update: {metrics}"
+        )
+        summary[model_type] = {
+            "metrics": metrics,
+            "updated": True,
+            "update_time_s": update_time,
+        }
+
+    return summary
+
+
+def train_on_batches(models_list, batches, n_batches, n_estimators=100):
+    """
+    Train models one batch at a time, for data that does not fit in memory.
+
+    The first batch fits each model; every later batch updates it through Model.update.
+    Tree ensembles receive n_estimators / n_batches trees per batch so the final
+    ensemble size does not depend on the number of rows.
+
+    Parameters:
+    - models_list: List of model types, all in INCREMENTAL_MODEL_TYPES.
+    - batches: Iterable of (X, y) arrays, encoded and scaled like the training data.
+    - n_batches: Expected number of batches.
+    - n_estimators: Total trees or boosting rounds per ensemble. Defaults to 100.
+
+    Returns:
+    - Dictionary mapping each model type to its trained Model.
+    """
+    trees_per_batch = max(1, int(math.ceil(n_estimators / max(n_batches, 1))))
+    ensembles = {"random_forest", "gradient_boosting", "xgboost"}
+
+    models = {}
+    rows_seen = 0
+    for batch_index, (X_batch, y_batch) in enumerate(batches):
+        if len(y_batch) == 0:
+            continue
+        for model_type in models_list:
+            if model_type not in models:
+                params = (
+                    {"n_estimators": trees_per_batch} if model_type in ensembles else {}
+                )
+                models[model_type] = Model(model_type=model_type, params=params)
+                models[model_type].train(X_batch, y_batch)
+            else:
+                models[model_type].update(
+                    X_batch,
+                    y_batch,
+                    rows_seen=rows_seen,
+                    n_new_estimators=(
+                        trees_per_batch if model_type in ensembles else None
+                    ),
+                )
+        rows_seen += len(y_batch)
+        print(
+            f"Trained on batch {batch_index + 1}/{n_batches}, {rows_seen} rows so far"
+        )
+
+    return models
+
+
+def _evaluate_candidate(model_type, params, n_rows, array_paths):
+    """
+    Process pool entry point: cross-validate one candidate on the first n_rows of the
+    shared row order, reusing the shared matrices and fold assignment.
+
+    Returns:
+    - Dictionary with mean RMSE, mean fit time (s), median single-row latency (ms)
+      and pickled model size (MB).
+    """
+    X = np.load(array_paths["X"], mmap_mode="r")
+    y = np.load(array_paths["y"], mmap_mode="r")
+    fold_of_row = np.load(array_paths["fold_of_row"], mmap_mode="r")
+    order = np.load(array_paths["order"], mmap_mode="r")
+
+    rows = np.sort(order[:n_rows])
+    rows_fold = fold_of_row[rows]
+
+    rmse, fit_times, latencies = [], [], []
+    for fold in np.unique(rows_fold):
+        train_rows = rows[rows_fold != fold]
+        test_rows = rows[rows_fold == fold]
+
+        current_model = Model(model_type=model_type, params=params)
+        start = time.perf_counter()
+        current_model.train(X[train_rows], y[train_rows])
+        fit_times.append(time.perf_counter() - start)
+
+        predictions = current_model.predict(X[test_rows])
+        rmse.append(np.sqrt(((y[test_rows] - predictions) ** 2).mean()))
+
+        # Single-row inference latency, as served by the prediction endpoint
+        single_row = np.asarray(X[test_rows[:1]])
+        start = time.perf_counter()
+        current_model.predict(single_row)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "rmse": float(np.mean(rmse)),
+        "fit_time_s": float(np.mean(fit_times)),
+        "latency_ms": float(np.median(latencies)),
+        "size_mb": len(pickle.dumps(current_model.model)) / 1e6,
+    }
+
+
+def _candidate_scores(evaluations, objectives):
+    """
+    Combine RMSE and the optional objectives into one score per candidate, lower is better.
+
+    Every objective is divided by its best value among the candidates so that RMSE,
+    seconds, milliseconds and megabytes can be weighted against each other.
+    """
+    scores = np.zeros(len(evaluations))
+    for name, weight in [("rmse", 1.0)] + list(objectives.items()):
+        values = np.array([evaluation[name] for evaluation in evaluations])
+        scores += weight * values / max(values.min(), 1e-12)
+    return scores
+
+
+def search_hyperparameters(
+    models_list,
+    X_train,
+    y_train,
+    n_candidates=16,
+    eta=3,
+    n_folds=5,
+    objectives=None,
+    n_jobs=-1,
+    random_state=123,
+):
+    """
+    Successive-halving hyperparameter search for each model type.
+
+    Every round cross-validates the remaining candidates on a growing subsample of
+    the training rows and keeps the best 1/eta of them, until the survivors are
+    evaluated on all rows. Candidates run across a process pool; the encoded matrix,
+    a fixed row order and the fold assignment are computed once and memory mapped
+    by every worker.
+
+    Parameters:
+    - models_list: List of model types to search.
+    - X_train, y_train: Scaled training features and labels.
+    - n_candidates: Maximum number of candidates sampled from PARAM_SPACES per model.
+    - eta: Fraction of candidates dropped each round is 1 - 1/eta. Defaults to 3.
+    - n_folds: Number of cross-validation folds. Defaults to 5.
+    - objectives: Optional weights for "fit_time_s", "latency_ms" and "size_mb",
+      added to RMSE when ranking candidates.
+    - n_jobs: Number of worker processes, -1 for all cores. Defaults to -1.
+    - random_state: Seed for candidate sampling, row order and folds.
+
+    Returns:
+    - Dictionary mapping each model type to its best params, their evaluation
+      and the per-round history.
+    """
+    from sklearn.model_selection import KFold, ParameterGrid, ParameterSampler
+
+    objectives = objectives or {}
+    X = np.ascontiguousarray(np.asarray(X_train, dtype=np.float64))
+    y = np.ascontiguousarray(np.asarray(y_train, dtype=np.float64).ravel())
+    n_rows = len(y)
+
+    # Precompute the fold of every row and a row order shared by all rounds
+    rng = np.random.RandomState(random_state)
+    fold_of_row = np.zeros(n_rows, dtype=np.int8)
+    for fold, (_, test_index) in enumerate(
+        KFold(n_splits=n_folds, shuffle=True, random_state=random_state).split(X)
+    ):
+        fold_of_row[test_index] = fold
+    order = rng.permutation(n_rows)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as shared_dir:
+        array_paths = share_arrays(
+            shared_dir, X=X, y=y, fold_of_row=fold_of_row, order=order
         )
+        max_workers = resolve_n_jobs(n_jobs, n_candidates)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for model_type in models_list:
+                space = PARAM_SPACES[model_type]
+                n_sampled = min(n_candidates, len(ParameterGrid(space)))
+                candidates = list(
+                    ParameterSampler(space, n_iter=n_sampled, random_state=rng)
+                )
 
-        # save model pkl file
-        current_model.save_model(f"models/{model_type}.pkl", list(X_train.columns))
-        # save model weights in json
-        current_model.save_structure(f"models/{model_type}.json")
-        # save metrics to .py file
-        with open(f"models/{model_type}_metrics.py", "w") as f:
-            f.write("metrics = " + str(metrics) + "\n")
+                # Rows per round grow by eta until the final round uses all of them
+                n_rounds = int(math.floor(math.log(len(candidates), eta))) + 1
+                min_rows = max(n_folds * 20, n_rows // eta ** (n_rounds - 1))
+
+                history = []
+                for round_index in range(n_rounds):
+                    budget = min(n_rows, min_rows * eta**round_index)
+                    if round_index == n_rounds - 1:
+                        budget = n_rows
+                    futures = [
+                        executor.submit(
+                            _evaluate_candidate, model_type, params, budget, array_paths
+                        )
+                        for params in candidates
+                    ]
+                    evaluations = [future.result() for future in futures]
+                    ranking = np.argsort(_candidate_scores(evaluations, objectives))
+
+                    history.append(
+                        {
+                            "rows": int(budget),
+                            "candidates": len(candidates),
+                            "best_rmse": evaluations[ranking[0]]["rmse"],
+                        }
+                    )
+                    print(
+                        f"Search {model_type} round {round_index + 1}/{n_rounds}: "
+                        f"{len(candidates)} candidates on {budget} rows, "
+                        f"best RMSE {evaluations[ranking[0]]['rmse']:.4f}"
+                    )
+
+                    if round_index == n_rounds - 1:
+                        results[model_type] = {
+                            "params": candidates[ranking[0]],
+                            "evaluation": evaluations[ranking[0]],
+                            "history": history,
+                        }
+                    else:
+                        keep = max(1, int(math.ceil(len(candidates) / eta)))
+                        candidates = [candidates[i] for i in ranking[:keep]]
+
+                print(
+                    f"Search {model_type} best params: {results[model_type]['params']}"
+                )
+
+    return results
 
 
 def compute_regression_metrics(y_true, y_pred):
@@ -106,31 +790,46 @@ def compute_regression_metrics(y_true, y_pred):
     """
 
     # Convert lists to numpy arrays
-    y_true = np.array(y_true)
-    y_pred = np.array(y_pred)
+    y_true = np.array(y_true, dtype=np.float64)
+    y_pred = np.array(y_pred, dtype=np.float64)
+
+    return {
+        name: float(value) for name, value in _metric_arrays(y_true, y_pred).items()
+    }
+
+
+def _metric_arrays(y_true, y_pred):
+    """
+    Compute the regression metrics along the last axis.
+
+    Leading axes broadcast, so a (models x resamples x rows) stack of predictions
+    yields (models x resamples) arrays of metrics in one pass.
+    """
+    error = y_true - y_pred
+    n_rows = y_true.shape[-1]
 
     # MSE
-    mse_val = ((y_true - y_pred) ** 2).mean()
+    mse_val = (error**2).mean(axis=-1)
 
     # RMSE
     rmse_val = np.sqrt(mse_val)
 
     # R^2
-    y_mean = y_true.mean()
-    total_variance = ((y_true - y_mean) ** 2).sum()
-    r2_val = 1 - (mse_val * len(y_true) / total_variance)
+    y_mean = y_true.mean(axis=-1, keepdims=True)
+    total_variance = ((y_true - y_mean) ** 2).sum(axis=-1)
+    r2_val = 1 - (mse_val * n_rows / total_variance)
 
     # MAE
-    mae_val = np.abs(y_true - y_pred).mean()
+    mae_val = np.abs(error).mean(axis=-1)
 
     # MBD
-    mbd_val = (y_true - y_pred).mean()
+    mbd_val = error.mean(axis=-1)
 
     # MAPE
-    mape_val = (np.abs((y_true - y_pred) / y_true).mean()) * 100
+    mape_val = (np.abs(error / y_true).mean(axis=-1)) * 100
 
     # Median Absolute Error
-    medae_val = np.median(np.abs(y_true - y_pred))
+    medae_val = np.median(np.abs(error), axis=-1)
 
     return {
         "MSE": mse_val,
@@ -141,3 +840,59 @@ def compute_regression_metrics(y_true, y_pred):
         "MAPE": mape_val,
         "Median Absolute Error": medae_val,
     }
+
+
+def bootstrap_regression_metrics(
+    y_true,
+    y_preds,
+    n_bootstrap=1000,
+    confidence=0.95,
+    random_state=None,
+    max_chunk_bytes=256e6,
+):
+    """
+    Percentile bootstrap confidence intervals of the regression metrics for many models.
+
+    All models are scored on the same B x N matrix of resampled row indices, so their
+    intervals are directly comparable. Resamples are processed in chunks whose
+    (models x resamples x rows) working set stays under max_chunk_bytes.
+
+    Parameters:
+    - y_true: True target values.
+    - y_preds: Dictionary of model name -> predicted values.
+    - n_bootstrap: Number of bootstrap resamples. Defaults to 1000.
+    - confidence: Confidence level of the intervals. Defaults to 0.95.
+    - random_state: Seed for the resampling.
+    - max_chunk_bytes: Memory budget of one vectorized chunk.
+
+    Returns:
+    - Dictionary of model name -> metric name -> [lower, upper].
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    names = list(y_preds)
+    predictions = np.vstack(
+        [np.asarray(y_preds[name], dtype=np.float64) for name in names]
+    )
+    n_models, n_rows = predictions.shape
+
+    rng = np.random.RandomState(random_state)
+    chunk = max(1, int(max_chunk_bytes // (8 * n_rows * (n_models + 1))))
+
+    resampled = []
+    for start in range(0, n_bootstrap, chunk):
+        index = rng.randint(0, n_rows, size=(min(chunk, n_bootstrap - start), n_rows))
+        resampled.append(
+            _metric_arrays(y_true[index][None, :, :], predictions[:, index])
+        )
+
+    alpha = (1 - confidence) / 2 * 100
+    intervals = {name: {} for name in names}
+    for metric in resampled[0]:
+        values = np.concatenate(
+            [chunk_metrics[metric] for chunk_metrics in resampled], axis=1
+        )
+        lower, upper = np.percentile(values, [alpha, 100 - alpha], axis=1)
+        for i, name in enumerate(names):
+            intervals[name][metric] = [float(lower[i]), float(upper[i])]
+
+    return intervals
@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pymongo import MongoClient, UpdateOne
+import time
+
+
+def connection_uri(username, password, cluster_uri, db_name):
+    """
+    Connection URI of the MongoDB Atlas cluster, or cluster_uri itself when it already
+    is a full connection string such as 'mongodb://localhost:27017' for a local mongod.
+    """
+    if cluster_uri.startswith(("mongodb://", "mongodb+srv://")):
+        return cluster_uri
+    return f"mongodb+srv://{username}:{password}@{cluster_uri}/{db_name}?retryWrites=true&w=majority"
+
+
+def iter_batches(records, batch_size):
+    """
+    Group an iterable of records into lists of at most batch_size records.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dataframe_records(dataframe, chunk_size=10000):
+    """
+    Yield the rows of a DataFrame as dictionaries, converting chunk_size rows at a time.
+    """
+    for start in range(0, len(dataframe), chunk_size):
+        yield from dataframe.iloc[start : start + chunk_size].to_dict(orient="records")
+
+
+def write_batch(collection, records, upsert_key=None, insert_fields=None):
+    """
+    Write one batch of records with a single unordered call.
+
+    Parameters:
+    - collection: pymongo Collection.
+    - records (list): Documents to write.
+    - upsert_key (str, optional): Field identifying a document. When given, records
+      update the matching document or are inserted, so retrying a batch is idempotent.
+      Defaults to None (insert_many).
+    - insert_fields (dict, optional): With upsert_key, fields only set when a document is
+      created, as new field -> record field, e.g. {'first_seen': 'sysdate'}.
+
+    Returns:
+    - int: Number of records written.
+    """
+    if not records:
+        return 0
+    if upsert_key:
+        operations = []
+        for record in records:
+            update = {"$set": record}
+            if insert_fields:
+                update["$setOnInsert"] = {
+                    field: record.get(source) for field, source in insert_fields.items()
+                }
+            operations.append(
+                UpdateOne({upsert_key: record[upsert_key]}, update, upsert=True)
+            )
+        collection.bulk_write(operations, ordered=False)
+    else:
+        collection.insert_many(records, ordered=False)
+    return len(records)
+
+
+def write_records(
+    records,
+    collection,
+    batch_size=1000,
+    n_threads=4,
+    upsert_key=None,
+    insert_fields=None,
+    on_batch_written=None,
+):
+    """
+    Stream records into a collection in fixed-size batches written in parallel.
+
+    Records are consumed lazily and at most two batches per thread are held in memory.
+    With n_threads=1 batches are written in the calling thread, so when
+    on_batch_written runs every record taken from records so far has been written.
+
+    Parameters:
+    - records: Iterable of dictionaries.
+    - collection: pymongo Collection; its client should pool at least n_threads connections.
+    - batch_size (int, optional): Records per write. Defaults to 1000.
+    - n_threads (int, optional): Concurrent writes. Defaults to 4.
+    - upsert_key, insert_fields (optional): See write_batch.
+    - on_batch_written (callable, optional): Called with the size of every written batch.
+
+    Returns:
+    - dict: Documents written, elapsed seconds and documents per second.
+    """
+    start = time.perf_counter()
+    written = 0
+
+    def finished(n_records):
+        nonlocal written
+        written += n_records
+        if on_batch_written is not None:
+            on_batch_written(n_records)
+
+    if n_threads <= 1:
+        for batch in iter_batches(records, batch_size):
+            finished(write_batch(collection, batch, upsert_key, insert_fields))
+    else:
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            pending = set()
+            for batch in iter_batches(records, batch_size):
+                pending.add(
+                    executor.submit(
+                        write_batch, collection, batch, upsert_key, insert_fields
+                    )
+                )
+                if len(pending) >= 2 * n_threads:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished(future.result())
+            for future in pending:
+                finished(future.result())
+
+    elapsed = time.perf_counter() - start
+    docs_per_s = written / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Wrote {written} documents to {collection.full_name} in {elapsed:.1f}s "
+        f"({docs_per_s:.0f} docs/s)"
+    )
+    return {"written": written, "seconds": elapsed, "docs_per_s": docs_per_s}
+
+
+def dataframe_to_mongodb(
+    dataframe,
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    collection_name,
+    batch_size=1000,
+    n_threads=4,
+    upsert_key=None,
+):
+    """
+    Write a DataFrame to a MongoDB collection with write_records.
+
+    Parameters:
+    - dataframe: DataFrame to write, one document per row.
+    - username, password, cluster_uri, db_name, collection_name: MongoDB target; see
+      connection_uri for local connection strings.
+    - batch_size, n_threads, upsert_key (optional): See write_records.
+
+    Returns:
+    - dict: Documents written, elapsed seconds and documents per second.
+    """
+    client = MongoClient(
+        connection_uri(username, password, cluster_uri, db_name),
+        maxPoolSize=n_threads + 1,
+    )
+    try:
+        if upsert_key:
+            client[db_name][collection_name].create_index(upsert_key)
+        return write_records(
+            dataframe_records(dataframe),
+            client[db_name][collection_name],
+            batch_size=batch_size,
+            n_threads=n_threads,
+            upsert_key=upsert_key,
+        )
+    finally:
+        client.close()
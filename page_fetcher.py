@@ -0,0 +1,170 @@
+from urllib.parse import urlsplit
+import threading
+import asyncio
+import inspect
+import random
+import queue
+import time
+import aiohttp
+
+# Browser-like headers, the listing pages are served to plain HTTP clients as well
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-CA,en;q=0.9",
+}
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """
+    Space out requests to the same host to at most rate_per_host per second.
+    """
+
+    def __init__(self, rate_per_host=4.0):
+        self.interval = 1.0 / rate_per_host if rate_per_host else 0.0
+        self.next_slot = {}
+        self.locks = {}
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        lock = self.locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+async def fetch_page(session, url, limiter, retries=3, backoff=1.0):
+    """
+    Fetch one page, retrying transient failures with exponential backoff and jitter.
+
+    Parameters:
+    - session: aiohttp.ClientSession.
+    - url: Page URL.
+    - limiter: HostRateLimiter shared by all requests.
+    - retries: Retries after the first attempt. Defaults to 3.
+    - backoff: Base delay in seconds, doubled after every failed attempt. Defaults to 1.
+
+    Returns:
+    - The page HTML as a string.
+    """
+    for attempt in range(retries + 1):
+        await limiter.wait(url)
+        try:
+            async with session.get(url) as response:
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    retry_after = response.headers.get("Retry-After", "")
+                    delay = (
+                        float(retry_after)
+                        if retry_after.isdigit()
+                        else backoff * 2**attempt
+                    )
+                    await asyncio.sleep(delay + random.uniform(0, backoff))
+                    continue
+                response.raise_for_status()
+                return await response.text()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2**attempt + random.uniform(0, backoff))
+
+
+async def fetch_pages(
+    urls,
+    on_page,
+    concurrency=16,
+    rate_per_host=4.0,
+    retries=3,
+    backoff=1.0,
+    timeout=30,
+    headers=None,
+):
+    """
+    Fetch pages with at most concurrency requests in flight.
+
+    Parameters:
+    - urls: Iterable of page URLs.
+    - on_page: Callback on_page(url, html, error) called as each page finishes;
+      html is None when the fetch failed with error. It may be a coroutine function,
+      the worker that fetched the page then awaits it before fetching the next one.
+    - concurrency: Maximum simultaneous requests. Defaults to 16.
+    - rate_per_host: Maximum requests per second to one host, 0 for no limit.
+      Defaults to 4.
+    - retries, backoff: Retry policy, see fetch_page.
+    - timeout: Total timeout per request in seconds. Defaults to 30.
+    - headers: Request headers. Defaults to DEFAULT_HEADERS.
+    """
+    limiter = HostRateLimiter(rate_per_host)
+    pending = iter(urls)
+
+    async def worker(session):
+        for url in pending:
+            try:
+                html = await fetch_page(session, url, limiter, retries, backoff)
+                error = None
+            except Exception as e:
+                html, error = None, e
+            result = on_page(url, html, error)
+            if inspect.isawaitable(result):
+                await result
+
+    async with aiohttp.ClientSession(
+        headers=headers or DEFAULT_HEADERS,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        connector=aiohttp.TCPConnector(limit=concurrency),
+    ) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+
+
+def iter_pages(urls, buffer_size=64, **fetch_options):
+    """
+    Fetch pages concurrently and yield them to synchronous code as they arrive.
+
+    The event loop runs in a background thread; at most buffer_size fetched pages
+    wait for the consumer, so a slow consumer slows the fetching down. Pages are put
+    in the buffer from the loop's executor: a full buffer holds back the fetch workers
+    that have a page to hand over, never the event loop and the requests in flight.
+
+    Parameters:
+    - urls: Iterable of page URLs.
+    - buffer_size: Maximum fetched pages waiting to be consumed. Defaults to 64.
+    - fetch_options: Keyword arguments of fetch_pages.
+
+    Yields:
+    - Tuples of (url, html, error), html is None when the fetch failed.
+    """
+    pages = queue.Queue(maxsize=buffer_size)
+    done = object()
+    errors = []
+
+    async def hand_over(*page):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, pages.put, page)
+
+    def run():
+        try:
+            asyncio.run(fetch_pages(urls, hand_over, **fetch_options))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pages.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while True:
+        page = pages.get()
+        if page is done:
+            break
+        yield page
+    thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,142 @@
+from pathlib import Path
+from collections import Counter
+import threading
+import uuid
+import time
+import sys
+import os
+import re
+
+# Set to 1 to allow profiling single requests with the X-Profile header or ?profile=1
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+
+# When set, the X-Profile header must carry this value for a request to be profiled
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+
+# Time between two samples of the thread stacks and longest time sampled per request
+SAMPLE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+MAX_PROFILE_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+
+# Directory the collapsed stacks are written to, one file per profiled request
+PROFILES_DIR = Path(os.environ.get("PROFILES_DIR", Path(__file__).parent / "profiles"))
+
+# Innermost functions of threads waiting for work, left out of the profiles
+IDLE_FUNCTIONS = {"wait", "select", "poll", "epoll", "get", "_worker", "accept"}
+
+PROFILE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Only one request is profiled at a time, the others are served normally
+_profile_lock = threading.Lock()
+
+
+def _frame_label(code):
+    return f"{code.co_name}@{Path(code.co_filename).name}:{code.co_firstlineno}"
+
+
+class SamplingProfiler:
+    """
+    Sample the Python stacks of all threads at a fixed interval from a daemon thread.
+
+    Sampling every thread covers the route handler wherever it runs: on the event loop,
+    in the threadpool of synchronous routes or in the prediction executor. Threads
+    waiting for work are skipped; requests served concurrently may still appear in a
+    profile, each stack being prefixed with its thread name.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, max_seconds=MAX_PROFILE_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or frame.f_code.co_name in IDLE_FUNCTIONS:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            labels.append(f"thread:{names.get(ident, ident)}")
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+            if time.monotonic() >= deadline:
+                break
+
+    def collapsed(self):
+        """
+        Stacks in the collapsed format read by flamegraph.pl and speedscope.
+        """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def profile_requested(request):
+    """
+    Whether request asked to be profiled and profiling is allowed by the configuration.
+    """
+    if not PROFILING_ENABLED:
+        return False
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    if not flag:
+        return False
+    return PROFILING_TOKEN is None or flag == PROFILING_TOKEN
+
+
+def profile_path(profile_id):
+    """
+    Path of the collapsed stacks of profile_id, or None if profile_id is malformed.
+    """
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+        return None
+    return PROFILES_DIR / f"{profile_id}.folded"
+
+
+async def profiling_middleware(request, call_next):
+    """
+    FastAPI HTTP middleware running a requested single request under SamplingProfiler.
+
+    The collapsed stacks are written to PROFILES_DIR/<profile id>.folded and the id is
+    returned in the X-Profile-Id response header. While a profile is being taken, other
+    requests asking for one are served without profiling.
+    """
+    if not profile_requested(request) or not _profile_lock.acquire(blocking=False):
+        return await call_next(request)
+
+    profile_id = uuid.uuid4().hex
+    profiler = SamplingProfiler()
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        profiler.stop()
+        _profile_lock.release()
+
+    elapsed = time.perf_counter() - start
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    profile_path(profile_id).write_text(profiler.collapsed())
+    print(
+        f"Profiled {request.method} {request.url.path} in {elapsed * 1000:.1f} ms "
+        f"({profiler.samples} samples) as {profile_id}"
+    )
+    response.headers["X-Profile-Id"] = profile_id
+    response.headers["X-Profile-Samples"] = str(profiler.samples)
+    return response
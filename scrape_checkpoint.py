@@ -0,0 +1,119 @@
+from pathlib import Path
+import json
+import time
+import os
+
+# Default location of the scrape checkpoint, next to the dataset cache
+CHECKPOINT_PATH = Path(__file__).parent / "cache" / "scrape_checkpoint.json"
+
+
+class ScrapeCheckpoint:
+    """
+    Local state of a scraping run: the discovered URL frontier, the completed URLs and
+    the failed URLs with their error counts.
+
+    A URL only counts as completed once the batch holding its records has been written,
+    so resuming never skips data that was lost in a crash. The state is flushed to disk
+    atomically, at most every flush_interval seconds.
+    """
+
+    def __init__(self, path=CHECKPOINT_PATH, flush_interval=5.0):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.sysdate = None
+        self.frontier = []
+        self.completed = set()
+        self.failed = {}
+        self.written_pending = []
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_PATH, flush_interval=5.0):
+        """
+        Load the checkpoint at path, or start an empty one if there is none.
+        """
+        checkpoint = cls(path, flush_interval)
+        if checkpoint.path.exists():
+            with open(checkpoint.path) as file:
+                state = json.load(file)
+            checkpoint.sysdate = state["sysdate"]
+            checkpoint.frontier = state["frontier"]
+            checkpoint.completed = set(state["completed"])
+            checkpoint.failed = state["failed"]
+        return checkpoint
+
+    def start(self, url_list, sysdate):
+        """
+        Begin a new run over url_list, dropping any previous state.
+        """
+        self.sysdate = sysdate
+        self.frontier = list(url_list)
+        self.completed = set()
+        self.failed = {}
+        self.written_pending = []
+        self.flush()
+
+    def pending_urls(self, max_failures=None):
+        """
+        URLs of the frontier not completed yet, skipping URLs that failed max_failures times.
+        """
+        return [
+            url
+            for url in self.frontier
+            if url not in self.completed
+            and (max_failures is None or self.failed.get(url, 0) < max_failures)
+        ]
+
+    def page_done(self, url):
+        """
+        Record that all records of url were handed to the writer.
+        """
+        self.written_pending.append(url)
+
+    def page_failed(self, url, error=None):
+        self.failed[url] = self.failed.get(url, 0) + 1
+        self.maybe_flush()
+
+    def batch_written(self, n_records=None):
+        """
+        Mark the URLs handed to the writer so far as completed, once their batch is written.
+        """
+        for url in self.written_pending:
+            self.completed.add(url)
+            self.failed.pop(url, None)
+        self.written_pending = []
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the state to disk atomically. A checkpoint without a frontier is not written.
+        """
+        if not self.frontier:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {
+                    "sysdate": self.sysdate,
+                    "frontier": self.frontier,
+                    "completed": sorted(self.completed),
+                    "failed": self.failed,
+                },
+                file,
+            )
+        os.replace(tmp_path, self.path)
+        self.last_flush = time.monotonic()
+
+    def clear(self):
+        """
+        Remove the checkpoint after a run that left nothing to retry.
+        """
+        self.frontier = []
+        self.completed = set()
+        self.failed = {}
+        self.path.unlink(missing_ok=True)
@@ -1,16 +1,21 @@
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 import time
 import re
-import json
 import pandas as pd
-import numpy as np
 from pymongo import MongoClient
+from mongo_writer import connection_uri, write_records
+import mongo_writer
+from urllib.parse import urlsplit, urlencode, parse_qsl
 from datetime import datetime
+import hashlib
 from credentials import chrome_cred, mongo_db_cred
+from page_fetcher import iter_pages
+from listing_extractor import extract_listing_scripts, parse_listing_scripts
+from scrape_checkpoint import ScrapeCheckpoint, CHECKPOINT_PATH
+import argparse
 
 
 def get_driver(url, chrome_driver_path, sleep_time=5):
@@ -35,7 +40,16 @@ def get_driver(url, chrome_driver_path, sleep_time=5):
     return driver
 
 
-def get_url_list(driver, pattern, sleep_time=5):
+def page_urls(html_content, pattern):
+    """
+    Return the set of listing URLs matched by pattern in a result page.
+    """
+    matches = set(re.findall(pattern, html_content))
+    matches = [s.replace('href="', "").replace('"', "") for s in matches]
+    return {"https://www.rentfaster.ca/" + s for s in matches}
+
+
+def get_url_list(driver, pattern, sleep_time=5, max_pages=None):
     """
     Scrape and collect URLs from a paginated source using the provided Selenium driver and a regex pattern.
 
@@ -43,30 +57,33 @@ def get_url_list(driver, pattern, sleep_time=5):
     - driver: The Selenium WebDriver instance to be used for scraping.
     - pattern (str): A regex pattern to match URLs in the page's HTML content.
     - sleep_time (int, optional): Time in seconds to wait between scraping operations. Defaults to 5 seconds.
+    - max_pages (int, optional): Stop after this many result pages. Defaults to None (all pages).
 
     Returns:
-    - list: A list of collected URLs.
+    - list: A list of collected URLs, without duplicates.
 
     Note:
     - The scraping process is based on specific HTML structures and patterns, which may change if the source website updates its design.
     - The function assumes that the source website's pagination is based on the presence of certain buttons and uses the 'https://www.rentfaster.ca/' base URL for the matched paths.
+    - Paging stops early at a page whose URLs were all seen on earlier pages.
     """
     url_list = []
+    seen = set()
     i = 1
     try:
-        while True:
+        while max_pages is None or i <= max_pages:
             time.sleep(sleep_time)
-            html_content = driver.page_source
-            soup = BeautifulSoup(html_content, "html.parser")
-            matches = re.findall(pattern, html_content)
+            matches = page_urls(driver.page_source, pattern)
             if len(matches) > 0:
                 print(f"There are matches! for page {i}")
             else:
                 print(f"No matches found. for page {i}")
-            matches = list(set(matches))
-            matches = [s.replace('href="', "").replace('"', "") for s in matches]
-            matches = ["https://www.rentfaster.ca/" + s for s in matches]
-            url_list.extend(matches)
+            new_matches = matches - seen
+            if matches and not new_matches:
+                print(f"All urls of page {i} already seen, stopping")
+                break
+            url_list.extend(sorted(new_matches))
+            seen |= new_matches
             i = i + 1
             button = driver.find_element(
                 By.XPATH,
@@ -78,118 +95,536 @@ def get_url_list(driver, pattern, sleep_time=5):
     return url_list
 
 
-def scrape(driver, url_list, sleep_time=3):
+def result_page_url(search_url, page, page_param="cur_page"):
     """
-    Scrape structured data from a list of URLs using Selenium and BeautifulSoup.
+    URL of a result page, with the page index set as a query parameter.
+    """
+    parts = urlsplit(search_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != page_param]
+    query.append((page_param, str(page)))
+    return parts._replace(query=urlencode(query, safe=",")).geturl()
+
+
+def discover_urls(
+    search_url,
+    pattern,
+    page_param="cur_page",
+    max_pages=None,
+    window=None,
+    **fetch_options,
+):
+    """
+    Collect listing URLs by fetching the result pages concurrently by page index.
 
-    The function navigates to each URL in the provided list, extracts specific JavaScript content,
-    and parses this content to accumulate structured data into a pandas DataFrame.
+    Pages are requested in windows of concurrent requests and processed in page order.
+    Discovery stops at the first page without matches or whose URLs were all seen
+    before, or after max_pages pages.
 
     Parameters:
-    - driver: The Selenium WebDriver instance to be used for scraping.
-    - url_list (list): A list of URLs to scrape.
-    - sleep_time (int, optional): Time in seconds to wait after navigating to a URL. Defaults to 3 seconds.
+    - search_url (str): URL of the first result page.
+    - pattern (str): A regex pattern to match URLs in the page's HTML content.
+    - page_param (str, optional): Query parameter holding the page index. Defaults to 'cur_page'.
+    - max_pages (int, optional): Maximum result pages. Defaults to None (until the results end).
+    - window (int, optional): Pages requested at once. Defaults to the fetch concurrency.
+    - fetch_options: Keyword arguments of page_fetcher.fetch_pages.
 
     Returns:
-    - DataFrame: A pandas DataFrame containing the scraped and structured data from the provided URLs.
+    - list: A list of collected URLs without duplicates, or None when the site does not
+      serve results by page index over plain HTTP (no matches on the first page, or the
+      second page repeating the first), in which case get_url_list has to be used.
+    """
+    window = window or fetch_options.get("concurrency", 16)
+    url_list = []
+    seen = set()
+    first_page = 1
+    while max_pages is None or first_page <= max_pages:
+        last_page = first_page + window - 1
+        if max_pages is not None:
+            last_page = min(last_page, max_pages)
+        pages = {
+            result_page_url(search_url, page, page_param): page
+            for page in range(first_page, last_page + 1)
+        }
+
+        page_matches = {}
+        for url, html_content, error in iter_pages(pages, **fetch_options):
+            if error is not None:
+                print(f"Error at result page {pages[url]}: {error}")
+            page_matches[pages[url]] = (
+                page_urls(html_content, pattern) if error is None else set()
+            )
+
+        for page in range(first_page, last_page + 1):
+            matches = page_matches[page]
+            new_matches = matches - seen
+            if not new_matches:
+                if page == 1 or (page == 2 and matches):
+                    return None
+                print(f"Discovered {len(url_list)} urls on {page - 1} result pages")
+                return url_list
+            url_list.extend(sorted(new_matches))
+            seen |= new_matches
+        first_page = last_page + 1
+
+    print(f"Discovered {len(url_list)} urls on {max_pages} result pages")
+    return url_list
+
+
+def merge_listing_units(listing, units, unique_id):
+    """
+    Join a listing with its units into one record per unit.
+
+    Matches an outer merge of the listing and unit DataFrames on unique_id: fields
+    present in both the listing and any unit get the suffixes '_x' (listing) and '_y'
+    (unit), e.g. 'price_y' is the unit price. A listing without units gives one record.
+
+    Parameters:
+    - listing (dict): Fields of 'var listingJson'.
+    - units (list): Unit dictionaries of 'window.units'.
+    - unique_id (int): Identifier joining the listing to its units.
+
+    Returns:
+    - list: Records as dictionaries.
+    """
+    unit_keys = set().union(*units) if units else set()
+    shared = (listing.keys() & unit_keys) - {"unique_id"}
+    listing_record = {
+        (f"{key}_x" if key in shared else key): value for key, value in listing.items()
+    }
+    listing_record["unique_id"] = unique_id
+
+    records = []
+    for unit in units or [{}]:
+        record = dict(listing_record)
+        for key, value in unit.items():
+            record[f"{key}_y" if key in shared else key] = value
+        records.append(record)
+    return records
+
+
+def listing_id_from_url(url):
+    """
+    Stable identifier of a listing, taken from its URL.
+
+    Listing URLs end with the numeric listing reference, e.g.
+    '.../rentals/apartment/beltline/123456'. URLs without one are identified by their path.
+    """
+    path = urlsplit(url).path.rstrip("/")
+    last_segment = path.rsplit("/", 1)[-1]
+    return last_segment if last_segment.isdigit() else path
+
+
+def content_hash(scripts):
+    """
+    Hash of the listing script payloads, used to detect changed listings without parsing them.
+    """
+    digest = hashlib.sha1()
+    for script in scripts:
+        digest.update(script.strip().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def parse_listing_page(html_content, unique_id):
+    """
+    Parse the listing and its units from the HTML of a listing page.
+
+    Parameters:
+    - html_content (str): HTML of the listing page.
+    - unique_id (int): Identifier joining the listing to its units.
+
+    Returns:
+    - list: One record per unit, with the listing fields repeated on each record.
 
     Note:
-    - The scraping and parsing processes are based on specific HTML structures and patterns, which may change if the source websites update their designs.
-    - The function expects the presence of specific JavaScript patterns ('var listingJson' and 'window.units') within the scraped content.
-    - Each row in the final DataFrame is associated with a unique_id which is incrementally generated for each URL.
+    - The function expects the presence of specific JavaScript patterns ('var listingJson' and 'window.units') within the content.
     """
-    df_final = pd.DataFrame()
-    z = 0
+    listing, units = parse_listing_scripts(extract_listing_scripts(html_content))
+    return merge_listing_units(listing, units, unique_id)
+
+
+class ChangeTracker:
+    """
+    Content hashes of the listings already stored, and per-run counts of new, changed
+    and unchanged listings.
+    """
+
+    def __init__(self, known_hashes=None):
+        self.known_hashes = dict(known_hashes or {})
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0}
+
+    def status(self, listing_id, digest):
+        previous = self.known_hashes.get(listing_id)
+        if previous is None:
+            return "new"
+        return "unchanged" if previous == digest else "changed"
+
+    def record(self, listing_id, digest, status):
+        self.counts[status] += 1
+        self.known_hashes[listing_id] = digest
+
+
+def load_known_hashes(username, password, cluster_uri, db_name, collection_name):
+    """
+    Read the latest content hash of every listing stored in the raw collection.
+
+    Units are upserted on unit_key and every unit of a changed listing is rewritten
+    with its new hash, but the documents of units since removed from the listing, and
+    those inserted per run before units were upserted, keep older hashes. The query
+    relies on the newest document of a listing (highest 'sysdate') carrying its
+    current hash and returns that one.
+
+    Returns:
+    - dict: listing_id -> content_hash.
+    """
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
+
+    client = MongoClient(mongo_uri)
+    try:
+        cursor = client[db_name][collection_name].aggregate(
+            [
+                {"$match": {"content_hash": {"$exists": True}}},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "listing_id": 1,
+                        "content_hash": 1,
+                        "sysdate": 1,
+                    }
+                },
+                {"$sort": {"sysdate": -1}},
+                {
+                    "$group": {
+                        "_id": "$listing_id",
+                        "content_hash": {"$first": "$content_hash"},
+                    }
+                },
+            ],
+            allowDiskUse=True,
+        )
+        return {document["_id"]: document["content_hash"] for document in cursor}
+    finally:
+        client.close()
+
+
+def listing_records(html_content, url, unique_id, sysdate, tracker=None):
+    """
+    Build the records of one listing page, skipping listings whose content is unchanged.
+
+    Every record carries the listing_id, a unit_key identifying the unit across runs
+    (the unit's 'id' when present, else its position in 'window.units') and the
+    content_hash of the page payload.
+
+    Parameters:
+    - html_content (str): HTML of the listing page.
+    - url (str): URL of the listing page.
+    - unique_id (int): Identifier joining the listing to its units within this run.
+    - sysdate (str): Run timestamp stamped on every record.
+    - tracker (ChangeTracker, optional): Known content hashes; unchanged listings are
+      counted and skipped before parsing. Defaults to None.
+
+    Returns:
+    - list: Records of the listing, empty if it is unchanged.
+    """
+    scripts = extract_listing_scripts(html_content)
+    listing_id = listing_id_from_url(url)
+    digest = content_hash(scripts)
+
+    status = tracker.status(listing_id, digest) if tracker is not None else "new"
+    if status == "unchanged":
+        tracker.record(listing_id, digest, status)
+        return []
+
+    listing, units = parse_listing_scripts(scripts)
+    records = merge_listing_units(listing, units, unique_id)
+    for index, record in enumerate(records):
+        unit_id = units[index].get("id", index) if units else 0
+        record["listing_id"] = listing_id
+        record["unit_key"] = f"{listing_id}-{unit_id}"
+        record["content_hash"] = digest
+        record["sysdate"] = sysdate
+
+    if tracker is not None:
+        tracker.record(listing_id, digest, status)
+    return records
+
+
+def iter_selenium_records(
+    driver,
+    url_list,
+    sleep_time=3,
+    first_id=0,
+    sysdate=None,
+    tracker=None,
+    checkpoint=None,
+):
+    """
+    Scrape URLs one at a time with Selenium and yield the listing records as they are parsed.
+
+    Parameters:
+    - driver: The Selenium WebDriver instance to be used for scraping.
+    - url_list (list): A list of URLs to scrape.
+    - sleep_time (int, optional): Time in seconds to wait after navigating to a URL. Defaults to 3 seconds.
+    - first_id (int, optional): unique_id of the first URL. Defaults to 0.
+    - sysdate (str, optional): Run timestamp stamped on every record. Defaults to now.
+    - tracker (ChangeTracker, optional): Skip listings whose content is unchanged. Defaults to None.
+    - checkpoint (ScrapeCheckpoint, optional): Run state recording finished and failed urls. Defaults to None.
+
+    Yields:
+    - dict: One record per unit.
+    """
+    sysdate = sysdate or datetime.now().strftime("%Y-%m-%d %H:%M")
+    z = first_id
     for k in url_list:
         try:
             driver.get(k)
             time.sleep(sleep_time)
-            html_content = driver.page_source
-            soup = BeautifulSoup(html_content, "html.parser")
-            # print(soup.prettify())
-            pattern = re.compile(r"<script>(.*?)</script>", re.DOTALL)
-            matches = pattern.findall(html_content)
-            matches = [
-                element
-                for element in matches
-                if "var listingJson" in element or "window.units" in element
-            ]
-
-            listingJson_dict = {}
-            window_listing_dict = {}
-            units_array = []
-
-            for data_string in matches:
-                # Extracting content between curly braces for dictionaries
-                pattern_1 = re.compile(r"{(.*?)}")
-                matches_1 = pattern_1.findall(data_string)
-
-                # Extracting content between square brackets for arrays
-                pattern_2 = re.compile(r"window.units = (\[.*?\]);")
-                match_2 = pattern_2.search(data_string)
-
-                # If there are two dictionary matches, load them
-                if len(matches_1) == 2:
-                    listingJson_dict = json.loads("{" + matches_1[0] + "}")
-                    window_listing_dict = json.loads("{" + matches_1[1] + "}")
-                elif match_2:
-                    units_array_str = match_2.group(1)
-                    units_array = json.loads(units_array_str)
-            df_1 = pd.DataFrame([listingJson_dict])
-            df_2 = pd.DataFrame([window_listing_dict])
-            df_3 = pd.DataFrame()
-            df_1["unique_id"] = z
-            for i in units_array:
-                temp_df = pd.DataFrame(
-                    [i]
-                )  # Convert the dictionary to single-row dataframe
-                df_3 = pd.concat([df_3, temp_df], ignore_index=True)
-            df_1["unique_id"] = z
-            df_3["unique_id"] = z
-            z = z + 1
-            df_4 = pd.merge(df_1, df_3, on="unique_id", how="outer")
-            df_final = pd.concat([df_final, df_4], ignore_index=True)
-            print(f"Successful at url {k}")
-            print(df_4.iloc[:, :4])
+            records = listing_records(driver.page_source, k, z, sysdate, tracker)
         except Exception as e:
             print(f"Error at url {k}: {e}")
+            if checkpoint is not None:
+                checkpoint.page_failed(k, e)
+            continue
+        z = z + 1
+        print(f"Successful at url {k}")
+        yield from records
+        if checkpoint is not None:
+            checkpoint.page_done(k)
+
+
+def iter_concurrent_records(
+    url_list,
+    driver=None,
+    sleep_time=3,
+    sysdate=None,
+    tracker=None,
+    checkpoint=None,
+    **fetch_options,
+):
+    """
+    Scrape URLs with concurrent HTTP requests and yield the listing records as they are parsed.
+
+    Detail pages are fetched by page_fetcher.iter_pages and parsed from their embedded
+    'var listingJson' / 'window.units' script tags, without rendering them. Pages that
+    fail to download or do not contain the listing data are scraped again with
+    Selenium when a driver is given.
+
+    Parameters:
+    - url_list (list): A list of URLs to scrape.
+    - driver (optional): Selenium WebDriver instance used as a fallback. Defaults to None.
+    - sleep_time (int, optional): Wait after each Selenium fallback page. Defaults to 3 seconds.
+    - sysdate (str, optional): Run timestamp stamped on every record. Defaults to now.
+    - tracker (ChangeTracker, optional): Skip listings whose content is unchanged. Defaults to None.
+    - checkpoint (ScrapeCheckpoint, optional): Run state recording finished and failed urls. Defaults to None.
+    - fetch_options: Keyword arguments of page_fetcher.fetch_pages, e.g. concurrency,
+      rate_per_host, retries and backoff.
+
+    Yields:
+    - dict: One record per unit.
+    """
+    sysdate = sysdate or datetime.now().strftime("%Y-%m-%d %H:%M")
+    fallback_urls = []
+    z = 0
+    for url, html_content, error in iter_pages(url_list, **fetch_options):
+        if error is None and "var listingJson" not in html_content:
+            error = "listing data not found in the page"
+        if error is None:
+            try:
+                records = listing_records(html_content, url, z, sysdate, tracker)
+            except Exception as e:
+                error = e
+        if error is not None:
+            print(f"Error at url {url}: {error}")
+            if driver is not None:
+                fallback_urls.append(url)
+            elif checkpoint is not None:
+                checkpoint.page_failed(url, error)
             continue
-    df_final["sysdate"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-    return df_final
+        z = z + 1
+        print(f"Successful at url {url}")
+        yield from records
+        if checkpoint is not None:
+            checkpoint.page_done(url)
+
+    if fallback_urls:
+        print(f"Retrying {len(fallback_urls)} urls with Selenium")
+        yield from iter_selenium_records(
+            driver,
+            fallback_urls,
+            sleep_time,
+            first_id=z,
+            sysdate=sysdate,
+            tracker=tracker,
+            checkpoint=checkpoint,
+        )
 
 
-def dataframe_to_mongodb(
-    dataframe, username, password, cluster_uri, db_name, collection_name, partitions=1
+def scrape(driver, url_list, sleep_time=3):
+    """
+    Scrape structured data from a list of URLs using Selenium into a pandas DataFrame.
+
+    Parameters:
+    - driver: The Selenium WebDriver instance to be used for scraping.
+    - url_list (list): A list of URLs to scrape.
+    - sleep_time (int, optional): Time in seconds to wait after navigating to a URL. Defaults to 3 seconds.
+
+    Returns:
+    - DataFrame: A pandas DataFrame containing the scraped and structured data from the provided URLs.
+
+    Note:
+    - The scraping and parsing processes are based on specific HTML structures and patterns, which may change if the source websites update their designs.
+    - Each row in the final DataFrame is associated with a unique_id which is incrementally generated for each URL.
+    """
+    return pd.DataFrame(list(iter_selenium_records(driver, url_list, sleep_time)))
+
+
+def scrape_concurrent(url_list, driver=None, sleep_time=3, **fetch_options):
+    """
+    Scrape structured data from a list of URLs with concurrent HTTP requests into a
+    pandas DataFrame. See iter_concurrent_records for the parameters.
+    """
+    return pd.DataFrame(
+        list(iter_concurrent_records(url_list, driver, sleep_time, **fetch_options))
+    )
+
+
+def records_to_mongodb(
+    records,
+    username,
+    password,
+    cluster_uri,
+    db_name,
+    collection_name,
+    batch_size=500,
+    upsert_key=None,
+    on_batch_written=None,
 ):
+    """
+    Write a stream of records to MongoDB in batches while they are produced.
 
-    # Construct the MongoDB Atlas connection URI using the provided username and password
-    mongo_uri = f"mongodb+srv://{username}:{password}@{cluster_uri}/{db_name}?retryWrites=true&w=majority"
+    Each full batch is written with one unordered call, so scraped data lands
+    continuously, memory stays at one batch and a crash only loses the current batch.
 
-    # Split the DataFrame into 'n' partitions
-    df_partitions = np.array_split(dataframe, partitions)
+    Parameters:
+    - records: Iterable of dictionaries, e.g. from iter_concurrent_records.
+    - username, password, cluster_uri, db_name, collection_name: MongoDB target.
+    - batch_size (int, optional): Records per write. Defaults to 500.
+    - upsert_key (str, optional): Field identifying a document. When given, records
+      replace the fields of the matching document through bulk_write upserts instead
+      of being inserted. Defaults to None.
+    - on_batch_written (callable, optional): Called with the batch size after every
+      write, e.g. ScrapeCheckpoint.batch_written. Defaults to None.
 
-    # Connect to MongoDB
-    client = MongoClient(mongo_uri)
-    db = client[db_name]
-    collection = db[collection_name]
+    Returns:
+    - int: Number of records written.
+    """
+    # Construct the MongoDB connection URI using the provided username and password
+    mongo_uri = connection_uri(username, password, cluster_uri, db_name)
 
-    for partition in df_partitions:
-        # Convert partition to dictionary format for MongoDB
-        records = partition.to_dict(orient="records")
+    client = MongoClient(mongo_uri)
+    collection = client[db_name][collection_name]
+    try:
+        if upsert_key:
+            collection.create_index(upsert_key)
+        # Written in this thread, so a written batch covers every record taken so far
+        stats = write_records(
+            records,
+            collection,
+            batch_size=batch_size,
+            n_threads=1,
+            upsert_key=upsert_key,
+            insert_fields={"first_seen": "sysdate"} if upsert_key else None,
+            on_batch_written=on_batch_written,
+        )
+    finally:
+        client.close()
+    return stats["written"]
 
-        # Insert records into the collection
-        collection.insert_many(records)
-        print(f"Inserted {len(records)} records into {db_name}.{collection_name}")
 
-    # Close the connection
-    client.close()
+def dataframe_to_mongodb(
+    dataframe, username, password, cluster_uri, db_name, collection_name
+):
+    """
+    Write a DataFrame to MongoDB with mongo_writer.dataframe_to_mongodb.
+    """
+    return mongo_writer.dataframe_to_mongodb(
+        dataframe, username, password, cluster_uri, db_name, collection_name
+    )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape rental listings.")
+    parser.add_argument(
+        "--fetch-mode",
+        choices=["http", "selenium"],
+        default="http",
+        help="Fetch detail pages with concurrent HTTP requests (default) or Selenium",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Maximum simultaneous detail page requests (default: 16)",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=4.0,
+        help="Maximum requests per second to one host, 0 for no limit (default: 4)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Retries per page after a transient failure (default: 3)",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        help="Base retry delay in seconds, doubled per attempt (default: 1)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Records written to MongoDB per batch (default: 500)",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=None,
+        help="Maximum result pages to discover listing urls from (default: all)",
+    )
+    parser.add_argument(
+        "--page-param",
+        default="cur_page",
+        help="Query parameter of the result page index (default: cur_page)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=str(CHECKPOINT_PATH),
+        help="Run state file used to resume an interrupted run",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Ignore the checkpoint and start a new run with url discovery",
+    )
+    parser.add_argument(
+        "--max-failures",
+        type=int,
+        default=3,
+        help="Runs after which a failing url is given up (default: 3)",
+    )
+    args = parser.parse_args()
+
     print(chrome_cred["chrome_driver_path"])
+    checkpoint = ScrapeCheckpoint.load(args.checkpoint)
     try:
+        search_url = "https://www.rentfaster.ca/ab/calgary/rentals/?l=11,51.0458,-114.0575&type=House&type=Townhouse&type=Loft&type=Condo%20Unit&type=Apartment&type=Duplex&type=Main%20Floor&type=Room%20For%20Rent&type=Basement&type=Mobile&type=Vacation%20Home&type=Storage&type=Office%20Space&type=Parking%20Spot&type=Acreage&limit=2895,3523#dialog-listview"
         driver = get_driver(
-            url="https://www.rentfaster.ca/ab/calgary/rentals/?l=11,51.0458,-114.0575&type=House&type=Townhouse&type=Loft&type=Condo%20Unit&type=Apartment&type=Duplex&type=Main%20Floor&type=Room%20For%20Rent&type=Basement&type=Mobile&type=Vacation%20Home&type=Storage&type=Office%20Space&type=Parking%20Spot&type=Acreage&limit=2895,3523#dialog-listview",
+            url=search_url,
             chrome_driver_path=chrome_cred["chrome_driver_path"],
             sleep_time=5,
         )
@@ -197,25 +632,104 @@ if __name__ == "__main__":
         if not driver:
             raise Exception("Failed to initialize the web driver.")
 
-        url_list = get_url_list(
-            driver, pattern=r'href="\/ab\/calgary\/rentals\/.*?"', sleep_time=5
+        # Resume the interrupted run of the checkpoint, if any
+        url_list = [] if args.fresh else checkpoint.pending_urls(args.max_failures)
+        if url_list:
+            print(
+                f"Resuming run of {checkpoint.sysdate}: {len(url_list)} of "
+                f"{len(checkpoint.frontier)} urls left"
+            )
+        else:
+            url_pattern = r'href="\/ab\/calgary\/rentals\/.*?"'
+            start = time.perf_counter()
+            url_list = None
+            if args.fetch_mode == "http":
+                url_list = discover_urls(
+                    search_url,
+                    pattern=url_pattern,
+                    page_param=args.page_param,
+                    max_pages=args.max_pages,
+                    concurrency=args.concurrency,
+                    rate_per_host=args.rate_limit,
+                    retries=args.retries,
+                    backoff=args.backoff,
+                )
+                if url_list is None:
+                    print(
+                        "Result pages not available by page index, paging with Selenium"
+                    )
+            if url_list is None:
+                url_list = get_url_list(
+                    driver, pattern=url_pattern, sleep_time=5, max_pages=args.max_pages
+                )
+            print(f"Url discovery took {time.perf_counter() - start:.1f}s")
+            if not url_list:
+                raise Exception("Failed to retrieve URL list.")
+            checkpoint.start(url_list, datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+        # Listings whose content hash is already stored are skipped
+        tracker = ChangeTracker(
+            load_known_hashes(
+                username=mongo_db_cred["username"],
+                password=mongo_db_cred["password"],
+                cluster_uri=mongo_db_cred["cluster_uri"],
+                db_name=mongo_db_cred["db_name"],
+                collection_name=mongo_db_cred["collection_name"],
+            )
         )
-        if not url_list:
-            raise Exception("Failed to retrieve URL list.")
 
-        df = scrape(driver, url_list, sleep_time=3)
-        if df.empty:
-            raise Exception("Scraping returned an empty DataFrame.")
+        if args.fetch_mode == "http":
+            records = iter_concurrent_records(
+                url_list,
+                driver=driver,
+                sleep_time=3,
+                sysdate=checkpoint.sysdate,
+                tracker=tracker,
+                checkpoint=checkpoint,
+                concurrency=args.concurrency,
+                rate_per_host=args.rate_limit,
+                retries=args.retries,
+                backoff=args.backoff,
+            )
+        else:
+            records = iter_selenium_records(
+                driver,
+                url_list,
+                sleep_time=3,
+                sysdate=checkpoint.sysdate,
+                tracker=tracker,
+                checkpoint=checkpoint,
+            )
 
-        dataframe_to_mongodb(
-            dataframe=df,
+        # Records are written batch by batch while the scrape is running
+        written = records_to_mongodb(
+            records,
             username=mongo_db_cred["username"],
             password=mongo_db_cred["password"],
             cluster_uri=mongo_db_cred["cluster_uri"],
             db_name=mongo_db_cred["db_name"],
             collection_name=mongo_db_cred["collection_name"],
-            partitions=1,
+            batch_size=args.batch_size,
+            upsert_key="unit_key",
+            on_batch_written=checkpoint.batch_written,
         )
+        # Every record has been written, including the last partial batch
+        checkpoint.batch_written()
+        print(
+            f"Listings new: {tracker.counts['new']}, "
+            f"changed: {tracker.counts['changed']}, "
+            f"unchanged: {tracker.counts['unchanged']} - {written} records written"
+        )
+        if not written and not tracker.counts["unchanged"]:
+            raise Exception("Scraping returned no records.")
+
+        retry_urls = checkpoint.pending_urls(args.max_failures)
+        if retry_urls:
+            print(f"{len(retry_urls)} failed urls are retried by the next run")
+        else:
+            checkpoint.clear()
 
     except Exception as e:
         print(f"An error occurred: {e}")
+    finally:
+        checkpoint.flush()
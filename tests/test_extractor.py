@@ -0,0 +1,45 @@
+"""
+Parity of listing_extractor.extract_listing with the previous regex parser.
+"""
+
+from pathlib import Path
+import random
+import pytest
+from benchmarks.extractor import legacy_extract_listing, load_pages, synthetic_page
+from listing_extractor import extract_listing
+
+PAGES_DIR = Path(__file__).parent / "fixtures" / "pages"
+
+STORED_PAGES = load_pages(PAGES_DIR, 0)
+SYNTHETIC_PAGES = load_pages(None, 20)
+
+
+@pytest.mark.parametrize("name", sorted(STORED_PAGES))
+def test_stored_pages_match_legacy_parser(name):
+    html_content = STORED_PAGES[name]
+
+    listing, units = extract_listing(html_content)
+
+    assert (listing, units) == legacy_extract_listing(html_content)
+    assert listing["ref_id"]
+    assert units
+
+
+@pytest.mark.parametrize("name", sorted(SYNTHETIC_PAGES))
+def test_synthetic_pages_match_legacy_parser(name):
+    html_content = SYNTHETIC_PAGES[name]
+
+    assert extract_listing(html_content) == legacy_extract_listing(html_content)
+
+
+def test_nested_listing_fields():
+    # The previous parser stopped at the first closing brace, extract_listing decodes
+    # the whole payload
+    page = synthetic_page(random.Random(7), 3).replace(
+        '"cats":', '"address": {"street": "1 Main St", "city": "Calgary"}, "cats":'
+    )
+
+    listing, units = extract_listing(page)
+
+    assert listing["address"] == {"street": "1 Main St", "city": "Calgary"}
+    assert len(units) == 3
@@ -0,0 +1,95 @@
+"""
+Tests of the shared MongoDB writer against mongomock.
+"""
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("pymongo")
+
+from mongo_writer import iter_batches, write_batch, write_records
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient()["rentals"]["clean"]
+
+
+def unit(unit_key, price, sysdate="2026-10-01 08:00"):
+    return {"unit_key": unit_key, "price_y": price, "sysdate": sysdate}
+
+
+def test_iter_batches_groups_records():
+    assert list(iter_batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_write_batch_inserts(collection):
+    records = [unit("a-1", 1500), unit("a-2", 1700)]
+
+    assert write_batch(collection, records) == 2
+
+    assert collection.count_documents({}) == 2
+    assert write_batch(collection, []) == 0
+
+
+def test_write_batch_upserts_by_key(collection):
+    write_batch(collection, [unit("a-1", 1500), unit("a-2", 1700)], "unit_key")
+
+    write_batch(
+        collection,
+        [unit("a-1", 1450, "2026-10-02 08:00"), unit("b-1", 2100, "2026-10-02 08:00")],
+        "unit_key",
+    )
+
+    assert collection.count_documents({}) == 3
+    assert collection.find_one({"unit_key": "a-1"})["price_y"] == 1450
+    assert collection.find_one({"unit_key": "a-2"})["price_y"] == 1700
+
+
+def test_write_batch_sets_insert_fields_once(collection):
+    insert_fields = {"first_seen": "sysdate"}
+    write_batch(collection, [unit("a-1", 1500)], "unit_key", insert_fields)
+
+    write_batch(
+        collection,
+        [unit("a-1", 1450, "2026-10-02 08:00")],
+        "unit_key",
+        insert_fields,
+    )
+
+    document = collection.find_one({"unit_key": "a-1"})
+    assert document["first_seen"] == "2026-10-01 08:00"
+    assert document["sysdate"] == "2026-10-02 08:00"
+
+
+@pytest.mark.parametrize("n_threads", [1, 4])
+def test_write_records_streams_all_batches(collection, n_threads):
+    records = (unit(f"u-{i}", 1000 + i) for i in range(2500))
+    batch_sizes = []
+
+    result = write_records(
+        records,
+        collection,
+        batch_size=1000,
+        n_threads=n_threads,
+        upsert_key="unit_key",
+        on_batch_written=batch_sizes.append,
+    )
+
+    assert result["written"] == 2500
+    assert sorted(batch_sizes) == [500, 1000, 1000]
+    assert collection.count_documents({}) == 2500
+
+
+def test_write_records_upserts_are_idempotent(collection):
+    records = [unit(f"u-{i}", 1000 + i) for i in range(50)]
+
+    write_records(
+        records, collection, batch_size=20, n_threads=2, upsert_key="unit_key"
+    )
+    write_records(
+        records, collection, batch_size=20, n_threads=2, upsert_key="unit_key"
+    )
+
+    assert collection.count_documents({}) == 50
@@ -0,0 +1,145 @@
+"""
+Tests of page_fetcher against saved listing pages served by a local aiohttp server.
+"""
+
+from collections import Counter
+from pathlib import Path
+import threading
+import asyncio
+import time
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from listing_extractor import extract_listing
+from page_fetcher import iter_pages
+
+PAGES_DIR = Path(__file__).parent / "fixtures" / "pages"
+PAGES = {
+    path.name: path.read_text(encoding="utf-8")
+    for path in sorted(PAGES_DIR.glob("*.html"))
+}
+
+# Fetch options keeping the tests fast: no rate limit and short retry delays
+FAST = {"rate_per_host": 0, "backoff": 0.01}
+
+
+class FixtureServer:
+    """
+    aiohttp server running on its own event loop in a daemon thread, so that the
+    synchronous iter_pages can be tested against it.
+
+    Routes:
+    - /pages/{name}: The saved page.
+    - /flaky/{name}: 503 with Retry-After: 0 on the first request, then the page.
+    - /slow/{name}: The page after a delay of slow_delay seconds.
+    """
+
+    def __init__(self, slow_delay=0.2):
+        self.slow_delay = slow_delay
+        self.requests = Counter()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        app = web.Application()
+        app.router.add_get("/pages/{name}", self.serve_page)
+        app.router.add_get("/flaky/{name}", self.serve_flaky)
+        app.router.add_get("/slow/{name}", self.serve_slow)
+        self.server = TestServer(app)
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def start(self):
+        self.thread.start()
+        self.run(self.server.start_server())
+
+    def close(self):
+        self.run(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def url(self, route, name):
+        return str(self.server.make_url(f"/{route}/{name}"))
+
+    def page(self, request):
+        name = request.match_info["name"]
+        self.requests[request.path] += 1
+        if name not in PAGES:
+            raise web.HTTPNotFound()
+        return web.Response(text=PAGES[name], content_type="text/html")
+
+    async def serve_page(self, request):
+        return self.page(request)
+
+    async def serve_flaky(self, request):
+        if self.requests[request.path] == 0:
+            self.requests[request.path] += 1
+            return web.Response(status=503, headers={"Retry-After": "0"})
+        return self.page(request)
+
+    async def serve_slow(self, request):
+        await asyncio.sleep(self.slow_delay)
+        return self.page(request)
+
+
+@pytest.fixture
+def server():
+    fixture_server = FixtureServer()
+    fixture_server.start()
+    yield fixture_server
+    fixture_server.close()
+
+
+def test_iter_pages_returns_saved_pages(server):
+    urls = {server.url("pages", name): name for name in PAGES}
+
+    fetched = {url: (html, error) for url, html, error in iter_pages(urls, **FAST)}
+
+    assert set(fetched) == set(urls)
+    for url, (html, error) in fetched.items():
+        assert error is None
+        assert html == PAGES[urls[url]]
+        listing, units = extract_listing(html)
+        assert listing["ref_id"] and units
+
+
+def test_iter_pages_retries_transient_errors(server):
+    urls = [server.url("flaky", name) for name in PAGES]
+
+    fetched = list(iter_pages(urls, **FAST))
+
+    assert [error for _, _, error in fetched] == [None] * len(urls)
+    assert {html for _, html, _ in fetched} == set(PAGES.values())
+    assert all(server.requests[f"/flaky/{name}"] == 2 for name in PAGES)
+
+
+def test_iter_pages_reports_failed_pages(server):
+    url = server.url("pages", "missing.html")
+
+    [(fetched_url, html, error)] = list(iter_pages([url], retries=0, **FAST))
+
+    assert fetched_url == url
+    assert html is None
+    assert isinstance(error, aiohttp.ClientResponseError)
+    assert error.status == 404
+
+
+def test_slow_consumer_does_not_stall_requests_in_flight(server):
+    # The consumer holds the first page for longer than the request timeout while the
+    # buffer is full; requests in flight must still complete within their timeout
+    urls = [server.url("slow", name) for name in PAGES] * 3
+    consumer_delay = 1.5
+
+    fetched = []
+    for page in iter_pages(
+        urls, buffer_size=1, concurrency=4, timeout=1.0, retries=0, **FAST
+    ):
+        if not fetched:
+            time.sleep(consumer_delay)
+        fetched.append(page)
+
+    assert len(fetched) == len(urls)
+    assert [error for _, _, error in fetched] == [None] * len(urls)
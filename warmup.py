@@ -0,0 +1,134 @@
+from pathlib import Path
+import threading
+import time
+import os
+import numpy as np
+
+# Models loaded and run once at startup: comma separated model types, 'all' for every
+# trained model or '' to skip the warmup
+WARMUP_MODELS = os.environ.get("WARMUP_MODELS", "all")
+
+# Set to 1 to also import the aggregation route's data stack during the warmup
+WARMUP_AGGREGATIONS = os.environ.get("WARMUP_AGGREGATIONS", "0") == "1"
+
+MODELS_DIR = Path(__file__).parent / "models"
+
+
+class Readiness:
+    """
+    Startup progress of the server: phase timings, failed warmup steps, whether the
+    warmup finished and whether it left the server able to serve predictions.
+    """
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.phases_ms = {}
+        self.failed = {}
+        self.usable = True
+        self.lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self.lock:
+            self.phases_ms[phase] = round(seconds * 1000, 1)
+        print(f"Startup phase {phase}: {seconds * 1000:.1f} ms")
+
+    def fail(self, step, error):
+        with self.lock:
+            self.failed[step] = str(error)
+        print(f"Warmup of {step} failed: {error}")
+
+    def unusable(self, reason):
+        """
+        Keep the server not ready for good, e.g. when no model could be loaded.
+        """
+        with self.lock:
+            self.usable = False
+        self.fail("startup", reason)
+
+    def status(self):
+        with self.lock:
+            return {
+                "ready": self.finished.is_set() and self.usable,
+                "phases_ms": dict(self.phases_ms),
+                "failed": dict(self.failed),
+            }
+
+
+readiness = Readiness()
+
+
+def configured_models(allowed_model_types, models_dir=MODELS_DIR):
+    """
+    Model types to warm up according to WARMUP_MODELS.
+    """
+    if WARMUP_MODELS.strip().lower() == "all":
+        return sorted(
+            model_type
+            for model_type in allowed_model_types
+            if (Path(models_dir) / f"{model_type}.pkl").exists()
+        )
+    return [
+        model_type.strip()
+        for model_type in WARMUP_MODELS.split(",")
+        if model_type.strip() in allowed_model_types
+    ]
+
+
+def warm_up(model_types, load_model, n_features, import_aggregations=None):
+    """
+    Load every model and run one dummy prediction, so the first request does not pay
+    for unpickling, library imports and first-call initialisation.
+
+    Unless the warmup is disabled (WARMUP_MODELS=''), at least one model must load and
+    predict, otherwise the server stays not ready: a deploy without working models must
+    not pass the readiness probe.
+
+    Parameters:
+    - model_types (list): Models to warm up.
+    - load_model (callable): Loader of the prediction route, filling its model cache.
+    - n_features (int): Width of a prediction row.
+    - import_aggregations (callable, optional): Imports the aggregation route's
+      dependencies when given.
+    """
+    start = time.perf_counter()
+    dummy_row = np.zeros((1, n_features))
+    warmed = 0
+    for model_type in model_types:
+        try:
+            step = time.perf_counter()
+            model = load_model(model_type)
+            readiness.record(f"load_{model_type}", time.perf_counter() - step)
+            step = time.perf_counter()
+            model.predict(dummy_row)
+            readiness.record(f"predict_{model_type}", time.perf_counter() - step)
+            warmed += 1
+        except Exception as e:
+            readiness.fail(model_type, e)
+    if WARMUP_MODELS.strip() and not warmed:
+        readiness.unusable(
+            f"no model warmed up out of {len(model_types)} configured "
+            f"(WARMUP_MODELS={WARMUP_MODELS!r})"
+        )
+    if import_aggregations is not None:
+        try:
+            step = time.perf_counter()
+            import_aggregations()
+            readiness.record("import_aggregations", time.perf_counter() - step)
+        except Exception as e:
+            readiness.fail("aggregations", e)
+    readiness.record("warmup", time.perf_counter() - start)
+    readiness.finished.set()
+
+
+def start_warmup(model_types, load_model, n_features, import_aggregations=None):
+    """
+    Run warm_up in a daemon thread so the server accepts connections meanwhile.
+    """
+    thread = threading.Thread(
+        target=warm_up,
+        args=(model_types, load_model, n_features, import_aggregations),
+        name="warmup",
+        daemon=True,
+    )
+    thread.start()
+    return thread